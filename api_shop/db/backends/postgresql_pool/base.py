@@ -0,0 +1,109 @@
+"""
+Бэкенд PostgreSQL с пулом соединений на процесс.
+
+Настройки пула задаются ключом POOL в описании базы в DATABASES:
+
+    'POOL': {
+        'MAX_SIZE': 10,               # максимум соединений на процесс
+        'TIMEOUT': 5,                 # сколько секунд ждать свободное соединение
+        'HEALTH_CHECK_SECONDS': 30,   # после какого простоя проверять соединение
+        'MAX_LIFETIME': 1800,         # когда пересоздавать соединение
+    }
+
+Django закрывает соединение в конце запроса (CONN_MAX_AGE = 0); в этом бэкенде
+закрытие возвращает соединение в пул, поэтому следующий запрос - и под WSGI,
+и под ASGI (в потоке sync_to_async) - получает уже открытое соединение.
+"""
+from django.db.backends.postgresql import base, creation
+from psycopg2 import extensions
+
+from api_shop.db.pool import ConnectionPool, close_pools, get_pool
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    """
+    Перед удалением тестовой базы закрываем соединения, оставшиеся в пуле,
+    иначе DROP DATABASE завершится ошибкой
+    """
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pools(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_pool(self, conn_params=None):
+        options = self.settings_dict.get("POOL", {})
+        key = (self.alias,
+               f"{self.settings_dict['HOST'] or 'localhost'}:{self.settings_dict['PORT'] or 5432}"
+               f"/{self.settings_dict['NAME']}")
+        if conn_params is None:
+            conn_params = self.get_connection_params()
+
+        def factory():
+            return ConnectionPool(
+                connect=lambda: base.Database.connect(**conn_params),
+                close=lambda connection: connection.close(),
+                health_check=self.check_pooled_connection,
+                max_size=options.get("MAX_SIZE", 10),
+                timeout=options.get("TIMEOUT", 5),
+                health_check_interval=options.get("HEALTH_CHECK_SECONDS", 30),
+                max_lifetime=options.get("MAX_LIFETIME"),
+            )
+
+        return get_pool(key, factory)
+
+    def get_new_connection(self, conn_params):
+        connection = self.get_pool(conn_params).checkout()
+
+        # то же, что делает базовый бэкенд для нового соединения
+        options = self.settings_dict["OPTIONS"]
+        try:
+            self.isolation_level = options["isolation_level"]
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        base.psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            pool = self.get_pool()
+            # соединение, закрываемое посреди транзакции, остается привязанным
+            # к этому объекту (closed_in_transaction), поэтому в пул его не возвращаем
+            discard = self.in_atomic_block or not self.reset_pooled_connection(self.connection)
+            pool.checkin(self.connection, discard=discard)
+
+    @staticmethod
+    def reset_pooled_connection(connection):
+        """
+        Откат незавершенной транзакции перед возвратом соединения в пул
+        """
+        if connection.closed:
+            return False
+        status = connection.get_transaction_status()
+        if status == extensions.TRANSACTION_STATUS_IDLE:
+            return True
+        if status in (extensions.TRANSACTION_STATUS_INTRANS, extensions.TRANSACTION_STATUS_INERROR):
+            try:
+                connection.rollback()
+                return True
+            except base.Database.Error:
+                return False
+        return False
+
+    @staticmethod
+    def check_pooled_connection(connection):
+        if connection.closed:
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        if not connection.autocommit:
+            connection.rollback()
+        return True
@@ -0,0 +1,197 @@
+"""
+Ограниченный пул соединений с БД на процесс.
+
+Пул не зависит от драйвера: соединения создаются функцией connect, а проверка
+работоспособности выполняется функцией health_check. Используется бэкендом
+api_shop.db.backends.postgresql_pool.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """
+    Не удалось получить соединение из пула за отведенное время
+    """
+
+
+class PooledConnection:
+    __slots__ = ("connection", "created_at", "returned_at")
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = self.returned_at = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    Пул из не более чем max_size соединений. Если все соединения заняты, checkout()
+    ждет освобождения не дольше timeout секунд. Соединение, простоявшее в пуле
+    дольше health_check_interval, перед выдачей проверяется health_check;
+    соединения старше max_lifetime закрываются при возврате в пул.
+    """
+
+    def __init__(self, connect, close, health_check, max_size=10, timeout=5.0,
+                 health_check_interval=30.0, max_lifetime=None):
+        self.connect = connect
+        self.close = close
+        self.health_check = health_check
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.max_lifetime = max_lifetime
+        self.pid = os.getpid()
+
+        self._idle = deque()
+        self._in_use = {}
+        self._size = 0
+        self._condition = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "checkins": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "timeouts": 0,
+            "created": 0,
+            "discarded": 0,
+            "health_check_failures": 0,
+        }
+
+    def checkout(self):
+        deadline = time.monotonic() + self.timeout
+        waited_from = None
+        while True:
+            pooled = None
+            with self._condition:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(f"Нет свободных соединений в пуле из {self.max_size} за {self.timeout} с")
+                    if waited_from is None:
+                        waited_from = time.monotonic()
+                        self._stats["waits"] += 1
+                    self._condition.wait(remaining)
+                if self._idle:
+                    pooled = self._idle.pop()
+                else:
+                    self._size += 1
+
+            if pooled is None:
+                pooled = self._create()
+            elif not self._is_healthy(pooled):
+                self._discard(pooled)
+                continue
+
+            with self._condition:
+                self._in_use[id(pooled.connection)] = pooled
+                self._stats["checkouts"] += 1
+                if waited_from is not None:
+                    self._stats["wait_seconds"] += time.monotonic() - waited_from
+            return pooled.connection
+
+    def checkin(self, connection, discard=False):
+        with self._condition:
+            pooled = self._in_use.pop(id(connection), None)
+            self._stats["checkins"] += 1
+        if pooled is None:
+            # соединение выдано до форка или уже возвращено
+            self.close(connection)
+            return
+
+        expired = self.max_lifetime is not None and time.monotonic() - pooled.created_at > self.max_lifetime
+        if discard or expired:
+            self._discard(pooled)
+            return
+
+        pooled.returned_at = time.monotonic()
+        with self._condition:
+            self._idle.append(pooled)
+            self._condition.notify()
+
+    def close_all(self):
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self._condition.notify_all()
+        for pooled in idle:
+            self.close(pooled.connection)
+
+    def stats(self):
+        with self._condition:
+            return dict(self._stats,
+                        size=self._size,
+                        idle=len(self._idle),
+                        in_use=len(self._in_use),
+                        max_size=self.max_size,
+                        )
+
+    def _create(self):
+        try:
+            connection = self.connect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._stats["created"] += 1
+        return PooledConnection(connection)
+
+    def _is_healthy(self, pooled):
+        if time.monotonic() - pooled.returned_at < self.health_check_interval:
+            return True
+        try:
+            healthy = self.health_check(pooled.connection)
+        except Exception:
+            healthy = False
+        if not healthy:
+            logger.warning("Соединение из пула не прошло проверку и будет пересоздано")
+            with self._condition:
+                self._stats["health_check_failures"] += 1
+        return healthy
+
+    def _discard(self, pooled):
+        try:
+            self.close(pooled.connection)
+        except Exception:
+            logger.exception("Ошибка при закрытии соединения из пула")
+        finally:
+            with self._condition:
+                self._size -= 1
+                self._stats["discarded"] += 1
+                self._condition.notify()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, factory):
+    """
+    Пул для ключа key в текущем процессе; после fork создается новый пул,
+    унаследованные от родителя соединения не используются
+    """
+    pool = _pools.get(key)
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[key] = factory()
+    return pool
+
+
+def close_pools(alias=None):
+    for key, pool in list(_pools.items()):
+        if alias is None or key[0] == alias:
+            pool.close_all()
+
+
+def pool_stats():
+    return {" ".join(key): pool.stats() for key, pool in _pools.items() if pool.pid == os.getpid()}
@@ -0,0 +1,146 @@
+"""
+Маршрутизация запросов к БД между основной базой и репликами только для чтения.
+
+Чтение направляется на реплики из settings.DATABASE_REPLICAS, запись - всегда на
+основную базу (default). Запрос можно закрепить за основной базой через
+pin_to_primary() / use_primary(); это делает ReplicaRoutingMiddleware для
+небезопасных методов и для клиентов, недавно выполнявших запись.
+
+Если запрос к реплике, прошедшей проверку доступности, завершился ошибкой соединения
+(OperationalError, InterfaceError) вне транзакции, реплика исключается из маршрутизации,
+а запрос повторяется на основной базе (replica_failover).
+"""
+import contextvars
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, InterfaceError, OperationalError, connections
+
+_pinned_to_primary = contextvars.ContextVar("pinned_to_primary", default=False)
+
+_replica_state_lock = threading.Lock()
+_replica_unavailable_until = {}
+_replica_checked_at = {}
+
+
+def pin_to_primary():
+    """
+    Закрепляет все последующие чтения в текущем контексте за основной базой.
+    Возвращает токен для reset_pin()
+    """
+    return _pinned_to_primary.set(True)
+
+
+def reset_pin(token):
+    _pinned_to_primary.reset(token)
+
+
+def is_pinned_to_primary():
+    return _pinned_to_primary.get()
+
+
+@contextmanager
+def use_primary():
+    token = pin_to_primary()
+    try:
+        yield
+    finally:
+        reset_pin(token)
+
+
+def mark_replica_unavailable(alias):
+    with _replica_state_lock:
+        _replica_unavailable_until[alias] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+        _replica_checked_at.pop(alias, None)
+
+
+def replica_available(alias):
+    """
+    Проверка доступности реплики. Недоступная реплика исключается из маршрутизации
+    на REPLICA_RETRY_SECONDS; живое соединение перепроверяется не чаще,
+    чем раз в REPLICA_HEALTH_CHECK_SECONDS
+    """
+    now = time.monotonic()
+    if _replica_unavailable_until.get(alias, 0) > now:
+        return False
+    if alias not in connections.databases:
+        mark_replica_unavailable(alias)
+        return False
+
+    connection = connections[alias]
+    if replica_failover not in connection.execute_wrappers:
+        connection.execute_wrappers.append(replica_failover)
+    try:
+        if connection.connection is None:
+            connection.ensure_connection()
+        elif now - _replica_checked_at.get(alias, 0) > settings.REPLICA_HEALTH_CHECK_SECONDS:
+            if not connection.is_usable():
+                connection.close()
+                connection.ensure_connection()
+        else:
+            return True
+    except Exception:
+        mark_replica_unavailable(alias)
+        return False
+
+    with _replica_state_lock:
+        _replica_unavailable_until.pop(alias, None)
+        _replica_checked_at[alias] = now
+    return True
+
+
+def replica_failover(execute, sql, params, many, context):
+    """
+    Обертка выполнения запросов на соединении с репликой (connection.execute_wrapper):
+    при ошибке соединения запрос выполняется на основной базе, и результат читается оттуда
+    """
+    try:
+        return execute(sql, params, many, context)
+    except (OperationalError, InterfaceError):
+        replica = context["connection"]
+        if replica.in_atomic_block:
+            raise
+        mark_replica_unavailable(replica.alias)
+        primary = connections[DEFAULT_DB_ALIAS].cursor()
+        if many:
+            primary.executemany(sql, params)
+        else:
+            primary.execute(sql, params)
+        # Django читает результат через обертку курсора реплики
+        context["cursor"].cursor = primary.cursor
+        return None
+
+
+def choose_replica():
+    replicas = list(settings.DATABASE_REPLICAS)
+    random.shuffle(replicas)
+    for alias in replicas:
+        if replica_available(alias):
+            return alias
+    return DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    """
+    Роутер БД: запись в default, чтение с реплик с откатом на default
+    """
+
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS or is_pinned_to_primary():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # внутри транзакции читаем то, что только что записали
+            return DEFAULT_DB_ALIAS
+        return choose_replica()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,222 @@
+import gzip
+import hashlib
+import zlib
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.utils.cache import patch_vary_headers
+from rest_framework.authentication import get_authorization_header
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него ответы сжимаются только gzip
+    brotli = None
+
+from api_shop.db.routers import pin_to_primary, reset_pin
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Закрепляет запрос за основной базой, если метод небезопасный или если этот же
+    клиент выполнял запись не ранее REPLICA_STICKY_SECONDS назад (read-your-writes).
+
+    После успешной записи клиент получает подписанную метку времени - в cookie
+    REPLICA_STICKY_COOKIE и в заголовке X-DB-Primary (его значение можно вернуть в этом же
+    заголовке запроса). Метка проверяется любым процессом и сервером с тем же SECRET_KEY.
+    Для клиентов, которые не возвращают метку, запись отмечается и в кэше REPLICA_STICKY_CACHE
+    по пользователю: по токену из заголовка Authorization (у пользователя один токен) или
+    по id пользователя сессии. Отметку видят все процессы, только если кэш общий
+    """
+    header = "X-DB-Primary"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        is_write = request.method not in SAFE_METHODS
+        client_key = self.get_client_key(request)
+
+        token = None
+        if is_write or self.recently_wrote(request, client_key):
+            token = pin_to_primary()
+        try:
+            response = self.get_response(request)
+        finally:
+            if token is not None:
+                reset_pin(token)
+
+        if is_write and response.status_code < 400:
+            value = self.signer().sign("1")
+            response.set_cookie(settings.REPLICA_STICKY_COOKIE, value,
+                                max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite="Lax")
+            response[self.header] = value
+            if client_key is not None:
+                caches[settings.REPLICA_STICKY_CACHE].set(client_key, 1, settings.REPLICA_STICKY_SECONDS)
+        return response
+
+    @staticmethod
+    def get_client_key(request):
+        """
+        Ключ кэша отметки о записи пользователя или None для анонимного клиента
+        """
+        authorization = get_authorization_header(request)
+        if authorization:
+            return f"db-primary:auth:{hashlib.sha1(authorization).hexdigest()}"
+        user = getattr(request, "user", None)
+        if settings.SESSION_COOKIE_NAME in request.COOKIES and user is not None and user.is_authenticated:
+            return f"db-primary:user:{user.pk}"
+        return None
+
+    @staticmethod
+    def signer():
+        # тот же подписывающий объект, что у HttpResponse.set_signed_cookie для этой cookie
+        return signing.get_cookie_signer(salt=settings.REPLICA_STICKY_COOKIE + "db-primary")
+
+    def recently_wrote(self, request, client_key=None):
+        if client_key is not None and caches[settings.REPLICA_STICKY_CACHE].get(client_key):
+            return True
+        values = [request.COOKIES.get(settings.REPLICA_STICKY_COOKIE),
+                  request.headers.get(self.header)]
+        for value in values:
+            if not value:
+                continue
+            try:
+                self.signer().unsign(value, max_age=settings.REPLICA_STICKY_SECONDS)
+            except signing.BadSignature:
+                continue
+            return True
+        return False
+
+
+def accepted_encodings(header):
+    """
+    "gzip;q=0.8, br" -> {"gzip": 0.8, "br": 1.0}
+    """
+    accepted = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def choose_encoding(request):
+    accepted = accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+    for encoding in settings.COMPRESSION_ENCODINGS:
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def compress_stream(chunks, encoding):
+    """
+    Сжимает потоковый ответ по частям: каждая часть сбрасывается клиенту сразу
+    """
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+def compression_cache_key(request, response):
+    """
+    Ключ кэша сжатых вариантов ответа: compression_cache_key, заданный представлением, или адрес
+    запроса со строгим ETag. У остальных ответов ключа нет: хешировать каждое тело дороже, чем сжать его
+    """
+    key = getattr(response, "compression_cache_key", None)
+    if key is None:
+        etag = response.get("ETag", "")
+        if not etag.startswith('"'):
+            # слабый ETag (W/"...") не гарантирует одинаковое тело
+            return None
+        key = f"{request.get_full_path()}:{etag}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def compressed_content(content, encoding, cache_key=None):
+    """
+    Сжатый вариант тела ответа; ответы с ключом cache_key берутся из кэша COMPRESSION_CACHE
+    и сжимаются один раз
+    """
+    if cache_key is None or len(content) > settings.COMPRESSION_CACHE_MAX_SIZE:
+        return compress(content, encoding)
+    key = f"compressed:{encoding}:{cache_key}"
+    compressed_cache = caches[settings.COMPRESSION_CACHE]
+    body = compressed_cache.get(key)
+    if body is None:
+        body = compress(content, encoding)
+        compressed_cache.set(key, body, settings.COMPRESSION_CACHE_SECONDS)
+    return body
+
+
+class CompressionMiddleware:
+    """
+    Сжатие ответов gzip или brotli (если установлен пакет brotli) по заголовку Accept-Encoding.
+    Сжимаются ответы с типами COMPRESSION_CONTENT_TYPES не меньше COMPRESSION_MIN_SIZE байт;
+    сжатые варианты ответов со строгим ETag или compression_cache_key хранятся в кэше
+    и не сжимаются заново.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.has_header("Content-Encoding") or not 200 <= response.status_code < 300:
+            return response
+        content_type = response.get("Content-Type", "").split(";")[0].strip()
+        if not content_type.startswith(tuple(settings.COMPRESSION_CONTENT_TYPES)):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = choose_encoding(request)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_stream(response.streaming_content, encoding)
+            del response["Content-Length"]
+        else:
+            body = compressed_content(response.content, encoding, compression_cache_key(request, response))
+            if len(body) >= len(response.content):
+                return response
+            response.content = body
+            response["Content-Length"] = str(len(body))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        response["Content-Encoding"] = encoding
+        return response
@@ -43,15 +43,18 @@ INSTALLED_APPS = [
     'djoser',
 
     'shop.apps.ShopConfig',
+    'jobs.apps.JobsConfig',
 
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api_shop.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api_shop.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -81,9 +84,145 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
-    )
+    ),
+    # лимиты по области представления (throttle_scope): "<scope>" - пользователи, "<scope>_anon" - по IP
+    'DEFAULT_THROTTLE_CLASSES': [
+        'shop.throttling.TokenBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'products': '600/min',
+        'products_anon': '120/min',
+        # подсказки при вводе: запрос на каждое нажатие клавиши
+        'autocomplete': '1200/min',
+        'autocomplete_anon': '300/min',
+    },
+}
+
+# Кэши. LocMemCache - свой в каждом процессе: при нескольких процессах или серверах
+# READ_CACHE (версии кэшированных ответов), THROTTLE_CACHE и REPLICA_STICKY_CACHE должны указывать на общий кэш,
+# иначе изменение объекта сбрасывает кэш ответов только в процессе, где оно выполнено
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Общий кэш (нужен пакет python-memcached); укажите его в READ_CACHE, THROTTLE_CACHE и REPLICA_STICKY_CACHE
+    # 'shared': {
+    #     'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+    #     'LOCATION': '127.0.0.1:11211',
+    # },
 }
 
+# Сжатие ответов: минимальный размер тела в байтах, сжимаемые типы, кодировки в порядке предпочтения
+# (br - при установленном пакете brotli), кэш сжатых вариантов ответов со строгим ETag или compression_cache_key,
+# срок хранения и максимальный размер тела для кэширования, степень сжатия
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_CONTENT_TYPES = ['application/json']
+COMPRESSION_ENCODINGS = ['br', 'gzip']
+COMPRESSION_CACHE = 'default'
+COMPRESSION_CACHE_SECONDS = 300
+COMPRESSION_CACHE_MAX_SIZE = 1024 * 1024
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+
+# Ограничение частоты запросов: общий кэш для синхронизации корзин процессов,
+# интервал синхронизации в секундах и максимум корзин в памяти процесса
+THROTTLE_CACHE = 'default'
+THROTTLE_SYNC_SECONDS = 1
+THROTTLE_MAX_BUCKETS = 100000
+
+# Пакетные запросы /api/v1/batch/: максимум вложенных запросов и потоков для параллельного чтения
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_WORKERS = 4
+
+# Журнал изменений каталога /api/v1/changes/: размер страницы по умолчанию и максимальный
+CHANGE_FEED_PAGE_SIZE = 500
+CHANGE_FEED_MAX_PAGE_SIZE = 5000
+
+# История цен товаров (/products/<pk>/prices/, /products/prices/): размер страницы по умолчанию и максимальный
+PRICE_HISTORY_PAGE_SIZE = 1000
+PRICE_HISTORY_MAX_PAGE_SIZE = 10000
+
+# Удаление товаров и подборок по частям (shop/deletion.py): строк в одной транзакции и
+# число зависимых строк, до которого объект удаляется сразу, а не фоновой задачей
+CHUNKED_DELETE_BATCH_SIZE = 1000
+CHUNKED_DELETE_INLINE_LIMIT = 1000
+
+# Доставка событий по заказам (drain_order_outbox): размер пакета, число попыток,
+# экспоненциальная задержка между ними и аренда захваченного пакета (больше таймаута получателя)
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 10
+OUTBOX_BACKOFF_SECONDS = 5
+OUTBOX_BACKOFF_MAX_SECONDS = 600
+OUTBOX_LEASE_SECONDS = 120
+
+# Очередь фоновых задач (run_jobs): число попыток, задержка между ними, период продления
+# аренды выполняемой задачи и время без продления, после которого задача считается брошенной
+JOBS_MAX_ATTEMPTS = 5
+JOBS_BACKOFF_SECONDS = 10
+JOBS_BACKOFF_MAX_SECONDS = 3600
+JOBS_HEARTBEAT_INTERVAL = 60
+JOBS_LOCK_TIMEOUT = 600
+
+# Сколько секунд действует резерв товара под заказ в статусе New
+STOCK_RESERVATION_TTL = 30 * 60
+
+# Максимальное число заказов в одном запросе массовой смены статуса
+ORDER_TRANSITION_MAX_IDS = 50000
+
+# Максимальное число заказов в одном запросе массового создания заказов
+ORDER_BULK_MAX_ORDERS = 1000
+
+# Секционирование таблиц заказов по месяцам (PostgreSQL 12+), см. shop/partitions.py
+ORDER_PARTITIONING = False
+
+# На сколько месяцев вперед создаются секции заказов
+ORDER_PARTITIONS_AHEAD = 3
+
+# Постраничный вывод товаров в подборке: размер страницы по умолчанию и максимальный
+COLLECTION_PRODUCTS_PAGE_SIZE = 50
+COLLECTION_PRODUCTS_MAX_PAGE_SIZE = 500
+
+# Границы групп цен для фасетов списка товаров (?facets=price) и фильтра цен в админке
+PRODUCT_PRICE_FACETS = [0, 500, 1000, 5000, 10000]
+
+# С какого числа строк списки объектов в админке показывают оценку числа строк вместо COUNT(*)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100000
+
+# Подсказки названий товаров /api/v1/products/autocomplete/: число подсказок по умолчанию и максимальное,
+# как часто проверять изменения товаров для обновления индекса, с; обновлять ли индекс в фоновом потоке;
+# при скольких изменениях с прошлой проверки строить индекс заново вместо обновления
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+AUTOCOMPLETE_CHECK_SECONDS = 5
+AUTOCOMPLETE_BACKGROUND_REBUILD = True
+AUTOCOMPLETE_INCREMENTAL_LIMIT = 10000
+
+# Прогрев процесса (api_shop.warmup): включен ли (без DEBUG, чтобы не замедлять перезапуски runserver),
+# сколько соединений открыть с каждой базой после fork, строить ли индекс подсказок названий товаров
+WARMUP_ON_STARTUP = not DEBUG
+WARMUP_DB_CONNECTIONS = 1
+WARMUP_AUTOCOMPLETE_INDEX = False
+
+# Асинхронные обработчики (/api/v1/async/): выполнять ли работу с БД в одном потоке процесса
+# (thread_sensitive) вместо пула потоков; True нужно только тестам с данными в незафиксированной транзакции
+ASYNC_VIEWS_THREAD_SENSITIVE = False
+
+# Кэш ответов retrieve товаров и подборок: сколько секунд ответ свежий и сколько еще
+# его можно отдавать, обновляя в фоне; блокировка в кэше между процессами и ее срок
+READ_CACHE = 'default'
+READ_CACHE_FRESH_SECONDS = 5
+READ_CACHE_STALE_SECONDS = 60
+READ_CACHE_BACKGROUND_REFRESH = True
+READ_CACHE_LOCK = False
+READ_CACHE_LOCK_SECONDS = 5
+
+# Сколько рекомендуемых товаров хранить для каждого товара
+RECOMMENDATIONS_TOP_K = 20
+
+# Сколько секунд пересчет рекомендаций ждет позиции заказов с пропущенными номерами
+# (их транзакции еще не зафиксированы), прежде чем считать пропуски окончательными
+RECOMMENDATIONS_LAG_SECONDS = 600
+
 DJOSER = {
     'PASSWORD_RESET_CONFIRM_URL': '#/password/reset/confirm/{uid}/{token}',
     'USERNAME_RESET_CONFIRM_URL': '#/username/reset/confirm/{uid}/{token}',
@@ -99,17 +238,53 @@ WSGI_APPLICATION = 'api_shop.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Бэкенд postgresql_pool держит на процесс пул открытых соединений (настройки в POOL)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'api_shop.db.backends.postgresql_pool',
         'NAME': 'api_shop',
         'USER': 'postgres',
         'PASSWORD': 'mypassword',
         'HOST': 'localhost',
         'PORT': '5432',
-    }
+        'POOL': {
+            'MAX_SIZE': 10,
+            'TIMEOUT': 5,
+            'HEALTH_CHECK_SECONDS': 30,
+            'MAX_LIFETIME': 1800,
+        },
+    },
+    # Реплика только для чтения; в тестах используется как зеркало default
+    # 'replica': {
+    #     'ENGINE': 'api_shop.db.backends.postgresql_pool',
+    #     'NAME': 'api_shop',
+    #     'USER': 'postgres',
+    #     'PASSWORD': 'mypassword',
+    #     'HOST': 'replica-host',
+    #     'PORT': '5432',
+    #     'TEST': {'MIRROR': 'default'},
+    # },
 }
 
+DATABASE_ROUTERS = ['api_shop.db.routers.ReplicaRouter']
+
+# Алиасы из DATABASES, с которых выполняется чтение
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+# Сколько секунд после записи клиент читает с основной базы и cookie с подписанной меткой записи
+REPLICA_STICKY_SECONDS = 5
+REPLICA_STICKY_COOKIE = 'db_primary'
+# Кэш отметок о записи по пользователю (для клиентов, не возвращающих cookie и X-DB-Primary);
+# при нескольких процессах должен быть общим
+REPLICA_STICKY_CACHE = 'default'
+
+# На сколько секунд недоступная реплика исключается из маршрутизации
+REPLICA_RETRY_SECONDS = 30
+
+# Как часто перепроверять уже открытое соединение с репликой
+REPLICA_HEALTH_CHECK_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
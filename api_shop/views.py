@@ -0,0 +1,14 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from api_shop.db.pool import pool_stats
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def db_pool_metrics(request):
+    """
+    Счетчики пулов соединений текущего процесса: выдачи, ожидания, таймауты
+    """
+    return Response(pool_stats())
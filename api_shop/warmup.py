@@ -0,0 +1,114 @@
+"""
+Прогрев рабочего процесса до приема запросов.
+
+Первые запросы нового процесса gunicorn / uvicorn строят то, что потом хранится до конца
+процесса: таблицы URL-резолвера и метаданные моделей (списки полей и обратные связи в Model._meta,
+их читают сериализаторы, фильтры и ORM), и открывают соединения с базой. warm_up() делает это заранее.
+
+Загрузка wsgi.py и asgi.py (warm_up_on_startup) выполняет только шаги без соединений: с
+gunicorn --preload приложение загружается до fork, и соединения, открытые в главном процессе,
+унаследовали бы все обработчики. Соединения открывает warm_up_worker() в процессе-обработчике,
+его вызывает хук post_worker_init в gunicorn.conf.py. Оба шага выполняются с WARMUP_ON_STARTUP
+(по умолчанию - без DEBUG, то есть не при каждом перезапуске runserver).
+"""
+import logging
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+
+def warm_urls():
+    resolver = get_resolver()
+    # reverse_dict заполняет таблицы резолвера для всех языков и пространств имен
+    resolver.reverse_dict
+    return resolver
+
+
+def warm_models():
+    """
+    Кэши метаданных моделей (cached_property в Model._meta): поля сериализаторов и фильтров
+    создаются заново для каждого запроса, но интроспекция моделей берется отсюда
+    """
+    models = apps.get_models()
+    for model in models:
+        opts = model._meta
+        # get_fields() строит и дерево обратных связей всех моделей
+        opts.get_fields()
+        opts.fields_map
+        opts.concrete_fields
+        opts.related_objects
+    return len(models)
+
+
+def warm_databases():
+    """
+    Открывает WARMUP_DB_CONNECTIONS соединений с каждой базой; ошибки не мешают запуску процесса
+    """
+    opened = 0
+    for alias in settings.DATABASES:
+        connection = connections[alias]
+        try:
+            if hasattr(connection, "get_pool"):
+                pool = connection.get_pool()
+                pooled = [pool.checkout() for _ in range(settings.WARMUP_DB_CONNECTIONS)]
+                for raw_connection in pooled:
+                    pool.checkin(raw_connection)
+                opened += len(pooled)
+            else:
+                connection.ensure_connection()
+                opened += 1
+        except Exception as exc:
+            logger.warning("Прогрев: нет соединения с базой %s: %s", alias, exc)
+    return opened
+
+
+def warm_autocomplete():
+    from shop.autocomplete import product_name_index
+    try:
+        return len(product_name_index.get_index())
+    except Exception as exc:
+        logger.warning("Прогрев: не удалось построить индекс подсказок: %s", exc)
+        return 0
+
+
+def warm_up(connect=True):
+    """
+    Выполняет шаги прогрева, возвращает {шаг: секунды}
+    """
+    timings = {}
+
+    def step(name, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        timings[name] = time.perf_counter() - started
+        return result
+
+    step("urls", warm_urls)
+    step("models", warm_models)
+    if connect:
+        step("databases", warm_databases)
+        if settings.WARMUP_AUTOCOMPLETE_INDEX:
+            step("autocomplete", warm_autocomplete)
+    logger.info("Прогрев: %s", ", ".join(f"{name} {seconds * 1000:.1f} мс" for name, seconds in timings.items()))
+    return timings
+
+
+def warm_up_on_startup():
+    """
+    Прогрев при загрузке приложения (wsgi.py, asgi.py), без соединений с базой
+    """
+    if settings.WARMUP_ON_STARTUP:
+        warm_up(connect=False)
+
+
+def warm_up_worker():
+    """
+    Прогрев процесса-обработчика после fork: соединения с базой и индекс подсказок
+    """
+    if settings.WARMUP_ON_STARTUP:
+        warm_up()
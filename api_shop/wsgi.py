@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api_shop.settings')
 
 application = get_wsgi_application()
+
+# структуры, которые иначе строятся на первых запросах; соединения с БД - в gunicorn.conf.py после fork
+from api_shop.warmup import warm_up_on_startup  # noqa: E402
+
+warm_up_on_startup()
@@ -0,0 +1,71 @@
+"""
+Нагрузочный тест индекса подсказок названий товаров (shop.autocomplete.PrefixIndex)
+без базы данных: строится индекс по синтетическим названиям и измеряется время поиска.
+
+    python benchmarks/autocomplete.py --products 1000000 --queries 20000 --limit 10
+
+Префиксы запросов берутся из случайных названий (1-6 символов), как при наборе текста.
+"""
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "api_shop.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from shop.autocomplete import PrefixIndex  # noqa: E402
+
+WORDS = ["молоко", "сыр", "хлеб", "масло", "чай", "кофе", "сок", "вода", "яблоко", "груша",
+         "apple", "orange", "coffee", "tea", "milk", "cheese", "bread", "butter", "juice", "water"]
+
+
+def product_names(count, seed):
+    rnd = random.Random(seed)
+    for product_id in range(1, count + 1):
+        words = rnd.sample(WORDS, rnd.randint(1, 3))
+        suffix = "".join(rnd.choices(string.ascii_lowercase + string.digits, k=4))
+        yield product_id, f"{' '.join(words).capitalize()} {suffix}"
+
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    names = list(product_names(args.products, args.seed))
+    started = time.perf_counter()
+    index = PrefixIndex(names)
+    print(f"Построение индекса: {len(index)} товаров за {time.perf_counter() - started:.2f} с")
+
+    rnd = random.Random(args.seed + 1)
+    prefixes = [name[:rnd.randint(1, 6)] for _, name in rnd.choices(names, k=args.queries)]
+    timings = []
+    found = 0
+    for prefix in prefixes:
+        started = time.perf_counter()
+        found += len(index.search(prefix, args.limit))
+        timings.append((time.perf_counter() - started) * 1000)
+
+    timings.sort()
+    print(f"Запросов: {len(timings)}, найдено в среднем: {found / len(timings):.1f}")
+    print(f"Время поиска, мс: среднее {statistics.mean(timings):.4f}, p50 {percentile(timings, 0.5):.4f}, "
+          f"p99 {percentile(timings, 0.99):.4f}, максимум {timings[-1]:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Нагрузочный тест: пропускная способность эндпоинтов чтения при большом числе
+одновременных соединений под WSGI и ASGI.
+
+Запуск серверов (gunicorn и uvicorn устанавливаются отдельно):
+
+    gunicorn api_shop.wsgi -w 4 -b 127.0.0.1:8000
+    uvicorn api_shop.asgi:application --workers 4 --port 8001
+
+Сравнение синхронного и асинхронного пути:
+
+    python benchmarks/concurrent_reads.py \\
+        http://127.0.0.1:8000/api/v1/products/ \\
+        http://127.0.0.1:8001/api/v1/async/products/ \\
+        --connections 200 --requests 20
+
+Клиент использует только стандартную библиотеку: каждое соединение держит
+keep-alive и последовательно отправляет GET-запросы.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+async def fetch(reader, writer, host, path, headers):
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\n{headers}Connection: keep-alive\r\n\r\n"
+    writer.write(request.encode())
+    await writer.drain()
+
+    status_line = await reader.readline()
+    length = 0
+    chunked = False
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+        elif name.lower() == "transfer-encoding" and "chunked" in value.lower():
+            chunked = True
+
+    if chunked:
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(length)
+    return int(status_line.split()[1])
+
+
+async def connection_worker(url, requests, headers, latencies, errors):
+    parts = urlsplit(url)
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    try:
+        for _ in range(requests):
+            started = time.perf_counter()
+            status = await fetch(reader, writer, parts.netloc, path, headers)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run(url, connections, requests, token):
+    headers = f"Authorization: Token {token}\r\n" if token else ""
+    latencies, errors = [], []
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(connection_worker(url, requests, headers, latencies, errors) for _ in range(connections)),
+        return_exceptions=True,
+    )
+    elapsed = time.perf_counter() - started
+    failed_connections = sum(isinstance(result, Exception) for result in results)
+    return elapsed, latencies, errors, failed_connections
+
+
+def report(url, elapsed, latencies, errors, failed_connections):
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0
+    print(url)
+    print(f"  запросов:           {len(latencies)} за {elapsed:.2f} с")
+    print(f"  пропускная способн.: {len(latencies) / elapsed:.1f} запр/с")
+    if latencies:
+        print(f"  задержка p50 / p99: {statistics.median(latencies) * 1000:.1f} / {p99 * 1000:.1f} мс")
+    print(f"  ошибок HTTP:        {len(errors)}, оборванных соединений: {failed_connections}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("urls", nargs="+", help="эндпоинты для сравнения")
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=10, help="запросов на одно соединение")
+    parser.add_argument("--token", help="токен пользователя для заголовка Authorization")
+    args = parser.parse_args()
+
+    for url in args.urls:
+        report(url, *asyncio.run(run(url, args.connections, args.requests, args.token)))
+
+
+if __name__ == "__main__":
+    main()
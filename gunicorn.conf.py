@@ -0,0 +1,10 @@
+"""
+Настройки gunicorn (читаются из текущего каталога): gunicorn api_shop.wsgi --preload --workers 4
+"""
+
+
+def post_worker_init(worker):
+    # соединения с БД открываются в процессе-обработчике: с --preload приложение загружено до fork
+    from api_shop.warmup import warm_up_worker
+
+    warm_up_worker()
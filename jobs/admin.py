@@ -0,0 +1,10 @@
+from django.contrib import admin
+from jobs.models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "queue", "task", "status", "attempts", "run_at", "created", "finished_at")
+    list_filter = ("status", "queue")
+    search_fields = ("task", "id")
+    readonly_fields = ("locked_at", "locked_by", "last_error", "progress", "created", "finished_at")
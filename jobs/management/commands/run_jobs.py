@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from jobs.queue import run_pending
+from jobs.worker import WorkerPool
+
+
+class Command(BaseCommand):
+    help = "Запуск обработчиков очереди фоновых задач"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queue", action="append", dest="queues", help="очередь (можно указать несколько раз)")
+        parser.add_argument("--processes", type=int, default=2, help="число процессов-обработчиков")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="пауза, когда задач нет, с")
+        parser.add_argument("--shutdown-timeout", type=float, default=30.0,
+                            help="сколько ждать завершения текущих задач при остановке, с")
+        parser.add_argument("--once", action="store_true",
+                            help="выполнить готовые задачи в текущем процессе и завершиться")
+
+    def handle(self, *args, **options):
+        queues = options["queues"] or ["default"]
+
+        if options["once"]:
+            done = run_pending(queues)
+            self.stdout.write(f"Выполнено задач: {done}")
+            return
+
+        WorkerPool(queues,
+                   processes=options["processes"],
+                   poll_interval=options["poll_interval"],
+                   shutdown_timeout=options["shutdown_timeout"],
+                   ).run()
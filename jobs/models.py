@@ -0,0 +1,88 @@
+from django.db import models
+from django.utils import timezone
+
+
+class JobStatusChoices(models.TextChoices):
+    """
+    Модель TextChoices создает choices set для назначения поля status модели Job
+    """
+    QUEUED = "queued", "В очереди"
+    RUNNING = "running", "Выполняется"
+    DONE = "done", "Выполнена"
+    FAILED = "failed", "Ошибка"
+
+
+class Job(models.Model):
+    """
+    Модель для фоновой задачи в очереди на PostgreSQL
+    """
+    id = models.BigAutoField(primary_key=True)
+    queue = models.CharField(max_length=50,
+                             default="default",
+                             verbose_name="Очередь",
+                             )
+    task = models.CharField(max_length=200,
+                            verbose_name="Функция",
+                            )
+    args = models.JSONField(default=list,
+                            blank=True,
+                            verbose_name="Позиционные аргументы",
+                            )
+    kwargs = models.JSONField(default=dict,
+                              blank=True,
+                              verbose_name="Именованные аргументы",
+                              )
+    status = models.CharField(max_length=10,
+                              choices=JobStatusChoices.choices,
+                              default=JobStatusChoices.QUEUED,
+                              verbose_name="Статус",
+                              )
+    attempts = models.PositiveIntegerField(default=0,
+                                           verbose_name="Попыток",
+                                           )
+    max_attempts = models.PositiveIntegerField(default=5,
+                                               verbose_name="Максимум попыток",
+                                               )
+    run_at = models.DateTimeField(default=timezone.now,
+                                  verbose_name="Запустить после",
+                                  )
+    locked_at = models.DateTimeField(null=True,
+                                     blank=True,
+                                     verbose_name="Взята в работу",
+                                     )
+    locked_by = models.CharField(max_length=100,
+                                 blank=True,
+                                 verbose_name="Обработчик",
+                                 )
+    last_error = models.TextField(blank=True,
+                                  verbose_name="Последняя ошибка",
+                                  )
+    progress = models.JSONField(default=dict,
+                                blank=True,
+                                verbose_name="Ход выполнения",
+                                )
+    created = models.DateTimeField(auto_now_add=True,
+                                   verbose_name="время создания",
+                                   )
+    finished_at = models.DateTimeField(null=True,
+                                       blank=True,
+                                       verbose_name="время завершения",
+                                       )
+
+    class Meta:
+        verbose_name = "Задача"
+        verbose_name_plural = "Задачи"
+        ordering = ["-id"]
+        indexes = [
+            models.Index(fields=["queue", "run_at"],
+                         condition=models.Q(status="queued"),
+                         name="jobs_job_queued_idx",
+                         ),
+            models.Index(fields=["locked_at"],
+                         condition=models.Q(status="running"),
+                         name="jobs_job_running_idx",
+                         ),
+        ]
+
+    def __str__(self):
+        return f"id:{self.id} - {self.task} - {self.status}"
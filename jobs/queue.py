@@ -0,0 +1,215 @@
+"""
+Очередь фоновых задач без внешнего брокера: задачи хранятся в таблице Job,
+обработчики забирают их через SELECT ... FOR UPDATE SKIP LOCKED.
+
+Постановка в очередь из кода обработчика:
+
+    from jobs.queue import enqueue
+    enqueue(notify_order_changed, order.id)
+
+enqueue вызывается в той же транзакции (transaction.atomic), что и изменения данных:
+при откате транзакции задача тоже не появится, а после фиксации изменений задача
+уже записана, даже если процесс сразу упадет.
+"""
+import contextvars
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from jobs.models import Job, JobStatusChoices
+
+logger = logging.getLogger(__name__)
+
+# задача, которую выполняет текущий обработчик (для report_progress)
+current_job = contextvars.ContextVar("current_job", default=None)
+
+
+def task_path(task):
+    if isinstance(task, str):
+        return task
+    return f"{task.__module__}.{task.__qualname__}"
+
+
+def enqueue(task, *args, queue="default", run_at=None, max_attempts=None, **kwargs):
+    """
+    Ставит вызов task(*args, **kwargs) в очередь; аргументы должны сериализоваться в JSON
+    """
+    return Job.objects.create(queue=queue,
+                              task=task_path(task),
+                              args=list(args),
+                              kwargs=kwargs,
+                              run_at=run_at or timezone.now(),
+                              max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+                              )
+
+
+def enqueue_many(task, args_list, queue="default", run_at=None, max_attempts=None):
+    """
+    Ставит в очередь вызовы task(*args) для каждого набора аргументов из args_list одним INSERT
+    """
+    run_at = run_at or timezone.now()
+    return Job.objects.bulk_create(Job(queue=queue,
+                                       task=task_path(task),
+                                       args=list(args),
+                                       kwargs={},
+                                       run_at=run_at,
+                                       max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+                                       )
+                                   for args in args_list)
+
+
+def claim(queues=("default",), worker_id=""):
+    """
+    Забирает одну готовую к выполнению задачу. Задачи, обработчик которых не продлевал
+    аренду (heartbeat) JOBS_LOCK_TIMEOUT секунд (например, процесс был убит), забираются повторно,
+    а если попытки исчерпаны - помечаются как упавшие
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT)
+    with transaction.atomic():
+        # задача, которая раз за разом убивает обработчик (OOM, segfault), не должна повторяться вечно
+        (Job.objects
+         .filter(queue__in=queues, status=JobStatusChoices.RUNNING, locked_at__lt=stale,
+                 attempts__gte=F("max_attempts"))
+         .update(status=JobStatusChoices.FAILED,
+                 finished_at=now,
+                 locked_at=None,
+                 last_error="Обработчик не завершил задачу: попытки исчерпаны",
+                 ))
+        job = (Job.objects
+               .select_for_update(skip_locked=True)
+               .filter(queue__in=queues)
+               .filter(Q(status=JobStatusChoices.QUEUED, run_at__lte=now)
+                       | Q(status=JobStatusChoices.RUNNING, locked_at__lt=stale, attempts__lt=F("max_attempts")))
+               .order_by("run_at", "id")
+               .first())
+        if job is None:
+            return None
+        job.status = JobStatusChoices.RUNNING
+        job.locked_at = now
+        job.locked_by = worker_id
+        job.attempts += 1
+        job.save(update_fields=["status", "locked_at", "locked_by", "attempts"])
+    return job
+
+
+def leased(job):
+    """
+    Задача, пока она числится за этим обработчиком: число попыток меняется при каждом
+    повторном захвате, поэтому захват той же задачи другим обработчиком (или тем же worker_id) не совпадет
+    """
+    return Job.objects.filter(pk=job.pk,
+                              status=JobStatusChoices.RUNNING,
+                              locked_by=job.locked_by,
+                              attempts=job.attempts,
+                              )
+
+
+def heartbeat(job):
+    """
+    Продлевает аренду задачи. Возвращает False, если задачу уже забрал другой обработчик
+    """
+    job.locked_at = timezone.now()
+    return bool(leased(job).update(locked_at=job.locked_at))
+
+
+class Heartbeat(threading.Thread):
+    """
+    Поток, продлевающий аренду задачи каждые JOBS_HEARTBEAT_INTERVAL секунд, пока она выполняется
+    """
+
+    def __init__(self, job):
+        super().__init__(name=f"job-{job.pk}-heartbeat", daemon=True)
+        self.job = job
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(settings.JOBS_HEARTBEAT_INTERVAL):
+                try:
+                    if not heartbeat(self.job):
+                        logger.warning("Задача %s (%s) забрана другим обработчиком", self.job.id, self.job.task)
+                        return
+                except DatabaseError:
+                    logger.exception("Не удалось продлить аренду задачи %s", self.job.id)
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def retry_delay(attempts):
+    return min(settings.JOBS_BACKOFF_SECONDS * 2 ** (attempts - 1), settings.JOBS_BACKOFF_MAX_SECONDS)
+
+
+def execute(job):
+    """
+    Выполняет задачу и записывает результат. Упавшая задача возвращается в очередь
+    с экспоненциальной задержкой, пока не исчерпаны попытки
+    """
+    token = current_job.set(job)
+    beat = Heartbeat(job)
+    beat.start()
+    try:
+        func = import_string(job.task)
+        func(*job.args, **job.kwargs)
+    except Exception:
+        logger.exception("Задача %s (%s) завершилась с ошибкой", job.id, job.task)
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = JobStatusChoices.QUEUED
+            job.run_at = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+        else:
+            job.status = JobStatusChoices.FAILED
+            job.finished_at = timezone.now()
+    else:
+        job.status = JobStatusChoices.DONE
+        job.finished_at = timezone.now()
+    finally:
+        beat.stop()
+        current_job.reset(token)
+
+    job.locked_at = None
+    # результат записывается, только если задачу за это время не забрал другой обработчик
+    if not leased(job).update(status=job.status,
+                              run_at=job.run_at,
+                              last_error=job.last_error,
+                              finished_at=job.finished_at,
+                              locked_at=None,
+                              ):
+        logger.warning("Задача %s (%s) забрана другим обработчиком, результат не записан", job.id, job.task)
+    return job.status
+
+
+def report_progress(progress):
+    """
+    Записывает ход выполнения (JSON) в выполняемую задачу; вне обработчика очереди ничего не делает
+    """
+    job = current_job.get()
+    if job is not None:
+        job.progress = progress
+        job.locked_at = timezone.now()
+        leased(job).update(progress=progress, locked_at=job.locked_at)
+
+
+def run_pending(queues=("default",), worker_id="", limit=None):
+    """
+    Выполняет готовые задачи в текущем процессе, пока они есть (или до limit задач)
+    """
+    done = 0
+    while limit is None or done < limit:
+        job = claim(queues, worker_id)
+        if job is None:
+            break
+        execute(job)
+        done += 1
+    return done
@@ -0,0 +1,97 @@
+"""
+Многопроцессный обработчик очереди задач.
+
+Родительский процесс запускает processes дочерних процессов и следит за ними.
+SIGTERM/SIGINT передается дочерним процессам: каждый дорабатывает текущую задачу
+и завершается; по истечении shutdown_timeout оставшиеся процессы завершаются принудительно (SIGKILL).
+"""
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+import django
+from django.db import DatabaseError, close_old_connections, connections
+
+from jobs.queue import claim, execute
+
+logger = logging.getLogger(__name__)
+
+
+def worker_loop(queues, poll_interval):
+    django.setup()
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    logger.info("Обработчик %s запущен, очереди: %s", worker_id, ", ".join(queues))
+    while not stopping:
+        close_old_connections()
+        try:
+            job = claim(queues, worker_id)
+        except DatabaseError:
+            logger.exception("Не удалось получить задачу из очереди")
+            connections.close_all()
+            job = None
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        execute(job)
+    connections.close_all()
+    logger.info("Обработчик %s остановлен", worker_id)
+
+
+class WorkerPool:
+    def __init__(self, queues, processes, poll_interval=1.0, shutdown_timeout=30.0):
+        self.queues = tuple(queues)
+        self.processes = processes
+        self.poll_interval = poll_interval
+        self.shutdown_timeout = shutdown_timeout
+        self.children = []
+        self.stopping = False
+
+    def spawn(self):
+        # соединения родителя не должны наследоваться дочерними процессами
+        connections.close_all()
+        process = multiprocessing.Process(target=worker_loop, args=(self.queues, self.poll_interval), daemon=False)
+        process.start()
+        return process
+
+    def stop(self, signum=None, frame=None):
+        self.stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        self.children = [self.spawn() for _ in range(self.processes)]
+
+        while not self.stopping:
+            for index, process in enumerate(self.children):
+                if not process.is_alive():
+                    logger.warning("Обработчик %s завершился с кодом %s, перезапуск", process.pid, process.exitcode)
+                    self.children[index] = self.spawn()
+            time.sleep(self.poll_interval)
+
+        self.shutdown()
+
+    def shutdown(self):
+        for process in self.children:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+        deadline = time.monotonic() + self.shutdown_timeout
+        for process in self.children:
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                logger.warning("Обработчик %s не завершился за %s с", process.pid, self.shutdown_timeout)
+                # SIGTERM дочерний процесс уже перехватил, поэтому SIGKILL
+                process.kill()
+                process.join()
@@ -1,5 +1,117 @@
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from shop.deletion import DEPENDENTS, count_dependents, delete_or_enqueue
 from shop.models import *
+from shop.transitions import bulk_transition
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Для списка без фильтров по большой таблице (от ADMIN_ESTIMATED_COUNT_THRESHOLD строк)
+    число строк берется из статистики PostgreSQL (pg_class.reltuples) вместо COUNT(*)
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            estimate = estimated_count(queryset)
+            if estimate is not None and estimate >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+def estimated_count(queryset):
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    # для секционированной таблицы (см. shop/partitions.py) статистика хранится по секциям
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sum(reltuples) FROM pg_class WHERE reltuples > 0 AND (oid = to_regclass(%s) "
+                       "OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%s)))",
+                       [queryset.model._meta.db_table] * 2)
+        estimate = cursor.fetchone()[0]
+    return int(estimate) if estimate else None
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Список объектов большой таблицы: оценка числа строк вместо COUNT(*) и поиск только
+    по индексам - число ищется по id, остальное - точным совпадением с полями search_fields
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if search_term.isdigit():
+            return queryset.filter(pk=int(search_term)), False
+        query = Q()
+        for field in self.search_fields:
+            query |= Q(**{field: search_term})
+        return queryset.filter(query), False
+
+
+class ChunkedDeleteAdmin(admin.ModelAdmin):
+    """
+    Удаление по частям (см. shop.deletion): объект с большим числом зависимых строк
+    удаляется фоновой задачей. Страница подтверждения показывает число зависимых строк
+    вместо списка всех каскадно удаляемых объектов
+    """
+
+    def get_deleted_objects(self, objs, request):
+        limit = settings.CHUNKED_DELETE_INLINE_LIMIT
+        deleted_objects = []
+        for obj in objs:
+            count = count_dependents(obj, limit)
+            deleted_objects.append(f"{obj} - зависимых строк: {count if count <= limit else f'больше {limit}'}")
+        perms_needed = set()
+        for model, field in DEPENDENTS[self.model]:
+            opts = model._meta
+            if not request.user.has_perm(f"{opts.app_label}.delete_{opts.model_name}") \
+                    and model.objects.filter(**{f"{field}__in": objs}).exists():
+                perms_needed.add(opts.verbose_name)
+        return deleted_objects, {self.model._meta.verbose_name_plural: len(deleted_objects)}, perms_needed, []
+
+    def delete_model(self, request, obj):
+        job = delete_or_enqueue(obj)
+        if job is not None:
+            self.message_user(request, f"{obj}: удаление по частям поставлено в очередь (задача {job.id})",
+                              messages.WARNING)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            self.delete_model(request, obj)
+
+
+class PriceRangeFilter(admin.SimpleListFilter):
+    """
+    Фильтр по диапазонам цен из PRODUCT_PRICE_FACETS вместо списка всех различных цен
+    """
+    title = "Цена"
+    parameter_name = "price_range"
+
+    def lookups(self, request, model_admin):
+        bounds = settings.PRODUCT_PRICE_FACETS
+        ranges = [(f"{low}-{high}", f"{low} - {high}") for low, high in zip(bounds, bounds[1:])]
+        return ranges + [(f"{bounds[-1]}-", f"от {bounds[-1]}")]
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        low, _, high = self.value().partition("-")
+        try:
+            queryset = queryset.filter(price__gte=low)
+            return queryset.filter(price__lt=high) if high else queryset
+        except (ValueError, ValidationError):
+            return queryset.none()
 
 
 class OrderProductPositionInline(admin.TabularInline):
@@ -10,29 +122,60 @@ class OrderProductPositionInline(admin.TabularInline):
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
-    list_display = ("id", "name", "description", "price", "slug", "created", "updated")
-    list_filter = ("name", "price")
-    search_fields = ("slug", "id")
+class ProductAdmin(ChunkedDeleteAdmin, LargeTableAdmin):
+    list_display = ("id", "name", "description", "price", "stock", "slug", "created", "updated")
+    list_filter = (PriceRangeFilter, "created")
+    search_fields = ("slug",)
     prepopulated_fields = {"slug": ("name",)}
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(LargeTableAdmin):
     list_display = ("id", "user", "status", "total_cost", "created", "updated")
-    list_filter = ("updated", "created")
-    search_fields = ("user", "id", "status", "total_cost")
+    list_filter = ("status", "updated", "created")
+    list_select_related = ("user",)
+    search_fields = ("user__username",)
+    autocomplete_fields = ["user"]
     inlines = [OrderProductPositionInline]
+    actions = ["mark_in_progress", "mark_done"]
+
+    def _transition(self, request, queryset, status):
+        updated, skipped = bulk_transition(queryset.values_list("id", flat=True), status)
+        self.message_user(request, f"Переведено заказов: {len(updated)}")
+        if skipped:
+            self.message_user(request, f"Пропущено заказов: {len(skipped)}", messages.WARNING)
+
+    def mark_in_progress(self, request, queryset):
+        self._transition(request, queryset, OrderStatusChoices.IN_PROGRESS)
+    mark_in_progress.short_description = "Перевести в статус In_progress"
+
+    def mark_done(self, request, queryset):
+        self._transition(request, queryset, OrderStatusChoices.DONE)
+    mark_done.short_description = "Перевести в статус Done"
 
 
+
+@admin.register(UserOrderStats)
+class UserOrderStatsAdmin(admin.ModelAdmin):
+    """
+    Сводки обновляются заказами; исправляются командой check_order_stats --fix
+    """
+    list_display = ("user", "orders_count", "total_spent", "last_order_date")
+    list_select_related = ("user",)
+    search_fields = ("user__username",)
+    readonly_fields = ("user", "orders_count", "total_spent", "last_order_date")
+
+    def has_add_permission(self, request):
+        return False
+
 class CollectionProductInline(admin.TabularInline):
     model = CollectionProduct
     raw_id_fields = ['product']
 
 
 @admin.register(Collection)
-class CollectionAdmin(admin.ModelAdmin):
-    list_display = ("id", "name", "slug", "text", "created", "updated")
+class CollectionAdmin(ChunkedDeleteAdmin):
+    list_display = ("id", "name", "slug", "text", "products_count", "min_price", "max_price", "created", "updated")
     list_filter = ("updated", "created")
     search_fields = ("slug", "id", )
     prepopulated_fields = {"slug": ("name",)}
@@ -40,10 +183,13 @@ class CollectionAdmin(admin.ModelAdmin):
 
 
 @admin.register(ProductReview)
-class ProductReviewAdmin(admin.ModelAdmin):
+class ProductReviewAdmin(LargeTableAdmin):
     list_display = ("id", "user",  "text", "product", "created", "updated")
-    list_filter = ("updated", "created")
-    search_fields = ("user", "id", )
+    list_filter = ("rating", "updated", "created")
+    list_select_related = ("user", "product")
+    search_fields = ("user__username",)
+    autocomplete_fields = ["user"]
+    raw_id_fields = ["product"]
 
 
 
@@ -0,0 +1,130 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.shortcuts import get_object_or_404
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from shop.filters import ProductFilter, ReviewFilter
+from shop.models import Product, ProductReview, Collection
+from shop.serializers import ProductSerializer, ReviewSerializer, CollectionSerializer, CollectionListSerializer
+
+
+def run_in_db_thread(func, *args, **kwargs):
+    """
+    Запуск синхронного кода, работающего с ORM, из асинхронного обработчика.
+    В Django 3.1 нет асинхронного интерфейса ORM, а sync_to_async(thread_sensitive=True)
+    выполняет код всех асинхронных запросов процесса в одном потоке, то есть по очереди.
+    Поэтому код выполняется в пуле потоков, а соединения потока закрываются после вызова
+    (с бэкендом postgresql_pool - возвращаются в пул). С ASYNC_VIEWS_THREAD_SENSITIVE = True
+    код выполняется в одном потоке (в тестах данные видны только в транзакции основного потока)
+    """
+    if settings.ASYNC_VIEWS_THREAD_SENSITIVE:
+        return sync_to_async(func, thread_sensitive=True)(*args, **kwargs)
+    return sync_to_async(_call_and_close, thread_sensitive=False)(func, *args, **kwargs)
+
+
+def _call_and_close(func, *args, **kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        connections.close_all()
+
+
+class AsyncReadOnlyView(APIView):
+    """
+    Базовый асинхронный обработчик для действий list и retrieve под ASGI.
+    Аутентификация, проверка прав и ограничение частоты запросов выполняются APIView.initial(),
+    как в синхронных ViewSet'ах. Вся работа с БД одного запроса (initial, выборка, проверка прав
+    на объект, сериализация) выполняется одним вызовом в пуле потоков
+    """
+    queryset = None
+    serializer_class = None
+    list_serializer_class = None
+    filterset_class = None
+    permission_classes = ()
+    renderer_classes = (JSONRenderer,)
+    throttle_scope = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        async def view(request, *args, **kwargs):
+            return await cls(**initkwargs).dispatch(request, *args, **kwargs)
+
+        view.cls = cls
+        view.initkwargs = initkwargs
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            response = Response(await run_in_db_thread(self.handle, request, *args, **kwargs))
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        return self.finalize_response(request, response, *args, **kwargs).render()
+
+    def handle(self, request, *args, pk=None, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            raise exceptions.MethodNotAllowed(request.method)
+        self.initial(request, *args, pk=pk, **kwargs)
+        if pk is None:
+            return self.list(request)
+        return self.retrieve(request, pk)
+
+    def get_queryset(self):
+        return self.queryset.all()
+
+    def filter_queryset(self, request, queryset):
+        if self.filterset_class is None:
+            return queryset
+        filterset = self.filterset_class(request.GET, queryset=queryset, request=request)
+        if not filterset.is_valid():
+            raise exceptions.ValidationError(filterset.errors)
+        return filterset.qs
+
+    def serialize(self, instance, many=False):
+        serializer_class = self.list_serializer_class if many and self.list_serializer_class else self.serializer_class
+        return serializer_class(instance, many=many, context={"request": self.request, "view": self}).data
+
+    def list(self, request):
+        queryset = self.filter_queryset(request, self.get_queryset())
+        return self.serialize(list(queryset), many=True)
+
+    def retrieve(self, request, pk):
+        obj = get_object_or_404(self.get_queryset(), pk=pk)
+        self.check_object_permissions(request, obj)
+        return self.serialize(obj)
+
+
+class AsyncProductView(AsyncReadOnlyView):
+    """
+    Асинхронный обработчик чтения объектов модели Product
+    """
+    queryset = Product.objects.all()
+    serializer_class = ProductSerializer
+    filterset_class = ProductFilter
+    throttle_scope = "products"
+
+
+class AsyncReviewView(AsyncReadOnlyView):
+    """
+    Асинхронный обработчик чтения объектов модели ProductReview
+    """
+    queryset = ProductReview.objects.select_related("user", "product")
+    serializer_class = ReviewSerializer
+    filterset_class = ReviewFilter
+
+
+class AsyncCollectionView(AsyncReadOnlyView):
+    """
+    Асинхронный обработчик чтения объектов модели Collection
+    """
+    queryset = Collection.objects.all()
+    serializer_class = CollectionSerializer
+    list_serializer_class = CollectionListSerializer
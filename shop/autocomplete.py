@@ -0,0 +1,173 @@
+"""
+Подсказки названий товаров при вводе (/api/v1/products/autocomplete/?q=).
+
+Названия всех товаров хранятся в памяти процесса отсортированными по ключу
+(название в нижнем регистре); товары с названием, начинающимся с q, находятся
+двоичным поиском за O(log n) и читаются подряд до limit.
+
+Индекс обновляется при изменении товаров: не чаще раза в AUTOCOMPLETE_CHECK_SECONDS
+читаются записи о товарах в журнале изменений каталога (ChangeLog) после курсора (txid, id),
+по которому построен индекс (как в /api/v1/changes/, поэтому записи, зафиксированные позже
+записей с большим id, не пропускаются), и для измененных товаров перечитываются только их названия. Изменения,
+не затронувшие название (например, списание остатков), индекс не меняют; при других индекс
+копируется с изменениями, а при числе изменений больше AUTOCOMPLETE_INCREMENTAL_LIMIT строится
+заново. Обновление выполняется в фоновом потоке (AUTOCOMPLETE_BACKGROUND_REBUILD); до замены
+запросы обслуживает предыдущий индекс.
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from django.db import connection
+
+from shop.models import ChangeLog, Product
+
+
+def normalize(text):
+    return " ".join(text.casefold().split())
+
+
+class PrefixIndex:
+    """
+    Отсортированный список названий для поиска по префиксу
+    """
+
+    def __init__(self, items=(), version=(0, 0)):
+        entries = sorted((normalize(name), product_id, name) for product_id, name in items)
+        self.keys = [entry[0] for entry in entries]
+        self.ids = [entry[1] for entry in entries]
+        self.names = [entry[2] for entry in entries]
+        self.key_of = {entry[1]: entry[0] for entry in entries}
+        self.version = version
+
+    def __len__(self):
+        return len(self.keys)
+
+    def find(self, key, product_id):
+        """
+        Позиция записи (key, product_id) или место для ее вставки
+        """
+        low, high = bisect_left(self.keys, key), bisect_right(self.keys, key)
+        return bisect_left(self.ids, product_id, low, high)
+
+    def updated(self, names, version):
+        """
+        Индекс с измененными названиями: names - {id товара: название или None, если товар удален}.
+        Возвращает копию, текущий индекс продолжает обслуживать запросы
+        """
+        changes = {product_id: name for product_id, name in names.items()
+                   if name != self.name_of(product_id)}
+        if not changes:
+            self.version = version
+            return self
+
+        index = PrefixIndex(version=version)
+        index.keys, index.ids, index.names = list(self.keys), list(self.ids), list(self.names)
+        index.key_of = dict(self.key_of)
+        for product_id, name in changes.items():
+            key = index.key_of.pop(product_id, None)
+            if key is not None:
+                position = index.find(key, product_id)
+                del index.keys[position], index.ids[position], index.names[position]
+            if name is not None:
+                key = index.key_of[product_id] = normalize(name)
+                position = index.find(key, product_id)
+                index.keys.insert(position, key)
+                index.ids.insert(position, product_id)
+                index.names.insert(position, name)
+        return index
+
+    def name_of(self, product_id):
+        key = self.key_of.get(product_id)
+        return None if key is None else self.names[self.find(key, product_id)]
+
+    def search(self, prefix, limit=10):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        result = []
+        index = bisect_left(self.keys, prefix)
+        while index < len(self.keys) and len(result) < limit and self.keys[index].startswith(prefix):
+            result.append({"id": self.ids[index], "name": self.names[index]})
+            index += 1
+        return result
+
+
+def product_changes(version=(0, 0)):
+    """
+    Записи журнала о товарах после курсора version = (txid, id), см. ChangeLog.after
+    """
+    return ChangeLog.after(*version).filter(entity=Product._meta.model_name)
+
+
+def products_version():
+    """
+    Курсор последней видимой записи журнала о товарах: записи незавершенных транзакций
+    в него не входят и будут применены к индексу позже
+    """
+    return product_changes().reverse().values_list("txid", "id").first() or (0, 0)
+
+
+def build_index():
+    version = products_version()
+    products = Product.objects.order_by().values_list("id", "name").iterator(chunk_size=10000)
+    return PrefixIndex(products, version=version)
+
+
+class ProductAutocomplete:
+    def __init__(self):
+        self.index = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def get_index(self):
+        if self.index is None:
+            with self.lock:
+                if self.index is None:
+                    self.index = build_index()
+                    self.checked_at = time.monotonic()
+            return self.index
+
+        if time.monotonic() - self.checked_at >= settings.AUTOCOMPLETE_CHECK_SECONDS \
+                and self.lock.acquire(blocking=False):
+            self.checked_at = time.monotonic()
+            if settings.AUTOCOMPLETE_BACKGROUND_REBUILD:
+                threading.Thread(target=self.rebuild_in_background, name="product-autocomplete", daemon=True).start()
+            else:
+                self.rebuild()
+        return self.index
+
+    def rebuild(self):
+        """
+        Применяет к индексу изменения товаров из журнала; вызывается с захваченным self.lock
+        """
+        try:
+            limit = settings.AUTOCOMPLETE_INCREMENTAL_LIMIT
+            changes = list(product_changes(self.index.version).values_list("txid", "id", "object_id")[:limit + 1])
+            if len(changes) > limit:
+                self.index = build_index()
+            elif changes:
+                product_ids = {object_id for txid, change_id, object_id in changes}
+                names = dict(Product.objects.filter(id__in=product_ids).values_list("id", "name"))
+                self.index = self.index.updated({product_id: names.get(product_id) for product_id in product_ids},
+                                                version=tuple(changes[-1][:2]))
+        finally:
+            self.lock.release()
+
+    def rebuild_in_background(self):
+        try:
+            self.rebuild()
+        finally:
+            # у фонового потока свое соединение с базой
+            connection.close()
+
+    def search(self, prefix, limit=10):
+        return self.get_index().search(prefix, limit)
+
+    def reset(self):
+        with self.lock:
+            self.index = None
+
+
+product_name_index = ProductAutocomplete()
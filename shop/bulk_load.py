@@ -0,0 +1,242 @@
+"""
+Быстрая загрузка фикстур (дампов dumpdata в формате json, как fixtures.json).
+
+В отличие от loaddata объекты не сохраняются по одному через save():
+
+* файл читается потоково, по одному объекту массива, и раскладывается по временным
+  файлам отдельно для каждой модели;
+* модели загружаются в порядке зависимостей (сначала те, на которые ссылаются
+  внешние ключи) пакетами INSERT без сигналов pre_save / post_save;
+* после загрузки одним проходом создаются токены пользователей без токена,
+  записываются в историю цены загруженных товаров, пересчитываются сводки подборок,
+  сводки заказов пользователей и даты позиций заказов, сбрасываются счетчики первичных ключей.
+
+В памяти одновременно находится не больше одного пакета объектов.
+"""
+import gzip
+import json
+import re
+import tempfile
+from collections import defaultdict
+from itertools import islice
+from pathlib import Path
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core import serializers
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.db.models import F, OuterRef, Subquery
+from rest_framework.authtoken.models import Token
+
+from shop.models import CHANGE_FEED_MODELS, ChangeActionChoices, ChangeLog, Collection, CollectionProduct, Order, \
+    OrderProductPosition, Product, ProductPrice, UserOrderStats
+
+SEPARATORS = re.compile(r"[\s,]*")
+
+
+def iter_json_array(stream, chunk_size=1 << 16):
+    """
+    Возвращает элементы JSON-массива из потока по одному, не читая файл целиком
+    """
+    decoder = json.JSONDecoder()
+    buffer, index = "", 0
+    opened = eof = False
+    while True:
+        index = SEPARATORS.match(buffer, index).end()
+        if index < len(buffer):
+            if not opened:
+                if buffer[index] != "[":
+                    raise ValueError("Фикстура должна быть JSON-массивом")
+                opened = True
+                index += 1
+                continue
+            if buffer[index] == "]":
+                return
+            try:
+                item, index = decoder.raw_decode(buffer, index)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield item
+                continue
+        elif eof:
+            raise ValueError("Неожиданный конец фикстуры")
+
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer, index = buffer[index:] + chunk, 0
+
+
+def open_fixture(path):
+    if str(path).endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def model_matches(label, excluded):
+    app_label = label.split(".")[0]
+    return label in excluded or app_label in excluded
+
+
+def dependency_order(models):
+    """
+    Сортирует модели так, чтобы модели, на которые ссылаются внешние ключи,
+    загружались раньше. Циклические ссылки допустимы: проверка внешних ключей
+    откладывается до конца транзакции
+    """
+    models = list(models)
+    dependencies = {
+        model: {field.related_model for field in model._meta.concrete_fields
+                if field.is_relation and field.related_model in models and field.related_model is not model}
+        for model in models
+    }
+    ordered = []
+    while dependencies:
+        ready = [model for model in models if model in dependencies and not dependencies[model] - set(ordered)]
+        if not ready:
+            ready = [model for model in models if model in dependencies][:1]
+        for model in ready:
+            ordered.append(model)
+            del dependencies[model]
+    return ordered
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def spool(path, directory, excluded):
+    """
+    Раскладывает объекты фикстуры по файлам моделей (json lines), возвращает {модель: файл}
+    """
+    files = {}
+    handles = {}
+    try:
+        with open_fixture(path) as stream:
+            for item in iter_json_array(stream):
+                label = item["model"].lower()
+                if model_matches(label, excluded):
+                    continue
+                model = apps.get_model(label)
+                if model not in handles:
+                    files[model] = Path(directory) / f"{label}.jsonl"
+                    handles[model] = open(files[model], "w", encoding="utf-8")
+                handles[model].write(json.dumps(item, ensure_ascii=False))
+                handles[model].write("\n")
+    finally:
+        for handle in handles.values():
+            handle.close()
+    return files
+
+
+def read_spool(path):
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            yield json.loads(line)
+
+
+def insert_batch(model, items, using, ignore_conflicts):
+    """
+    Вставляет пакет объектов одной модели как есть (raw: auto_now и сигналы не срабатывают)
+    и строки промежуточных таблиц ManyToMany. Возвращает число объектов
+    """
+    objects = list(serializers.deserialize("python", items, using=using))
+    instances = [obj.object for obj in objects]
+    fields = model._meta.local_concrete_fields
+    queryset = model._base_manager.using(using)
+    batch_size = connections[using].ops.bulk_batch_size(fields, instances) or len(instances)
+    for chunk in batches(instances, batch_size):
+        queryset._insert(chunk, fields=fields, using=using, raw=True, ignore_conflicts=ignore_conflicts)
+    if model in CHANGE_FEED_MODELS:
+        # вставка без сигналов - записи журнала изменений каталога добавляются пакетом
+        ChangeLog.record(model, [instance.pk for instance in instances], ChangeActionChoices.INSERT)
+
+    links = defaultdict(list)
+    for obj in objects:
+        for name, values in (obj.m2m_data or {}).items():
+            field = model._meta.get_field(name)
+            through = field.remote_field.through
+            source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+            links[through].extend(through(**{f"{source}_id": obj.object.pk, f"{target}_id": value})
+                                  for value in values)
+    for through, rows in links.items():
+        through.objects.using(using).bulk_create(rows, batch_size=batch_size, ignore_conflicts=ignore_conflicts)
+    return len(instances)
+
+
+def create_missing_tokens(using, batch_size):
+    """
+    Создает токены пользователям без токена (вместо create_auth_token на каждый post_save)
+    """
+    users = (get_user_model()._base_manager.using(using)
+             .filter(auth_token__isnull=True)
+             .order_by("pk")
+             .values_list("pk", flat=True))
+    created, last = 0, None
+    while True:
+        user_ids = list((users if last is None else users.filter(pk__gt=last))[:batch_size])
+        if not user_ids:
+            break
+        Token.objects.using(using).bulk_create([Token(user_id=user_id, key=Token.generate_key())
+                                                for user_id in user_ids])
+        created += len(user_ids)
+        last = user_ids[-1]
+    return created
+
+
+def refresh_derived_fields(models, using, batch_size):
+    """
+    Пересчитывает поля, которые обычно заполняют обработчики сигналов
+    """
+    if Order in models:
+        users = get_user_model()._base_manager.using(using).order_by("pk").values_list("pk", flat=True)
+        for user_ids in batches(users.iterator(chunk_size=batch_size), batch_size):
+            UserOrderStats.rebuild(user_ids)
+    if Product in models:
+        # цены, которых нет в истории (или в фикстуре нет истории цен)
+        ProductPrice.record_changes(Product.objects.using(using), batch_size=batch_size, log=False)
+    if {Collection, CollectionProduct, Product} & set(models):
+        Collection.refresh_summary(list(Collection.objects.using(using).values_list("id", flat=True)))
+    if OrderProductPosition in models:
+        (OrderProductPosition.objects.using(using)
+         .exclude(created=F("order__created"))
+         .update(
+             created=Subquery(Order.objects.filter(pk=OuterRef("order_id")).values("created")[:1]),
+         ))
+
+
+def reset_sequences(models, using):
+    connection = connections[using]
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+
+def bulk_load(path, using="default", batch_size=5000, exclude=(), ignore_conflicts=False):
+    """
+    Загружает фикстуру path, возвращает ({метка модели: число объектов}, число созданных токенов)
+    """
+    excluded = {label.lower() for label in exclude}
+    counts = {}
+    with tempfile.TemporaryDirectory(prefix="bulk_load_") as directory:
+        files = spool(path, directory, excluded)
+        models = dependency_order(files)
+        with transaction.atomic(using=using):
+            for model in models:
+                counts[model._meta.label] = sum(
+                    insert_batch(model, items, using, ignore_conflicts)
+                    for items in batches(read_spool(files[model]), batch_size)
+                )
+            tokens = create_missing_tokens(using, batch_size)
+            refresh_derived_fields(models, using, batch_size)
+            reset_sequences(models, using)
+    return counts, tokens
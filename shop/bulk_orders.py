@@ -0,0 +1,167 @@
+"""
+Массовое создание заказов одним запросом (POST /api/v1/orders/bulk/).
+
+Каждый заказ проверяется отдельно: ошибка в одном заказе не мешает создать остальные
+(если не указано atomic). Товары всех заказов читаются одним запросом, суммы
+считаются в памяти, остатки списываются одним условным UPDATE на все заказы;
+если какого-то товара не хватает, остатки списываются по заказам по очереди,
+и заказы, которым не хватило товара, возвращаются с ошибкой.
+Заказы и позиции вставляются двумя bulk_create.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from jobs.queue import enqueue_many
+from shop.models import Order, OrderEventTypeChoices, OrderOutboxEvent, OrderProductPosition, Product, \
+    StockReservation, UserOrderStats
+from shop.serializers import BulkOrderItemSerializer
+from shop.stock import OutOfStock, reserve_stock
+from shop.tasks import notify_order_changed
+
+
+class PlannedOrder:
+    """
+    Проверенный заказ до вставки: позиции - пары (товар, количество)
+    """
+
+    def __init__(self, index, positions):
+        self.index = index
+        self.positions = positions
+        self.total_cost = round(sum(product.price * quantity for product, quantity in positions), 2)
+        self.reserved = {}
+        self.order = None
+
+    def quantities(self):
+        quantities = defaultdict(int)
+        products = {}
+        for product, quantity in self.positions:
+            quantities[product.id] += quantity
+            products[product.id] = product
+        return {products[product_id]: quantity for product_id, quantity in quantities.items()}
+
+
+class BatchRejected(Exception):
+    """
+    В пакете с atomic есть ошибки - не создается ни один заказ
+    """
+
+
+def plan_orders(orders_data):
+    """
+    orders_data - заказы из запроса [{"positions": [{"product_id", "quantity"}]}].
+    Возвращает (заказы к созданию, {номер заказа: ошибки})
+    """
+    valid, errors = [], {}
+    for index, data in enumerate(orders_data):
+        serializer = BulkOrderItemSerializer(data=data)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors[index] = serializer.errors
+
+    product_ids = {position["product_id"] for index, order in valid for position in order["positions"]}
+    products = Product.objects.in_bulk(product_ids)
+
+    planned = []
+    for index, order in valid:
+        missing = sorted({position["product_id"] for position in order["positions"]} - products.keys())
+        if missing:
+            errors[index] = {"positions": f"Товары не найдены: {', '.join(map(str, missing))}"}
+            continue
+        planned.append(PlannedOrder(index, [(products[position["product_id"]], position["quantity"])
+                                            for position in order["positions"]]))
+    return planned, errors
+
+
+def reserve_planned(planned, errors):
+    """
+    Списывает остатки под заказы; возвращает заказы, которым хватило товара
+    """
+    combined = defaultdict(int)
+    products = {}
+    for plan in planned:
+        for product, quantity in plan.quantities().items():
+            combined[product.id] += quantity
+            products[product.id] = product
+    try:
+        reserved = reserve_stock({products[product_id]: quantity for product_id, quantity in combined.items()})
+    except OutOfStock:
+        pass
+    else:
+        for plan in planned:
+            plan.reserved = {product.id: quantity for product, quantity in plan.quantities().items()
+                             if product.id in reserved}
+        return planned
+
+    accepted = []
+    for plan in planned:
+        try:
+            plan.reserved = reserve_stock(plan.quantities())
+        except OutOfStock as exc:
+            errors[plan.index] = {"positions": str(exc)}
+        else:
+            accepted.append(plan)
+    return accepted
+
+
+def insert_orders(user, planned):
+    orders = [Order(user=user, total_cost=plan.total_cost) for plan in planned]
+    if connection.features.can_return_rows_from_bulk_insert:
+        Order.objects.bulk_create(orders)
+    else:
+        # без RETURNING id заказов после bulk_create неизвестны
+        for order in orders:
+            order._order_stats_deferred = True
+            order.save()
+    # сводка пользователя обновляется одним запросом на весь пакет
+    UserOrderStats.apply(user.id, len(orders), sum(float(order.total_cost) for order in orders),
+                         max(order.created for order in orders))
+
+    positions = {}
+    for plan, order in zip(planned, orders):
+        plan.order = order
+        positions[order.id] = [OrderProductPosition(order=order, product=product, quantity=quantity,
+                                                    created=order.created)
+                               for product, quantity in plan.positions]
+    OrderProductPosition.objects.bulk_create(position for items in positions.values() for position in items)
+
+    expires_at = timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+    StockReservation.objects.bulk_create(
+        StockReservation(order=plan.order, product_id=product_id, quantity=quantity, expires_at=expires_at)
+        for plan in planned for product_id, quantity in plan.reserved.items()
+    )
+    OrderOutboxEvent.objects.bulk_create(
+        OrderOutboxEvent.for_order(order, OrderEventTypeChoices.CREATED, positions=positions[order.id])
+        for order in orders
+    )
+    enqueue_many(notify_order_changed, [(order.id,) for order in orders])
+    return orders
+
+
+def create_orders(user, orders_data, atomic=False):
+    """
+    Создает заказы пользователя. Возвращает список результатов в порядке заказов:
+    {"index", "id", "total_cost"} для созданных и {"index", "errors"} для отклоненных.
+    С atomic=True при любой ошибке не создается ни один заказ
+    """
+    planned, errors = [], {}
+    try:
+        with transaction.atomic():
+            planned, errors = plan_orders(orders_data)
+            planned = reserve_planned(planned, errors) if planned else []
+            if errors and atomic:
+                raise BatchRejected()
+            if planned:
+                insert_orders(user, planned)
+    except BatchRejected:
+        for plan in planned:
+            errors[plan.index] = {"non_field_errors": ["Заказ не создан: в пакете есть заказы с ошибками"]}
+        planned = []
+
+    results = [{"index": index, "errors": error} for index, error in errors.items()]
+    results += [{"index": plan.index, "id": plan.order.id, "total_cost": float(plan.total_cost)} for plan in planned]
+    return sorted(results, key=lambda result: result["index"])
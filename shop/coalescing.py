@@ -0,0 +1,220 @@
+"""
+Объединение одновременных чтений товара и подборки (single-flight) с кэшем ответов.
+
+Ответ retrieve хранится в кэше READ_CACHE: READ_CACHE_FRESH_SECONDS он свежий
+и отдается без обращения к базе, еще READ_CACHE_STALE_SECONDS - устаревший:
+его отдают сразу, а новый ответ строится в фоне (stale-while-revalidate).
+
+Если ответа в кэше нет, в процессе выполняется одно вычисление на ключ:
+остальные запросы того же ключа ждут его и получают тот же результат (или ту же ошибку).
+С READ_CACHE_LOCK между процессами берется блокировка в кэше: процессы,
+не получившие ее, ждут, пока ответ появится в кэше.
+
+При изменении объекта меняется версия (invalidate: сразу и еще раз после фиксации
+транзакции); записи кэша с другой версией не используются. Если ключа версии нет
+(еще не создан или вытеснен из кэша), создается новая случайная версия, поэтому
+записи, сохраненные до вытеснения, тоже не используются.
+
+Каждая запись кэша получает свой ключ (key): он меняется при каждом построении ответа,
+поэтому по нему CompressionMiddleware хранит сжатые варианты ответа (compression_cache_key).
+
+Ответ, сохраняемый в кэш, строится по основной базе (use_primary): он переживает запрос,
+и отстающая реплика не должна попасть в кэш под текущей версией.
+
+Версии сбрасываются для всех процессов, только если кэш READ_CACHE общий (Memcached, Redis);
+с LocMemCache каждый процесс видит только свои изменения.
+"""
+import contextvars
+import hashlib
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+
+from api_shop.db.routers import use_primary
+
+# интервал опроса кэша при ожидании ответа другого процесса
+LOCK_POLL_SECONDS = 0.05
+
+
+class Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Одно выполнение функции на ключ в процессе; одновременные вызовы получают его результат
+    """
+
+    def __init__(self):
+        self.flights = {}
+        self.lock = threading.Lock()
+
+    def in_flight(self, key):
+        return key in self.flights
+
+    def do(self, key, func):
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+
+        if not leader:
+            if flight.done.wait(settings.READ_CACHE_LOCK_SECONDS):
+                if flight.error is not None:
+                    raise flight.error
+                return flight.result
+            # вычисление зависло - не ждем его дольше
+            return func()
+
+        try:
+            flight.result = func()
+            return flight.result
+        except Exception as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+
+
+def get_cache():
+    return caches[settings.READ_CACHE]
+
+
+class CoalescedReads:
+    """
+    Кэш ответов одного вида объектов (scope). Версия ведется для каждого объекта
+    или, если per_object=False, одна на все объекты вида
+    """
+
+    def __init__(self, scope, per_object=True):
+        self.scope = scope
+        self.per_object = per_object
+        self.flights = SingleFlight()
+
+    def version_key(self, pk):
+        if self.per_object:
+            return f"reads:{self.scope}:{pk}:version"
+        return f"reads:{self.scope}:version"
+
+    def data_key(self, pk, variant):
+        digest = hashlib.md5(variant.encode()).hexdigest()
+        return f"reads:{self.scope}:{pk}:{digest}"
+
+    def bump_version(self, pk=None):
+        get_cache().set(self.version_key(pk), uuid.uuid4().hex, None)
+
+    @staticmethod
+    def current_version(cache, version_key):
+        """
+        Версия объекта; если ключа версии нет, создается новая версия
+        """
+        version = cache.get(version_key)
+        if version is None:
+            cache.add(version_key, uuid.uuid4().hex, None)
+            version = cache.get(version_key)
+        return version
+
+    def get(self, pk, compute, variant=""):
+        """
+        Ответ для объекта pk; variant различает ответы с разными параметрами запроса
+        """
+        return self.get_entry(pk, compute, variant)["data"]
+
+    def get_entry(self, pk, compute, variant=""):
+        """
+        Запись кэша для объекта pk: {"version", "key", "fresh_until", "data"}
+        """
+        cache = get_cache()
+        data_key, version_key = self.data_key(pk, variant), self.version_key(pk)
+        values = cache.get_many([data_key, version_key])
+        version = values.get(version_key)
+        entry = values.get(data_key)
+
+        if entry is not None and version is not None and entry["version"] == version:
+            if time.time() >= entry["fresh_until"]:
+                if not settings.READ_CACHE_BACKGROUND_REFRESH:
+                    return self.flights.do(data_key, lambda: self.load(data_key, version_key, compute))
+                if not self.flights.in_flight(data_key):
+                    # поток получает копию контекста запроса (в том числе закрепление за основной базой)
+                    threading.Thread(target=contextvars.copy_context().run,
+                                     args=(self.refresh_in_background, data_key, version_key, compute),
+                                     name=f"reads-{self.scope}",
+                                     daemon=True,
+                                     ).start()
+            return entry
+
+        return self.flights.do(data_key, lambda: self.load(data_key, version_key, compute))
+
+    def load(self, data_key, version_key, compute):
+        cache = get_cache()
+        lock_key = f"{data_key}:lock"
+        locked = False
+        if settings.READ_CACHE_LOCK:
+            locked = cache.add(lock_key, 1, timeout=settings.READ_CACHE_LOCK_SECONDS)
+            if not locked:
+                entry = self.wait_for_entry(cache, data_key, version_key)
+                if entry is not None:
+                    return entry
+        try:
+            # версия читается до построения ответа: изменение во время построения сделает запись неактуальной
+            version = self.current_version(cache, version_key)
+            with use_primary():
+                data = compute()
+            entry = {"version": version,
+                     "key": f"{data_key}:{uuid.uuid4().hex}",
+                     "fresh_until": time.time() + settings.READ_CACHE_FRESH_SECONDS,
+                     "data": data,
+                     }
+            cache.set(data_key, entry, timeout=settings.READ_CACHE_FRESH_SECONDS + settings.READ_CACHE_STALE_SECONDS)
+            return entry
+        finally:
+            if locked:
+                cache.delete(lock_key)
+
+    @staticmethod
+    def wait_for_entry(cache, data_key, version_key):
+        deadline = time.monotonic() + settings.READ_CACHE_LOCK_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_SECONDS)
+            values = cache.get_many([data_key, version_key])
+            entry = values.get(data_key)
+            version = values.get(version_key)
+            if entry is not None and version is not None and entry["version"] == version \
+                    and time.time() < entry["fresh_until"]:
+                return entry
+        return None
+
+    def refresh_in_background(self, data_key, version_key, compute):
+        try:
+            self.flights.do(data_key, lambda: self.load(data_key, version_key, compute))
+        except Exception:
+            # ошибку получат следующие запросы, когда устаревший ответ истечет
+            pass
+        finally:
+            # у фонового потока свое соединение с базой
+            connection.close()
+
+    def invalidate(self, pk=None):
+        """
+        Меняет версию сразу и после фиксации текущей транзакции: ответ, построенный
+        по еще не зафиксированным данным, не будет использован
+        """
+        self.bump_version(pk)
+        transaction.on_commit(lambda: self.bump_version(pk))
+
+
+product_reads = CoalescedReads("product")
+# в ответ подборки входят ее товары, поэтому версия одна на все подборки
+collection_reads = CoalescedReads("collection", per_object=False)
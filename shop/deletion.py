@@ -0,0 +1,113 @@
+"""
+Удаление товаров и подборок с большим числом зависимых строк по частям.
+
+Обычное удаление товара каскадно удаляет позиции заказов, товары подборок, отзывы и
+остальные зависимые строки в одной транзакции: строки долго заблокированы, а журнал
+транзакций (WAL) резко растет. delete_in_chunks удаляет зависимые строки пакетами по
+CHUNKED_DELETE_BATCH_SIZE, каждый пакет - в своей короткой транзакции, и только потом
+удаляет сам объект (его каскад находит лишь строки, добавленные за время удаления).
+
+Пакеты удаляются одним DELETE без загрузки объектов, поэтому то, что для них делают
+обработчики post_delete, выполняется один раз на пакет: записи журнала изменений каталога,
+пересчет сводок подборок и сброс кэша ответов подборок.
+
+Объекты, у которых зависимых строк больше CHUNKED_DELETE_INLINE_LIMIT, удаляются
+в фоне задачей shop.tasks.delete_in_background; ход удаления записывается в задачу (Job.progress).
+"""
+from django.conf import settings
+from django.db import transaction
+
+from jobs.queue import enqueue
+from shop.models import CHANGE_FEED_MODELS, ChangeActionChoices, ChangeLog, Collection, CollectionProduct, \
+    OrderProductPosition, Product, ProductPrice, ProductReview, RelatedProduct, StockReservation
+
+# зависимые строки: модель -> [(зависимая модель, поле внешнего ключа)]
+DEPENDENTS = {
+    Product: [
+        (ProductPrice, "product"),
+        (RelatedProduct, "product"),
+        (RelatedProduct, "related"),
+        (StockReservation, "product"),
+        (CollectionProduct, "product"),
+        (ProductReview, "product"),
+        (OrderProductPosition, "product"),
+    ],
+    Collection: [
+        (CollectionProduct, "collection"),
+    ],
+}
+
+
+def count_dependents(obj, limit):
+    """
+    Число зависимых строк объекта, но не больше limit + 1 (точное число не нужно и дорого)
+    """
+    total = 0
+    for model, field in DEPENDENTS[type(obj)]:
+        total += model.objects.filter(**{field: obj.pk}).values("pk")[:limit + 1 - total].count()
+        if total > limit:
+            break
+    return total
+
+
+def delete_batch(model, ids, owner):
+    """
+    Удаляет пакет зависимых строк объекта owner
+    """
+    queryset = model.objects.filter(pk__in=ids)
+    collection_ids = []
+    if model is CollectionProduct:
+        # сводку удаляемой подборки пересчитывать незачем
+        collection_ids = list(queryset.exclude(collection_id=owner.pk if isinstance(owner, Collection) else None)
+                              .values_list("collection_id", flat=True).distinct())
+    queryset._raw_delete(queryset.db)
+
+    if model in CHANGE_FEED_MODELS:
+        ChangeLog.record(model, ids, ChangeActionChoices.DELETE)
+    if collection_ids:
+        from shop.coalescing import collection_reads
+        Collection.refresh_summary(collection_ids)
+        collection_reads.invalidate()
+
+
+def delete_in_chunks(obj, batch_size=None, progress=None):
+    """
+    Удаляет зависимые строки объекта (товара или подборки) пакетами, затем сам объект.
+    progress(deleted) вызывается после каждого пакета с {метка модели: удалено строк}.
+    Возвращает {метка модели: удалено строк}
+    """
+    batch_size = batch_size or settings.CHUNKED_DELETE_BATCH_SIZE
+    deleted = {}
+    for model, field in DEPENDENTS[type(obj)]:
+        label = model._meta.label
+        rows = model.objects.filter(**{field: obj.pk}).order_by("pk").values_list("pk", flat=True)
+        while True:
+            with transaction.atomic():
+                ids = list(rows[:batch_size])
+                if ids:
+                    delete_batch(model, ids, obj)
+            if not ids:
+                break
+            deleted[label] = deleted.get(label, 0) + len(ids)
+            if progress is not None:
+                progress(dict(deleted))
+
+    with transaction.atomic():
+        count, per_model = obj.delete()
+    for label, rows in per_model.items():
+        deleted[label] = deleted.get(label, 0) + rows
+    if progress is not None:
+        progress(dict(deleted))
+    return deleted
+
+
+def delete_or_enqueue(obj):
+    """
+    Удаляет объект сразу, если зависимых строк не больше CHUNKED_DELETE_INLINE_LIMIT,
+    иначе ставит удаление в очередь. Возвращает задачу или None, если объект уже удален
+    """
+    if count_dependents(obj, settings.CHUNKED_DELETE_INLINE_LIMIT) > settings.CHUNKED_DELETE_INLINE_LIMIT:
+        # задача по имени: shop.tasks импортирует этот модуль
+        return enqueue("shop.tasks.delete_in_background", obj._meta.label, obj.pk)
+    delete_in_chunks(obj)
+    return None
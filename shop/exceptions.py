@@ -0,0 +1,11 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class Conflict(APIException):
+    """
+    Объект был изменен другим запросом после того, как клиент его получил
+    """
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Объект был изменен другим запросом, получите актуальную версию"
+    default_code = "conflict"
@@ -0,0 +1,79 @@
+"""
+Счетчики товаров по группам значений (фасеты) для фильтра товаров.
+
+Все группы всех запрошенных фасетов считаются одним агрегирующим запросом
+по уже отфильтрованному списку товаров:
+
+    SELECT COUNT(id) FILTER (WHERE price >= 0 AND price < 500), ...,
+           COUNT(id) FILTER (WHERE avg_rating >= 4 AND avg_rating < 5), ...
+"""
+from django.conf import settings
+from django.db.models import Avg, Count, FloatField, OuterRef, Q, Subquery
+from rest_framework.exceptions import ValidationError
+
+from shop.models import ProductRatingChoices, ProductReview
+
+
+def annotate_rating(queryset):
+    """
+    Добавляет к товарам средний рейтинг по отзывам (avg_rating, None - отзывов нет)
+    """
+    if "avg_rating" in queryset.query.annotations:
+        return queryset
+    ratings = (ProductReview.objects
+               .filter(product=OuterRef("pk"))
+               .order_by()
+               .values("product")
+               .annotate(avg_rating=Avg("rating"))
+               .values("avg_rating"))
+    return queryset.annotate(avg_rating=Subquery(ratings, output_field=FloatField()))
+
+
+def price_buckets():
+    bounds = settings.PRODUCT_PRICE_FACETS
+    buckets = [(f"{low}-{high}", Q(price__gte=low, price__lt=high)) for low, high in zip(bounds, bounds[1:])]
+    buckets.append((f"{bounds[-1]}-", Q(price__gte=bounds[-1])))
+    return buckets
+
+
+def rating_buckets():
+    top = max(ProductRatingChoices.values)
+    buckets = [(str(rating), Q(avg_rating__gte=rating, avg_rating__lt=rating + 1))
+               for rating in ProductRatingChoices.values if rating != top]
+    buckets.append((str(top), Q(avg_rating__gte=top)))
+    buckets.append(("none", Q(avg_rating__isnull=True)))
+    return buckets
+
+
+FACETS = {
+    "price": price_buckets,
+    "rating": rating_buckets,
+}
+
+
+def parse_facets(value):
+    names = list(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    unknown = [name for name in names if name not in FACETS]
+    if unknown:
+        raise ValidationError({"facets": f"Неизвестные фасеты: {', '.join(unknown)}. "
+                                         f"Доступны: {', '.join(FACETS)}"})
+    return names
+
+
+def product_facets(queryset, names):
+    """
+    Возвращает {фасет: {группа: число товаров}} для товаров из queryset
+    """
+    if "rating" in names:
+        queryset = annotate_rating(queryset)
+
+    buckets = [(name, key, condition) for name in names for key, condition in FACETS[name]()]
+    counts = queryset.order_by().aggregate(**{
+        f"bucket_{index}": Count("id", filter=condition)
+        for index, (name, key, condition) in enumerate(buckets)
+    })
+
+    facets = {name: {} for name in names}
+    for index, (name, key, condition) in enumerate(buckets):
+        facets[name][key] = counts[f"bucket_{index}"]
+    return facets
@@ -1,16 +1,30 @@
+from django.db.models import Prefetch
 from django_filters import rest_framework as filters
-from shop.models import Product, ProductReview, Order
+from shop.facets import annotate_rating
+from shop.models import Product, ProductReview, Order, OrderProductPosition
 
 
 class ProductFilter(filters.FilterSet):
     name = filters.CharFilter(field_name="name", lookup_expr="contains")
     description = filters.CharFilter(field_name="description", lookup_expr="contains")
     price = filters.RangeFilter(field_name="price")
+    rating = filters.RangeFilter(method="filter_rating")
 
     class Meta:
         model = Product
         fields = ["name", "description", "price"]
 
+    def filter_rating(self, queryset, name, value):
+        """
+        Фильтр по среднему рейтингу товара в отзывах
+        """
+        queryset = annotate_rating(queryset)
+        if value.start is not None:
+            queryset = queryset.filter(avg_rating__gte=value.start)
+        if value.stop is not None:
+            queryset = queryset.filter(avg_rating__lte=value.stop)
+        return queryset
+
 
 class ReviewFilter(filters.FilterSet):
     user = "user__id"
@@ -31,3 +45,19 @@ class OrderFilter(filters.FilterSet):
     class Meta:
         model = Order
         fields = ("status", "total_cost", "updated", "created")
+
+    def filter_queryset(self, queryset):
+        """
+        Позиции заказов подгружаются с тем же условием на created, что и заказы:
+        в секционированной таблице позиций читаются только нужные секции
+        """
+        queryset = super().filter_queryset(queryset)
+        created = self.form.cleaned_data.get("created")
+        if created and (created.start or created.stop):
+            positions = OrderProductPosition.objects.all()
+            if created.start:
+                positions = positions.filter(created__gte=created.start)
+            if created.stop:
+                positions = positions.filter(created__lte=created.stop)
+            queryset = queryset.prefetch_related(None).prefetch_related(Prefetch("positions", queryset=positions))
+        return queryset
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from shop.recommendations import build_related_products
+
+
+class Command(BaseCommand):
+    help = "Пересчет рекомендаций \"часто покупают вместе\" по позициям заказов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true",
+                            help="пересчитать по всем заказам, а не только по заказам с новыми позициями")
+        parser.add_argument("--top", type=int, help="число рекомендуемых товаров для каждого товара")
+        parser.add_argument("--batch-size", type=int, default=100000, help="число позиций в пакете")
+
+    def handle(self, *args, **options):
+        added, updated = build_related_products(full=options["full"],
+                                                top=options["top"],
+                                                batch_size=options["batch_size"],
+                                                )
+        self.stdout.write(f"Учтено новых позиций: {added}, обновлено товаров: {updated}")
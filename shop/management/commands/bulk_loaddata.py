@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from shop.bulk_load import bulk_load
+
+
+class Command(BaseCommand):
+    help = "Быстрая загрузка фикстуры пакетными INSERT без сигналов (вместо loaddata для больших дампов)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("fixture", help="файл фикстуры в формате json (можно .json.gz)")
+        parser.add_argument("--database", default="default", help="база данных для загрузки")
+        parser.add_argument("--batch-size", type=int, default=5000, help="число объектов в пакете")
+        parser.add_argument("-e", "--exclude", action="append", default=[],
+                            help="не загружать приложение или модель (app_label или app_label.ModelName)")
+        parser.add_argument("--ignore-conflicts", action="store_true",
+                            help="пропускать объекты, которые уже есть в базе")
+
+    def handle(self, *args, **options):
+        counts, tokens = bulk_load(options["fixture"],
+                                   using=options["database"],
+                                   batch_size=options["batch_size"],
+                                   exclude=options["exclude"],
+                                   ignore_conflicts=options["ignore_conflicts"],
+                                   )
+        for label, count in counts.items():
+            self.stdout.write(f"{label}: {count}")
+        self.stdout.write(f"Загружено объектов: {sum(counts.values())}, создано токенов: {tokens}")
@@ -0,0 +1,52 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.bulk_load import batches
+from shop.models import UserOrderStats
+
+# допустимое расхождение суммы (total_spent - float, накапливает ошибку округления)
+SPENT_TOLERANCE = 0.005
+
+
+def find_mismatches(user_ids):
+    """
+    Пользователи, чья сводка расходится с заказами: [(id, сохраненная, по заказам)]
+    """
+    actual = UserOrderStats.actual(user_ids)
+    stored = {stats.user_id: (stats.orders_count, stats.total_spent, stats.last_order_date)
+              for stats in UserOrderStats.objects.filter(user_id__in=user_ids)}
+    empty = (0, 0.0, None)
+    mismatches = []
+    for user_id in user_ids:
+        expected, saved = actual.get(user_id, empty), stored.get(user_id, empty)
+        if expected[0] != saved[0] or expected[2] != saved[2] \
+                or abs(float(expected[1]) - float(saved[1])) > SPENT_TOLERANCE:
+            mismatches.append((user_id, saved, expected))
+    return mismatches
+
+
+class Command(BaseCommand):
+    help = "Проверка сводок по заказам пользователей (число, сумма, дата последнего заказа) по самим заказам"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="пересчитать расходящиеся сводки")
+        parser.add_argument("--batch-size", type=int, default=1000, help="число пользователей в одной проверке")
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by("pk").values_list("pk", flat=True)
+        found = 0
+        for user_ids in batches(users.iterator(chunk_size=options["batch_size"]), options["batch_size"]):
+            mismatches = find_mismatches(user_ids)
+            for user_id, saved, expected in mismatches:
+                self.stdout.write(f"user:{user_id} - сводка {saved[0]} / {saved[1]:.2f} / {saved[2]}, "
+                                  f"по заказам {expected[0]} / {float(expected[1]):.2f} / {expected[2]}")
+            if mismatches and options["fix"]:
+                UserOrderStats.rebuild([user_id for user_id, saved, expected in mismatches])
+            found += len(mismatches)
+
+        if options["fix"]:
+            self.stdout.write(f"Пересчитано сводок: {found}")
+        elif found:
+            raise CommandError(f"Расходящихся сводок: {found}")
+        else:
+            self.stdout.write("Расхождений нет")
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from jobs.queue import enqueue
+from shop.deletion import delete_in_chunks
+from shop.models import Collection, Product
+
+MODELS = {"product": Product, "collection": Collection}
+
+
+class Command(BaseCommand):
+    help = "Удаление товаров или подборок по частям: зависимые строки удаляются пакетами в коротких транзакциях"
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", choices=sorted(MODELS), help="что удалять")
+        parser.add_argument("ids", nargs="+", type=int, help="id объектов")
+        parser.add_argument("--batch-size", type=int, default=None,
+                            help="строк в одной транзакции (по умолчанию CHUNKED_DELETE_BATCH_SIZE)")
+        parser.add_argument("--background", action="store_true", help="поставить удаление в очередь задач")
+
+    def handle(self, *args, **options):
+        model = MODELS[options["model"]]
+        objects = model.objects.in_bulk(options["ids"])
+        missing = sorted(set(options["ids"]) - objects.keys())
+        if missing:
+            raise CommandError(f"Не найдены: {', '.join(map(str, missing))}")
+
+        for pk, obj in objects.items():
+            if options["background"]:
+                job = enqueue("shop.tasks.delete_in_background", model._meta.label, pk)
+                self.stdout.write(f"{obj}: удаление поставлено в очередь (задача {job.id})")
+                continue
+
+            def progress(deleted):
+                self.stdout.write(f"{obj}: " + ", ".join(f"{label} {count}" for label, count in deleted.items()))
+
+            delete_in_chunks(obj, batch_size=options["batch_size"], progress=progress)
+            self.stdout.write(f"{obj}: удален")
@@ -0,0 +1,37 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.outbox import OutboxWorker, get_sink
+
+
+class Command(BaseCommand):
+    help = "Доставка событий по заказам из outbox-таблицы во внешний получатель"
+
+    def add_arguments(self, parser):
+        parser.add_argument("sink", help="file:<путь>, http(s)://<адрес> или callable:<модуль.функция>")
+        parser.add_argument("--batch-size", type=int, help="число событий в пакете")
+        parser.add_argument("--once", action="store_true", help="доставить накопленные события и завершиться")
+        parser.add_argument("--idle-sleep", type=float, default=1.0, help="пауза, когда событий нет, с")
+        parser.add_argument("--stats-interval", type=float, default=60, help="период вывода статистики, с")
+
+    def handle(self, *args, **options):
+        try:
+            sink = get_sink(options["sink"])
+        except (ValueError, ImportError) as exc:
+            raise CommandError(exc)
+
+        worker = OutboxWorker(sink, batch_size=options["batch_size"], idle_sleep=options["idle_sleep"])
+
+        if options["once"]:
+            while worker.run_once():
+                pass
+        else:
+            def stop(signum, frame):
+                worker.stopped = True
+
+            signal.signal(signal.SIGTERM, stop)
+            signal.signal(signal.SIGINT, stop)
+            worker.run(stats_interval=options["stats_interval"])
+
+        self.stdout.write(str(worker.stats()))
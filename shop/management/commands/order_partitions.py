@@ -0,0 +1,55 @@
+import os
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.partitions import PARTITIONED_TABLES, PartitioningError, PartitioningNotSupported, add_months, \
+    archive_partitions, check_supported, convert_to_partitioned, create_partitions, ensure_references, \
+    is_partitioned, model_references, month_start
+
+
+class Command(BaseCommand):
+    help = "Обслуживание месячных секций таблиц заказов: создание будущих секций и архивация старых"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--convert", action="store_true",
+                            help="преобразовать таблицы заказов в секционированные, если это еще не сделано")
+        parser.add_argument("--months-ahead", type=int, default=settings.ORDER_PARTITIONS_AHEAD,
+                            help="на сколько месяцев вперед создать секции")
+        parser.add_argument("--keep-months", type=int,
+                            help="оставить секции за столько последних месяцев, более старые отсоединить")
+        parser.add_argument("--archive-dir",
+                            help="выгрузить отсоединенные секции в <каталог>/<секция>.csv.gz и удалить их")
+
+    def handle(self, *args, **options):
+        try:
+            check_supported()
+        except PartitioningNotSupported as exc:
+            raise CommandError(exc)
+
+        if options["convert"]:
+            try:
+                converted = convert_to_partitioned(months_ahead=options["months_ahead"])
+            except PartitioningError as exc:
+                raise CommandError(exc)
+            for table in converted:
+                self.stdout.write(f"Таблица {table} преобразована в секционированную")
+
+        if not all(is_partitioned(table) for table in PARTITIONED_TABLES):
+            raise CommandError("Таблицы заказов не секционированы: запустите команду с --convert")
+
+        # таблицы, преобразованные до появления триггеров-ограничений, остались без проверки ссылок
+        for name in ensure_references(model_references()):
+            self.stdout.write(f"Создан триггер-ограничение {name}")
+
+        for name in create_partitions(months_ahead=options["months_ahead"]):
+            self.stdout.write(f"Создана секция {name}")
+
+        if options["keep_months"] is not None:
+            directory = options["archive_dir"]
+            if directory is not None and not os.path.isdir(directory):
+                raise CommandError(f"Каталог {directory} не существует")
+            before = add_months(month_start(date.today()), -options["keep_months"])
+            for name in archive_partitions(before, directory=directory):
+                self.stdout.write(f"Секция {name} {'выгружена в архив' if directory else 'отсоединена'}")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from shop.stock import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Возврат на остаток просроченных резервов товаров по заказам в статусе New"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="число резервов в одной транзакции")
+
+    def handle(self, *args, **options):
+        released = release_expired_reservations(batch_size=options["batch_size"])
+        self.stdout.write(f"Возвращено резервов: {released}")
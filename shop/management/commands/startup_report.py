@@ -0,0 +1,94 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# запускается в отдельном интерпретаторе с -X importtime: время импорта модулей пишется в stderr
+PROBE = """
+import json, time
+started = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from django.core.handlers.{kind} import {handler}
+{handler}()
+application = time.perf_counter()
+from api_shop.warmup import warm_up
+timings = warm_up(connect={connect})
+print(json.dumps({{"setup": setup - started, "application": application - setup, "warmup": timings}}))
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Строки "import time: self [us] | cumulative | imported package" -> [(модуль, self, cumulative)]
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # вложенные импорты сдвинуты пробелами
+        modules.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+class Command(BaseCommand):
+    help = "Отчет о времени запуска рабочего процесса: импорт модулей, создание приложения, прогрев"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=20, help="сколько самых долгих импортов показать")
+        parser.add_argument("--asgi", action="store_true", help="создавать ASGI-приложение вместо WSGI")
+        parser.add_argument("--no-connect", action="store_true", help="не открывать соединения с базой при прогреве")
+        parser.add_argument("--json", action="store_true", help="вывести отчет в формате json")
+        parser.add_argument("--max-ms", type=float,
+                            help="завершиться с ошибкой, если запуск дольше указанного числа миллисекунд")
+
+    def handle(self, *args, **options):
+        kind, handler = ("asgi", "ASGIHandler") if options["asgi"] else ("wsgi", "WSGIHandler")
+        probe = PROBE.format(kind=kind, handler=handler, connect=not options["no_connect"])
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(settings.BASE_DIR), env.get("PYTHONPATH")]))
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", probe],
+                                capture_output=True, text=True, env=env)
+        if result.returncode:
+            raise CommandError(f"Не удалось запустить приложение:\n{result.stderr[-2000:]}")
+
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        modules = parse_importtime(result.stderr)
+        top_level = [module for module in modules if not module[0].startswith(" ")]
+        imports_ms = sum(cumulative for name, self_us, cumulative in top_level) / 1000
+        warmup_ms = sum(timings["warmup"].values()) * 1000
+        total_ms = (timings["setup"] + timings["application"]) * 1000 + warmup_ms
+        slowest = sorted(modules, key=lambda module: module[2], reverse=True)[:options["top"]]
+
+        report = {
+            "total_ms": round(total_ms, 1),
+            "imports_ms": round(imports_ms, 1),
+            "setup_ms": round(timings["setup"] * 1000, 1),
+            "application_ms": round(timings["application"] * 1000, 1),
+            "warmup_ms": {name: round(seconds * 1000, 1) for name, seconds in timings["warmup"].items()},
+            "modules": len(modules),
+            "slowest_imports": [{"module": name.strip(), "self_ms": round(self_us / 1000, 1),
+                                 "cumulative_ms": round(cumulative / 1000, 1)}
+                                for name, self_us, cumulative in slowest],
+        }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+        else:
+            self.stdout.write(f"Запуск: {report['total_ms']} мс (импорт модулей {report['imports_ms']} мс, "
+                              f"модулей: {report['modules']})")
+            self.stdout.write(f"django.setup(): {report['setup_ms']} мс, "
+                              f"создание приложения: {report['application_ms']} мс")
+            for name, ms in report["warmup_ms"].items():
+                self.stdout.write(f"Прогрев {name}: {ms} мс")
+            self.stdout.write("Самые долгие импорты (с вложенными), мс:")
+            for item in report["slowest_imports"]:
+                self.stdout.write(f"{item['cumulative_ms']:>10} {item['self_ms']:>10}  {item['module']}")
+
+        if options["max_ms"] is not None and total_ms > options["max_ms"]:
+            raise CommandError(f"Запуск занял {total_ms:.1f} мс, больше {options['max_ms']} мс")
@@ -0,0 +1,37 @@
+# Generated by Django 3.1.2 on 2026-10-19 13:36
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_changelog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderOutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('order_id', models.BigIntegerField(verbose_name='ID заказа')),
+                ('event_type', models.CharField(choices=[('order_created', 'Заказ создан'), ('order_status_changed', 'Изменен статус заказа')], max_length=50, verbose_name='Тип события')),
+                ('payload', models.JSONField(verbose_name='Данные события')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='время создания')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попыток доставки')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, null=True, verbose_name='Следующая попытка')),
+                ('delivered_at', models.DateTimeField(blank=True, null=True, verbose_name='время доставки')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+            ],
+            options={
+                'verbose_name': 'Событие заказа',
+                'verbose_name_plural': 'События заказов',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='orderoutboxevent',
+            index=models.Index(condition=models.Q(delivered_at__isnull=True), fields=['next_attempt_at'], name='order_outbox_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.1.2 on 2026-10-19 13:43
+
+import datetime
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_order_created(apps, schema_editor):
+    Order = apps.get_model("shop", "Order")
+    OrderProductPosition = apps.get_model("shop", "OrderProductPosition")
+    (OrderProductPosition.objects
+     .using(schema_editor.connection.alias)
+     .update(created=Subquery(Order.objects.filter(id=OuterRef("order_id")).values("created")[:1])))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_order_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderproductposition',
+            name='created',
+            field=models.DateField(default=datetime.date.today, verbose_name='дата создания заказа'),
+        ),
+        migrations.RunPython(copy_order_created, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-updated', '-created'], name='order_updated_created_idx'),
+        ),
+    ]
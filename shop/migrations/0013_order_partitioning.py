@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def partition_orders(apps, schema_editor):
+    connection = schema_editor.connection
+    if not settings.ORDER_PARTITIONING or connection.vendor != "postgresql":
+        return
+    from shop.partitions import convert_to_partitioned
+    convert_to_partitioned(months_ahead=settings.ORDER_PARTITIONS_AHEAD, connection=connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_order_position_created'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_orders, migrations.RunPython.noop),
+    ]
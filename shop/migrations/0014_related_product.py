@@ -0,0 +1,37 @@
+# Generated by Django 3.1.2 on 2026-10-19 13:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_order_partitioning'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedProduct',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveIntegerField(verbose_name='Число совместных заказов')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_products', to='shop.product')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.product', verbose_name='Рекомендуемый товар')),
+            ],
+            options={
+                'verbose_name': 'Рекомендуемый товар',
+                'verbose_name_plural': 'Рекомендуемые товары',
+                'db_table': 'related_product',
+                'ordering': ['-score', 'related_id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='relatedproduct',
+            index=models.Index(fields=['product', '-score'], name='related_product_score_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='relatedproduct',
+            unique_together={('product', 'related')},
+        ),
+    ]
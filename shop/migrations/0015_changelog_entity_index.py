@@ -0,0 +1,17 @@
+# Generated by Django 3.1.2 on 2026-10-19 13:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0014_related_product'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='changelog',
+            index=models.Index(fields=['entity', '-id'], name='changelog_entity_id_idx'),
+        ),
+    ]
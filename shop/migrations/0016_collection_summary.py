@@ -0,0 +1,42 @@
+# Generated by Django 3.1.2 on 2026-10-19 13:50
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_collection_summary(apps, schema_editor):
+    Collection = apps.get_model("shop", "Collection")
+    CollectionProduct = apps.get_model("shop", "CollectionProduct")
+    links = CollectionProduct.objects.filter(collection_id=OuterRef("pk")).order_by().values("collection_id")
+    Collection.objects.using(schema_editor.connection.alias).update(
+        products_count=Coalesce(Subquery(links.annotate(value=Count("id")).values("value")), 0),
+        min_price=Subquery(links.annotate(value=Min("product__price")).values("value")),
+        max_price=Subquery(links.annotate(value=Max("product__price")).values("value")),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0015_changelog_entity_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='max_price',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True, verbose_name='Максимальная цена'),
+        ),
+        migrations.AddField(
+            model_name='collection',
+            name='min_price',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True, verbose_name='Минимальная цена'),
+        ),
+        migrations.AddField(
+            model_name='collection',
+            name='products_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число товаров'),
+        ),
+        migrations.RunPython(fill_collection_summary, migrations.RunPython.noop),
+    ]
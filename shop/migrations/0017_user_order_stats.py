@@ -0,0 +1,49 @@
+# Generated by Django 3.1.2 on 2026-10-19 14:07
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+import django.db.models.deletion
+
+
+def fill_user_order_stats(apps, schema_editor):
+    Order = apps.get_model("shop", "Order")
+    UserOrderStats = apps.get_model("shop", "UserOrderStats")
+    using = schema_editor.connection.alias
+    rows = (Order.objects.using(using)
+            .order_by()
+            .values("user_id")
+            .annotate(orders_count=Count("id"), total_spent=Sum("total_cost"), last_order_date=Max("created")))
+    UserOrderStats.objects.using(using).bulk_create(
+        (UserOrderStats(user_id=row["user_id"],
+                        orders_count=row["orders_count"],
+                        total_spent=row["total_spent"] or 0,
+                        last_order_date=row["last_order_date"])
+         for row in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shop', '0016_collection_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserOrderStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='order_stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Покупатель')),
+                ('orders_count', models.PositiveIntegerField(default=0, verbose_name='Число заказов')),
+                ('total_spent', models.FloatField(default=0, verbose_name='Сумма заказов')),
+                ('last_order_date', models.DateField(null=True, verbose_name='Дата последнего заказа')),
+            ],
+            options={
+                'verbose_name': 'Сводка по заказам пользователя',
+                'verbose_name_plural': 'Сводки по заказам пользователей',
+            },
+        ),
+        migrations.RunPython(fill_user_order_stats, migrations.RunPython.noop),
+    ]
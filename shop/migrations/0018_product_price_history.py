@@ -0,0 +1,57 @@
+# Generated by Django 3.1.2 on 2026-10-19 14:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+from datetime import datetime, time
+
+
+def fill_product_prices(apps, schema_editor):
+    """
+    Текущая цена товара действует не позже чем с даты его последнего изменения
+    """
+    Product = apps.get_model("shop", "Product")
+    ProductPrice = apps.get_model("shop", "ProductPrice")
+    using = schema_editor.connection.alias
+    products = Product.objects.using(using).order_by("pk").values_list("pk", "price", "updated")
+    last = None
+    while True:
+        batch = list((products if last is None else products.filter(pk__gt=last))[:1000])
+        if not batch:
+            return
+        ProductPrice.objects.using(using).bulk_create(
+            ProductPrice(product_id=product_id,
+                         price=price,
+                         valid_from=datetime.combine(updated, time.min, tzinfo=django.utils.timezone.utc))
+            for product_id, price, updated in batch
+        )
+        last = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0017_user_order_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPrice',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Цена')),
+                ('valid_from', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Действует с')),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='shop.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Цена товара',
+                'verbose_name_plural': 'История цен товаров',
+                'ordering': ['product', 'valid_from'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='productprice',
+            index=models.Index(fields=['product', 'valid_from'], name='productprice_product_from_idx'),
+        ),
+        migrations.RunPython(fill_product_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.1.2 on 2026-10-19 14:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0019_changelog_txid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedProductsState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('matrix', models.BinaryField(verbose_name='Матрица совместных покупок')),
+                ('last_position', models.BigIntegerField(default=0, verbose_name='Последняя учтенная позиция')),
+                ('gaps', models.JSONField(default=list, verbose_name='Неучтенные номера позиций')),
+                ('marks', models.JSONField(default=list, verbose_name='Отметки запусков')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='Версия')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='время обновления')),
+            ],
+            options={
+                'verbose_name': 'Состояние рекомендаций',
+                'verbose_name_plural': 'Состояние рекомендаций',
+                'db_table': 'related_products_state',
+            },
+        ),
+    ]
@@ -1,8 +1,13 @@
+from datetime import date
+
 from django.core import validators
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models.expressions import RawSQL
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.utils import timezone
+from django.db.models.functions import Coalesce
+from django.db.models.signals import pre_save, post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
 from rest_framework.authtoken.models import Token
 
@@ -31,6 +36,13 @@ class OrderStatusChoices(models.TextChoices):
     DONE = "Done", "Выполнен"
 
 
+ORDER_STATUS_TRANSITIONS = {
+    OrderStatusChoices.NEW: {OrderStatusChoices.IN_PROGRESS},
+    OrderStatusChoices.IN_PROGRESS: {OrderStatusChoices.DONE},
+    OrderStatusChoices.DONE: set(),
+}
+
+
 class Product(CommonInfo):
     """
     Модель для описания товаров
@@ -49,6 +61,11 @@ class Product(CommonInfo):
                                 verbose_name="Цена",
                                 )
     slug = models.SlugField(max_length=200)
+    stock = models.PositiveIntegerField(null=True,
+                                        blank=True,
+                                        verbose_name="Остаток",
+                                        help_text="Пустое значение - остаток не учитывается",
+                                        )
 
     class Meta:
         verbose_name = "Товар"
@@ -59,6 +76,83 @@ class Product(CommonInfo):
         return f"name:{self.name} - id:{self.id}"
 
 
+class ProductPrice(models.Model):
+    """
+    История цен товара: строка добавляется при каждом изменении Product.price и не изменяется.
+    Цена товара на момент времени - последняя строка с valid_from не позже этого момента
+    """
+    id = models.BigAutoField(primary_key=True)
+    product = models.ForeignKey(Product,
+                                on_delete=models.CASCADE,
+                                related_name="price_history",
+                                db_index=False,
+                                verbose_name="Товар",
+                                )
+    price = models.DecimalField(max_digits=10,
+                                decimal_places=2,
+                                verbose_name="Цена",
+                                )
+    valid_from = models.DateTimeField(default=timezone.now,
+                                      verbose_name="Действует с",
+                                      )
+
+    class Meta:
+        verbose_name = "Цена товара"
+        verbose_name_plural = "История цен товаров"
+        ordering = ["product", "valid_from"]
+        indexes = [
+            # цена на момент времени и ряд цен товара читаются по этому индексу
+            models.Index(fields=["product", "valid_from"], name="productprice_product_from_idx"),
+        ]
+
+    def __str__(self):
+        return f"product:{self.product_id} - price:{self.price} - from:{self.valid_from}"
+
+    @classmethod
+    def price_at(cls, moment=None):
+        """
+        Подзапрос цены товара OuterRef("pk") на момент moment (по умолчанию - последней записанной)
+        """
+        history = cls.objects.filter(product=models.OuterRef("pk"))
+        if moment is not None:
+            history = history.filter(valid_from__lte=moment)
+        return models.Subquery(history.order_by("-valid_from", "-id").values("price")[:1])
+
+    @classmethod
+    def record_changes(cls, products, valid_from=None, batch_size=1000, log=True):
+        """
+        Записывает цены товаров products (QuerySet), которые отличаются от последней записанной
+        или еще не записаны. Цена таких товаров изменена в обход save(), поэтому с log
+        изменение товара записывается и в журнал изменений каталога. Возвращает число добавленных строк
+        """
+        valid_from = valid_from or timezone.now()
+        changed = (products
+                   .annotate(recorded_price=cls.price_at())
+                   .filter(models.Q(recorded_price__isnull=True) | ~models.Q(recorded_price=models.F("price")))
+                   .order_by("pk")
+                   .values_list("pk", "price"))
+        recorded, last = 0, None
+        while True:
+            batch = list((changed if last is None else changed.filter(pk__gt=last))[:batch_size])
+            if not batch:
+                return recorded
+            cls.objects.bulk_create(cls(product_id=product_id, price=price, valid_from=valid_from)
+                                    for product_id, price in batch)
+            if log:
+                ChangeLog.record(Product, [product_id for product_id, price in batch])
+            recorded += len(batch)
+            last = batch[-1][0]
+
+    @classmethod
+    def as_of(cls, moment, products=None):
+        """
+        Товары (по умолчанию все) с ценой на момент moment в поле price_at;
+        товары, у которых на этот момент цены еще не было, не возвращаются
+        """
+        products = Product.objects.all() if products is None else products
+        return products.annotate(price_at=cls.price_at(moment)).filter(price_at__isnull=False)
+
+
 class Order(CommonInfo):
     """
     Модель для описания заказов
@@ -81,11 +175,17 @@ class Order(CommonInfo):
             MinValueValidator(0)
         ]
     )
+    version = models.PositiveIntegerField(default=0,
+                                          verbose_name="Версия",
+                                          )
 
     class Meta:
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
         ordering = ["-updated", "-created"]
+        indexes = [
+            models.Index(fields=["-updated", "-created"], name="order_updated_created_idx"),
+        ]
 
     def __str__(self):
         return f"id:{self.id} - user:{self.user} - status:{self.status} - items:{len(self.positions.all())}"
@@ -108,6 +208,10 @@ class OrderProductPosition(models.Model):
             MinValueValidator(1)
         ]
     )
+    # дата создания заказа: ключ секционирования таблицы позиций (см. shop/partitions.py)
+    created = models.DateField(default=date.today,
+                               verbose_name="дата создания заказа",
+                               )
 
     class Meta:
         db_table = "order_product_position"
@@ -116,6 +220,262 @@ class OrderProductPosition(models.Model):
         ordering = ["-quantity"]
 
 
+class StockReservation(models.Model):
+    """
+    Модель для резерва товара под заказ. Резерв списан с Product.stock; пока заказ
+    в статусе New, просроченный резерв возвращается на остаток (released)
+    """
+    order = models.ForeignKey(Order,
+                              on_delete=models.CASCADE,
+                              related_name="reservations",
+                              )
+    product = models.ForeignKey(Product,
+                                on_delete=models.CASCADE,
+                                )
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(verbose_name="Резерв до")
+    released = models.BooleanField(default=False,
+                                   verbose_name="Возвращен на остаток",
+                                   )
+
+    class Meta:
+        db_table = "stock_reservation"
+        verbose_name = "Резерв товара"
+        verbose_name_plural = "Резервы товаров"
+        indexes = [
+            models.Index(fields=["expires_at"],
+                         condition=models.Q(released=False),
+                         name="stock_reservation_active_idx",
+                         ),
+        ]
+
+
+class RelatedProduct(models.Model):
+    """
+    Модель для рекомендаций "часто покупают вместе": для каждого товара хранятся
+    RECOMMENDATIONS_TOP_K товаров, чаще всего встречающихся с ним в одних заказах.
+    Заполняется командой build_related_products
+    """
+    product = models.ForeignKey(Product,
+                                on_delete=models.CASCADE,
+                                related_name="related_products",
+                                )
+    related = models.ForeignKey(Product,
+                                on_delete=models.CASCADE,
+                                related_name="+",
+                                verbose_name="Рекомендуемый товар",
+                                )
+    score = models.PositiveIntegerField(verbose_name="Число совместных заказов")
+
+    class Meta:
+        db_table = "related_product"
+        verbose_name = "Рекомендуемый товар"
+        verbose_name_plural = "Рекомендуемые товары"
+        ordering = ["-score", "related_id"]
+        unique_together = ["product", "related"]
+        indexes = [
+            models.Index(fields=["product", "-score"], name="related_product_score_idx"),
+        ]
+
+
+class RelatedProductsState(models.Model):
+    """
+    Модель для состояния инкрементального пересчета рекомендаций (одна строка): матрица
+    совместных покупок и учтенные позиции заказов. Хранится в базе, поэтому команда
+    build_related_products может запускаться на любом сервере
+    """
+    matrix = models.BinaryField(verbose_name="Матрица совместных покупок")
+    last_position = models.BigIntegerField(default=0,
+                                           verbose_name="Последняя учтенная позиция",
+                                           )
+    gaps = models.JSONField(default=list,
+                            verbose_name="Неучтенные номера позиций",
+                            )
+    marks = models.JSONField(default=list,
+                             verbose_name="Отметки запусков",
+                             )
+    version = models.PositiveIntegerField(default=0,
+                                          verbose_name="Версия",
+                                          )
+    updated = models.DateTimeField(auto_now=True,
+                                   verbose_name="время обновления",
+                                   )
+
+    class Meta:
+        db_table = "related_products_state"
+        verbose_name = "Состояние рекомендаций"
+        verbose_name_plural = "Состояние рекомендаций"
+
+
+class OrderEventTypeChoices(models.TextChoices):
+    """
+    Модель TextChoices создает choices set для назначения поля event_type модели OrderOutboxEvent
+    """
+    CREATED = "order_created", "Заказ создан"
+    STATUS_CHANGED = "order_status_changed", "Изменен статус заказа"
+
+
+class OrderOutboxEvent(models.Model):
+    """
+    Модель для исходящих событий по заказам (transactional outbox). Событие записывается
+    в одной транзакции с изменением заказа и доставляется командой drain_order_outbox
+    """
+    id = models.BigAutoField(primary_key=True)
+    order_id = models.BigIntegerField(verbose_name="ID заказа")
+    event_type = models.CharField(max_length=50,
+                                  choices=OrderEventTypeChoices.choices,
+                                  verbose_name="Тип события",
+                                  )
+    payload = models.JSONField(verbose_name="Данные события")
+    created = models.DateTimeField(auto_now_add=True,
+                                   verbose_name="время создания",
+                                   )
+    attempts = models.PositiveIntegerField(default=0,
+                                           verbose_name="Попыток доставки",
+                                           )
+    next_attempt_at = models.DateTimeField(default=timezone.now,
+                                           null=True,
+                                           verbose_name="Следующая попытка",
+                                           )
+    delivered_at = models.DateTimeField(null=True,
+                                        blank=True,
+                                        verbose_name="время доставки",
+                                        )
+    last_error = models.TextField(blank=True,
+                                  verbose_name="Последняя ошибка",
+                                  )
+
+    class Meta:
+        verbose_name = "Событие заказа"
+        verbose_name_plural = "События заказов"
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["next_attempt_at"],
+                         condition=models.Q(delivered_at__isnull=True),
+                         name="order_outbox_pending_idx",
+                         ),
+        ]
+
+    def __str__(self):
+        return f"id:{self.id} - {self.event_type} - order:{self.order_id}"
+
+    @classmethod
+    def for_order(cls, order, event_type, positions=None, **extra):
+        """
+        positions - позиции заказа, если они уже загружены (иначе читаются из базы)
+        """
+        if positions is None:
+            positions = order.positions.all()
+        return cls(order_id=order.id,
+                   event_type=event_type,
+                   payload={
+                       "order_id": order.id,
+                       "user_id": order.user_id,
+                       "status": order.status,
+                       "total_cost": float(order.total_cost),
+                       "positions": [
+                           {"product_id": position.product_id, "quantity": position.quantity}
+                           for position in positions
+                       ],
+                       **extra,
+                   },
+                   )
+
+    def as_message(self):
+        return {
+            "id": self.id,
+            "event_type": self.event_type,
+            "created": self.created.isoformat(),
+            "payload": self.payload,
+        }
+
+
+class UserOrderStats(models.Model):
+    """
+    Сводка по заказам пользователя: число заказов, сумма и дата последнего заказа.
+    Обновляется при создании, изменении и удалении заказов (apply), без агрегации при чтении;
+    расхождения с заказами находит команда check_order_stats
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL,
+                                on_delete=models.CASCADE,
+                                primary_key=True,
+                                related_name="order_stats",
+                                verbose_name="Покупатель",
+                                )
+    orders_count = models.PositiveIntegerField(default=0,
+                                               verbose_name="Число заказов",
+                                               )
+    total_spent = models.FloatField(default=0,
+                                    verbose_name="Сумма заказов",
+                                    )
+    last_order_date = models.DateField(null=True,
+                                       verbose_name="Дата последнего заказа",
+                                       )
+
+    class Meta:
+        verbose_name = "Сводка по заказам пользователя"
+        verbose_name_plural = "Сводки по заказам пользователей"
+
+    def __str__(self):
+        return f"user:{self.user_id} - orders:{self.orders_count} - spent:{self.total_spent}"
+
+    @classmethod
+    def apply(cls, user_id, orders=0, spent=0.0, order_date=None):
+        """
+        Прибавляет к сводке пользователя orders заказов на сумму spent; order_date -
+        дата нового заказа. Одним UPDATE, строка создается при первом заказе
+        """
+        values = {
+            "orders_count": models.F("orders_count") + orders,
+            "total_spent": models.F("total_spent") + spent,
+        }
+        if order_date is not None:
+            values["last_order_date"] = models.Case(
+                models.When(models.Q(last_order_date__isnull=True) | models.Q(last_order_date__lt=order_date),
+                            then=models.Value(order_date)),
+                default=models.F("last_order_date"),
+            )
+        if cls.objects.filter(user_id=user_id).update(**values):
+            return
+        if orders < 0 or spent < 0:
+            # сводки нет, а заказ удаляется - считаем ее по заказам
+            cls.rebuild([user_id])
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(user_id=user_id, orders_count=orders, total_spent=spent,
+                                   last_order_date=order_date)
+        except IntegrityError:
+            # строку успел создать параллельный запрос
+            cls.objects.filter(user_id=user_id).update(**values)
+
+    @classmethod
+    def actual(cls, user_ids=None):
+        """
+        Сводки, посчитанные по заказам: {id пользователя: (число, сумма, дата последнего)}
+        """
+        orders = Order.objects.order_by()
+        if user_ids is not None:
+            orders = orders.filter(user_id__in=user_ids)
+        return {row["user_id"]: (row["orders_count"], row["total_spent"] or 0.0, row["last_order_date"])
+                for row in (orders
+                            .values("user_id")
+                            .annotate(orders_count=models.Count("id"),
+                                      total_spent=models.Sum("total_cost"),
+                                      last_order_date=models.Max("created")))}
+
+    @classmethod
+    def rebuild(cls, user_ids):
+        """
+        Пересчитывает сводки пользователей по их заказам
+        """
+        actual = cls.actual(user_ids)
+        with transaction.atomic():
+            cls.objects.filter(user_id__in=user_ids).delete()
+            cls.objects.bulk_create(cls(user_id=user_id, orders_count=count, total_spent=spent, last_order_date=last)
+                                    for user_id, (count, spent, last) in actual.items())
+
+
 class Collection(CommonInfo):
     """
     Модель для описания подборки товаров
@@ -130,6 +490,23 @@ class Collection(CommonInfo):
                             )
     products = models.ManyToManyField(Product,
                                       through="CollectionProduct")
+    # сводка по товарам подборки, обновляется refresh_summary при изменении состава подборки и цен
+    products_count = models.PositiveIntegerField(default=0,
+                                                 editable=False,
+                                                 verbose_name="Число товаров",
+                                                 )
+    min_price = models.DecimalField(max_digits=10,
+                                    decimal_places=2,
+                                    null=True,
+                                    editable=False,
+                                    verbose_name="Минимальная цена",
+                                    )
+    max_price = models.DecimalField(max_digits=10,
+                                    decimal_places=2,
+                                    null=True,
+                                    editable=False,
+                                    verbose_name="Максимальная цена",
+                                    )
 
     class Meta:
         verbose_name = "Подборка"
@@ -139,6 +516,24 @@ class Collection(CommonInfo):
     def __str__(self):
         return f"name:{self.name} - id:{self.id}"
 
+    @classmethod
+    def refresh_summary(cls, collection_ids):
+        """
+        Пересчитывает число товаров и диапазон цен подборок одним UPDATE
+        """
+        if not collection_ids:
+            return
+        links = (CollectionProduct.objects
+                 .filter(collection_id=models.OuterRef("pk"))
+                 .order_by()
+                 .values("collection_id"))
+        cls.objects.filter(id__in=collection_ids).update(
+            products_count=Coalesce(models.Subquery(links.annotate(value=models.Count("id")).values("value")), 0),
+            min_price=models.Subquery(links.annotate(value=models.Min("product__price")).values("value")),
+            max_price=models.Subquery(links.annotate(value=models.Max("product__price")).values("value")),
+        )
+        ChangeLog.record(cls, collection_ids)
+
 
 class CollectionProduct(models.Model):
     """
@@ -196,6 +591,234 @@ class ProductReview(CommonInfo):
         return f"id:{self.id} - user:{self.user}"
 
 
+class ChangeActionChoices(models.TextChoices):
+    """
+    Модель TextChoices создает choices set для назначения поля action модели ChangeLog
+    """
+    INSERT = "insert", "Создание"
+    UPDATE = "update", "Изменение"
+    DELETE = "delete", "Удаление"
+
+
+class TransactionId(models.Func):
+    """
+    Номер текущей транзакции: txid_current() в PostgreSQL, 0 в остальных базах
+    """
+    output_field = models.BigIntegerField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return "0", []
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return "txid_current()", []
+
+
+class ChangeLog(models.Model):
+    """
+    Модель для журнала изменений каталога. Курсор синхронизации через /api/v1/changes/ -
+    пара (txid, id): номер транзакции, записавшей изменение, и возрастающий id
+    """
+    id = models.BigAutoField(primary_key=True)
+    txid = models.BigIntegerField(default=0,
+                                  editable=False,
+                                  verbose_name="Транзакция",
+                                  )
+    entity = models.CharField(max_length=50,
+                              verbose_name="Сущность",
+                              )
+    object_id = models.BigIntegerField(verbose_name="ID объекта")
+    action = models.CharField(max_length=10,
+                              choices=ChangeActionChoices.choices,
+                              verbose_name="Действие",
+                              )
+    created = models.DateTimeField(auto_now_add=True,
+                                   verbose_name="время изменения",
+                                   )
+
+    class Meta:
+        verbose_name = "Изменение каталога"
+        verbose_name_plural = "Журнал изменений каталога"
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["entity", "-id"], name="changelog_entity_id_idx"),
+            models.Index(fields=["txid", "id"], name="changelog_txid_id_idx"),
+        ]
+
+    def __str__(self):
+        return f"id:{self.id} - {self.action}:{self.entity}:{self.object_id}"
+
+    @classmethod
+    def record(cls, model, object_ids, action=ChangeActionChoices.UPDATE):
+        """
+        Записывает изменения объектов модели model. Для изменений в обход save() / delete()
+        (QuerySet.update, пакетная вставка и удаление), которые не отправляют сигналы
+        """
+        cls.objects.bulk_create(cls(entity=model._meta.model_name, object_id=object_id, action=action,
+                                    txid=TransactionId())
+                                for object_id in object_ids)
+
+    @classmethod
+    def after(cls, txid=0, change_id=0):
+        """
+        Записи после курсора (txid, id) в порядке (txid, id).
+
+        id выдается при вставке, а запись видна после фиксации транзакции, поэтому запись
+        с меньшим id может появиться позже записей с большим id. В PostgreSQL возвращаются только
+        записи транзакций старше самой старой незавершенной (txid_snapshot_xmin): новые записи
+        с такими txid появиться уже не могут, и курсор их не пропустит
+        """
+        changes = cls.objects.filter(models.Q(txid__gt=txid) | models.Q(txid=txid, id__gt=change_id))
+        if connections[cls.objects.db].vendor == "postgresql":
+            changes = changes.filter(txid__lt=RawSQL("txid_snapshot_xmin(txid_current_snapshot())", []))
+        return changes.order_by("txid", "id")
+
+
+CHANGE_FEED_MODELS = (Product, Collection, CollectionProduct, ProductReview)
+
+
+@receiver(post_save)
+def log_catalog_save(sender, instance, created=False, raw=False, **kwargs):
+    if sender in CHANGE_FEED_MODELS and not raw:
+        ChangeLog.record(sender, [instance.pk], ChangeActionChoices.INSERT if created else ChangeActionChoices.UPDATE)
+
+
+@receiver(post_delete)
+def log_catalog_delete(sender, instance, **kwargs):
+    if sender in CHANGE_FEED_MODELS:
+        ChangeLog.record(sender, [instance.pk], ChangeActionChoices.DELETE)
+
+
+@receiver(m2m_changed, sender=CollectionProduct)
+def log_collection_products_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Добавление и удаление товаров через Collection.products не вызывает post_save/post_delete
+    для CollectionProduct, поэтому изменения связей записываются отдельно
+    """
+    if action not in ("post_add", "pre_remove", "pre_clear"):
+        return
+    links = CollectionProduct.objects.filter(**{"product" if reverse else "collection": instance})
+    if pk_set is not None:
+        links = links.filter(**{"collection_id__in" if reverse else "product_id__in": pk_set})
+
+    change_action = ChangeActionChoices.INSERT if action == "post_add" else ChangeActionChoices.DELETE
+    ChangeLog.record(CollectionProduct, links.values_list("id", flat=True), change_action)
+
+
+@receiver(m2m_changed, sender=CollectionProduct)
+def refresh_collection_summary_on_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            Collection.refresh_summary([instance.id])
+    elif action == "pre_clear":
+        instance._cleared_collection_ids = list(instance.collection_set.values_list("id", flat=True))
+    elif action == "post_clear":
+        Collection.refresh_summary(getattr(instance, "_cleared_collection_ids", []))
+    elif action in ("post_add", "post_remove"):
+        Collection.refresh_summary(list(pk_set))
+
+
+@receiver(post_save, sender=CollectionProduct)
+@receiver(post_delete, sender=CollectionProduct)
+def refresh_collection_summary(sender, instance, raw=False, **kwargs):
+    if not raw:
+        Collection.refresh_summary([instance.collection_id])
+
+
+@receiver(post_save, sender=Product)
+def record_product_price(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and "price" not in update_fields):
+        return
+    if created:
+        ProductPrice.objects.create(product=instance, price=instance.price)
+    else:
+        ProductPrice.record_changes(Product.objects.filter(pk=instance.pk), log=False)
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_collections_summary(sender, instance, created=False, raw=False, **kwargs):
+    if not created and not raw:
+        Collection.refresh_summary(list(CollectionProduct.objects
+                                        .filter(product=instance)
+                                        .values_list("collection_id", flat=True)))
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_cached_reads(sender, instance, **kwargs):
+    """
+    Кэшированные ответы retrieve товара и подборок перестают использоваться после изменения
+    """
+    from shop.coalescing import collection_reads, product_reads
+    if sender is Product:
+        product_reads.invalidate(instance.pk)
+    if sender in (Product, Collection, CollectionProduct):
+        collection_reads.invalidate()
+
+
+@receiver(m2m_changed, sender=CollectionProduct)
+def invalidate_cached_collection_reads(sender, action, **kwargs):
+    from shop.coalescing import collection_reads
+    if action in ("post_add", "post_remove", "post_clear"):
+        collection_reads.invalidate()
+
+
+@receiver(pre_save, sender=OrderProductPosition)
+def copy_order_created(sender, instance, raw=False, **kwargs):
+    """
+    Позиция попадает в ту же месячную секцию, что и заказ. Дата заказа не меняется, поэтому
+    у сохраненной позиции она уже верна, а заказ читается из базы, только если его нет в позиции
+    """
+    if raw or instance.order_id is None:
+        return
+    if OrderProductPosition.order.is_cached(instance):
+        instance.created = instance.order.created
+    elif instance._state.adding:
+        instance.created = Order.objects.filter(pk=instance.order_id).values_list("created", flat=True).get()
+
+
+@receiver(pre_delete, sender=Order)
+def release_deleted_order_stock(sender, instance, **kwargs):
+    from shop.stock import release_order_reservations
+    release_order_reservations([instance.id])
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_totals(sender, instance, raw=False, **kwargs):
+    """
+    Сумма и покупатель до изменения заказа - для обновления сводок в record_order_save
+    """
+    if not raw and instance.pk is not None:
+        instance._previous_totals = Order.objects.filter(pk=instance.pk).values_list("user_id", "total_cost").first()
+
+
+@receiver(post_save, sender=Order)
+def record_order_save(sender, instance, created=False, raw=False, **kwargs):
+    if raw or getattr(instance, "_order_stats_deferred", False):
+        # пакетное создание заказов обновляет сводку само, одним запросом
+        return
+    previous = getattr(instance, "_previous_totals", None)
+    if created or previous is None:
+        UserOrderStats.apply(instance.user_id, 1, float(instance.total_cost), instance.created)
+        return
+    previous_user_id, previous_total = previous
+    if previous_user_id != instance.user_id:
+        UserOrderStats.rebuild([previous_user_id, instance.user_id])
+    elif float(previous_total) != float(instance.total_cost):
+        UserOrderStats.apply(instance.user_id, spent=float(instance.total_cost) - float(previous_total))
+
+
+@receiver(post_delete, sender=Order)
+def record_order_delete(sender, instance, **kwargs):
+    UserOrderStats.apply(instance.user_id, -1, -float(instance.total_cost))
+    stats = UserOrderStats.objects.filter(user_id=instance.user_id).first()
+    if stats is not None and stats.last_order_date == instance.created:
+        # удален, возможно, последний заказ - дата последнего заказа пересчитывается
+        stats.last_order_date = (Order.objects
+                                 .filter(user_id=instance.user_id)
+                                 .aggregate(last=models.Max("created"))["last"])
+        stats.save(update_fields=["last_order_date"])
+
+
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_auth_token(sender, instance=None, created=False, **kwargs):
     if created:
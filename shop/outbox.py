@@ -0,0 +1,171 @@
+"""
+Доставка исходящих событий по заказам (OrderOutboxEvent) во внешние получатели.
+
+Получатель задается строкой:
+    file:/var/log/shop/orders.jsonl   - дописывать события в файл, по одному JSON на строку
+    http://127.0.0.1:9000/events      - отправлять пакет событий POST-запросом в JSON
+    callable:package.module.function  - вызывать функцию со списком событий
+"""
+import json
+import logging
+import time
+import urllib.request
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from shop.models import OrderOutboxEvent
+
+logger = logging.getLogger(__name__)
+
+
+class FileSink:
+    def __init__(self, path):
+        self.path = path
+
+    def deliver(self, messages):
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.writelines(json.dumps(message, ensure_ascii=False) + "\n" for message in messages)
+            file.flush()
+
+
+class HttpSink:
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def deliver(self, messages):
+        request = urllib.request.Request(self.url,
+                                         data=json.dumps(messages).encode(),
+                                         headers={"Content-Type": "application/json"},
+                                         method="POST",
+                                         )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            if response.status >= 300:
+                raise RuntimeError(f"Получатель вернул код {response.status}")
+
+
+class CallableSink:
+    def __init__(self, func):
+        self.func = func
+
+    def deliver(self, messages):
+        self.func(messages)
+
+
+def get_sink(spec):
+    if spec.startswith("file:"):
+        return FileSink(spec[len("file:"):])
+    if spec.startswith(("http://", "https://")):
+        return HttpSink(spec)
+    if spec.startswith("callable:"):
+        return CallableSink(import_string(spec[len("callable:"):]))
+    raise ValueError(f"Неизвестный получатель событий: {spec}")
+
+
+def retry_delay(attempts):
+    """
+    Экспоненциальная задержка перед повторной доставкой
+    """
+    return min(settings.OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1), settings.OUTBOX_BACKOFF_MAX_SECONDS)
+
+
+def claim_batch(batch_size):
+    """
+    Захват пакета событий в короткой транзакции. Строки выбираются через SELECT ... FOR UPDATE SKIP LOCKED,
+    и следующая попытка переносится на OUTBOX_LEASE_SECONDS вперед (аренда): после фиксации
+    блокировки снимаются, но другие обработчики не получат эти события, пока аренда не истечет.
+    Если обработчик упадет во время доставки, события будут доставлены повторно после истечения аренды
+    """
+    with transaction.atomic():
+        events = list(OrderOutboxEvent.objects
+                      .select_for_update(skip_locked=True)
+                      .filter(delivered_at__isnull=True, next_attempt_at__lte=timezone.now())
+                      .order_by("id")[:batch_size])
+        if events:
+            OrderOutboxEvent.objects.filter(id__in=[event.id for event in events]) \
+                .update(next_attempt_at=timezone.now() + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS))
+    return events
+
+
+def mark_failed(events, exc):
+    """
+    Запись неудачной попытки доставки: следующая попытка - с экспоненциальной задержкой
+    """
+    now = timezone.now()
+    for event in events:
+        event.attempts += 1
+        event.last_error = repr(exc)
+        if event.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            event.next_attempt_at = None
+        else:
+            event.next_attempt_at = now + timedelta(seconds=retry_delay(event.attempts))
+    with transaction.atomic():
+        OrderOutboxEvent.objects.bulk_update(events, ["attempts", "last_error", "next_attempt_at"])
+
+
+def drain_batch(sink, batch_size):
+    """
+    Доставка одного пакета событий: захват (claim_batch), доставка вне транзакции и отметка
+    о доставке во второй короткой транзакции, поэтому медленный получатель не держит
+    транзакцию и блокировки строк. Несколько обработчиков могут работать параллельно.
+    Возвращает пару (доставлено, не доставлено)
+    """
+    events = claim_batch(batch_size)
+    if not events:
+        return 0, 0
+
+    try:
+        sink.deliver([event.as_message() for event in events])
+    except Exception as exc:
+        logger.warning("Не удалось доставить %s событий: %s", len(events), exc)
+        mark_failed(events, exc)
+        return 0, len(events)
+
+    with transaction.atomic():
+        OrderOutboxEvent.objects.filter(id__in=[event.id for event in events]).update(delivered_at=timezone.now())
+    return len(events), 0
+
+
+class OutboxWorker:
+    """
+    Цикл доставки событий со счетчиками пропускной способности
+    """
+
+    def __init__(self, sink, batch_size=None, idle_sleep=1.0):
+        self.sink = sink
+        self.batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+        self.idle_sleep = idle_sleep
+        self.delivered = 0
+        self.failed = 0
+        self.batches = 0
+        self.started = time.monotonic()
+        self.stopped = False
+
+    def run_once(self):
+        delivered, failed = drain_batch(self.sink, self.batch_size)
+        self.delivered += delivered
+        self.failed += failed
+        self.batches += bool(delivered or failed)
+        return delivered + failed
+
+    def run(self, stats_interval=60):
+        last_report = time.monotonic()
+        while not self.stopped:
+            if not self.run_once():
+                time.sleep(self.idle_sleep)
+            if time.monotonic() - last_report >= stats_interval:
+                logger.info("Outbox: %s", self.stats())
+                last_report = time.monotonic()
+
+    def stats(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "batches": self.batches,
+            "events_per_second": round(self.delivered / elapsed, 2),
+        }
@@ -0,0 +1,87 @@
+"""
+Изменение и удаление объектов пользователя одним запросом к базе.
+
+Проверка владельца выполняется в условии самого запроса:
+
+    UPDATE shop_productreview SET ... WHERE id = %s AND user_id = %s RETURNING ...
+
+Если ни одна строка не изменена, объекта нет или он принадлежит другому пользователю.
+post_save / post_delete отправляются для возвращенного объекта, поэтому журнал изменений
+каталога и другие обработчики сигналов работают как при save() / delete().
+
+Запросы выполняются в базе для записи (router.db_for_write): QuerySet.db без явного
+using() - база для чтения, то есть реплика вне запросов, закрепленных за основной базой.
+"""
+from django.db import connections, router, transaction
+from django.db.models import sql
+from django.db.models.signals import post_delete, post_save
+
+
+def owned_by(queryset, user):
+    """
+    Объекты пользователя; администратору доступны все объекты
+    """
+    if user.is_staff:
+        return queryset
+    return queryset.filter(user_id=user.id)
+
+
+def supports_returning(connection):
+    if connection.vendor == "postgresql":
+        return True
+    return connection.vendor == "sqlite" and connection.Database.sqlite_version_info >= (3, 35)
+
+
+def for_write(queryset):
+    """
+    queryset в базе для записи, если база не задана явно через using()
+    """
+    return queryset.using(queryset._db or router.db_for_write(queryset.model))
+
+
+def _returning(queryset, query):
+    model = queryset.model
+    connection = connections[queryset.db]
+    statement, params = query.get_compiler(queryset.db).as_sql()
+    columns = ", ".join(connection.ops.quote_name(field.column) for field in model._meta.concrete_fields)
+    return next(iter(model._base_manager.db_manager(queryset.db).raw(f"{statement} RETURNING {columns}", params)),
+                None)
+
+
+def update_returning(queryset, values):
+    """
+    Изменяет поля values единственного объекта из queryset и возвращает его или None
+    """
+    queryset = for_write(queryset)
+    if supports_returning(connections[queryset.db]):
+        query = queryset.query.chain(sql.UpdateQuery)
+        query.add_update_values(values)
+        obj = _returning(queryset, query)
+    else:
+        with transaction.atomic(using=queryset.db):
+            obj = queryset.get() if queryset.update(**values) else None
+
+    if obj is not None:
+        post_save.send(sender=queryset.model, instance=obj, created=False, update_fields=frozenset(values),
+                       raw=False, using=queryset.db)
+    return obj
+
+
+def delete_returning(queryset):
+    """
+    Удаляет единственный объект из queryset и возвращает его или None. Для моделей,
+    на которые ссылаются другие модели, используется обычное удаление с каскадом
+    """
+    queryset = for_write(queryset)
+    model = queryset.model
+    if model._meta.related_objects or not supports_returning(connections[queryset.db]):
+        with transaction.atomic(using=queryset.db):
+            obj = queryset.first()
+            if obj is not None:
+                obj.delete()
+        return obj
+
+    obj = _returning(queryset, queryset.query.chain(sql.DeleteQuery))
+    if obj is not None:
+        post_delete.send(sender=model, instance=obj, using=queryset.db)
+    return obj
@@ -0,0 +1,352 @@
+"""
+Секционирование таблиц заказов и позиций заказов по месяцам (PostgreSQL 12+).
+
+Таблицы shop_order и order_product_position секционируются по диапазону поля created:
+секция shop_order_y2026m10 содержит заказы, созданные в октябре 2026 года. Запросы с
+условием на created (например, фильтр OrderFilter.created) читают только нужные секции.
+
+Ограничения PostgreSQL для секционированных таблиц:
+
+* первичный ключ включает ключ секционирования: (id, created);
+* на id секционированной таблицы нельзя ссылаться внешним ключом, поэтому внешние ключи
+  других таблиц (order_id -> shop_order) заменяются парой отложенных триггеров-ограничений:
+  триггер на ссылающейся таблице проверяет, что заказ существует, а триггер на таблице
+  заказов не дает удалить заказ, на который остались ссылки (см. ensure_references);
+* строки, попавшие в секцию по умолчанию, мешают создать секцию за их месяц, поэтому
+  при создании такой секции они переносятся в нее (_create_partition).
+
+Преобразование выполняется миграцией 0013 при ORDER_PARTITIONING = True или командой
+python manage.py order_partitions --convert. Таблицы блокируются на время копирования данных.
+Старая таблица удаляется без CASCADE: если от нее зависит что-то кроме известных внешних
+ключей (например, представление), преобразование отменяется с ошибкой PartitioningError.
+"""
+import gzip
+import os
+import re
+from datetime import date
+
+from django.apps import apps
+from django.db import DatabaseError, connection as default_connection, transaction
+
+ORDER_TABLE = "shop_order"
+POSITION_TABLE = "order_product_position"
+# позиции секционируются после заказов: их внешний ключ на заказ удаляется вместе со старой таблицей заказов
+PARTITIONED_TABLES = (ORDER_TABLE, POSITION_TABLE)
+
+PARTITION_NAME_RE = re.compile(r"^(?P<table>.+)_y(?P<year>\d{4})m(?P<month>\d{2})$")
+
+
+class PartitioningNotSupported(Exception):
+    pass
+
+
+class PartitioningError(Exception):
+    pass
+
+
+REFERENCE_FUNCTIONS = """
+CREATE OR REPLACE FUNCTION shop_partitioned_reference_check() RETURNS trigger AS $$
+DECLARE
+    value bigint := (to_jsonb(NEW) ->> TG_ARGV[1])::bigint;
+    found boolean;
+BEGIN
+    IF value IS NOT NULL THEN
+        EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE id = $1)', TG_ARGV[0]) INTO found USING value;
+        IF NOT found THEN
+            RAISE foreign_key_violation USING MESSAGE = format(
+                'insert or update on table "%s" violates reference: %s=%s is not present in table "%s"',
+                TG_TABLE_NAME, TG_ARGV[1], value, TG_ARGV[0]);
+        END IF;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION shop_partitioned_reference_restrict() RETURNS trigger AS $$
+DECLARE
+    orphaned boolean;
+BEGIN
+    -- строка могла быть перенесена в другую секцию: ссылка нарушена, только если id больше нет
+    EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE %I = $1) AND NOT EXISTS (SELECT 1 FROM %I WHERE id = $1)',
+                   TG_ARGV[0], TG_ARGV[1], TG_ARGV[2]) INTO orphaned USING OLD.id;
+    IF orphaned THEN
+        RAISE foreign_key_violation USING MESSAGE = format(
+            'update or delete on table "%s" violates reference from table "%s": id=%s is still referenced',
+            TG_ARGV[2], TG_ARGV[0], OLD.id);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(day, months):
+    month = day.year * 12 + day.month - 1 + months
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_y{month.year:04d}m{month.month:02d}"
+
+
+def check_supported(connection=None):
+    connection = connection or default_connection
+    if connection.vendor != "postgresql":
+        raise PartitioningNotSupported("Секционирование заказов поддерживается только в PostgreSQL")
+    if connection.pg_version < 120000:
+        raise PartitioningNotSupported("Для секционирования заказов нужен PostgreSQL 12 или новее")
+
+
+def is_partitioned(table, connection=None):
+    connection = connection or default_connection
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [table])
+        row = cursor.fetchone()
+    return row is not None and row[0] == "p"
+
+
+def list_partitions(table, connection=None):
+    """
+    Возвращает [(месяц, имя секции)] по возрастанию месяца; секция по умолчанию не включается
+    """
+    connection = connection or default_connection
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                       "WHERE i.inhparent = to_regclass(%s)", [table])
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME_RE.match(name)
+        if match and match["table"] == table:
+            partitions.append((date(int(match["year"]), int(match["month"]), 1), name))
+    return sorted(partitions)
+
+
+def default_partition_name(table):
+    return f"{table}_default"
+
+
+def _table_exists(cursor, name):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+    return cursor.fetchone()[0]
+
+
+def _create_partition(cursor, table, month):
+    """
+    Создает секцию за месяц. Если в секции по умолчанию есть строки этого месяца, CREATE TABLE ... PARTITION OF
+    завершился бы ошибкой, поэтому секция создается отдельной таблицей, строки переносятся в нее
+    и она присоединяется к секционированной таблице. Возвращает число перенесенных строк
+    """
+    qn = cursor.db.ops.quote_name
+    name, default = partition_name(table, month), default_partition_name(table)
+    bounds = [month, add_months(month, 1)]
+    if _table_exists(cursor, name):
+        return 0
+
+    if _table_exists(cursor, default):
+        cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {qn(default)} WHERE created >= %s AND created < %s)", bounds)
+        stray = cursor.fetchone()[0]
+    else:
+        stray = False
+    if not stray:
+        cursor.execute(f"CREATE TABLE {qn(name)} PARTITION OF {qn(table)} FOR VALUES FROM (%s) TO (%s)", bounds)
+        return 0
+
+    cursor.execute(f"CREATE TABLE {qn(name)} (LIKE {qn(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    cursor.execute(f"WITH moved AS (DELETE FROM {qn(default)} WHERE created >= %s AND created < %s RETURNING *) "
+                   f"INSERT INTO {qn(name)} SELECT * FROM moved", bounds)
+    moved = cursor.rowcount
+    cursor.execute(f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(name)} FOR VALUES FROM (%s) TO (%s)", bounds)
+    return moved
+
+
+def model_references():
+    """
+    Внешние ключи моделей на секционированные таблицы: {(таблица, столбец, секционированная таблица)}
+    """
+    references = set()
+    for model in apps.get_models():
+        if not model._meta.managed or model._meta.proxy:
+            continue
+        for field in model._meta.local_concrete_fields:
+            if field.many_to_one and field.related_model._meta.db_table in PARTITIONED_TABLES:
+                references.add((model._meta.db_table, field.column, field.related_model._meta.db_table))
+    return references
+
+
+def ensure_references(references, connection=None):
+    """
+    Создает недостающие триггеры-ограничения вместо внешних ключей на секционированные таблицы.
+    references - тройки (таблица, столбец, секционированная таблица). Возвращает имена созданных триггеров
+    """
+    connection = connection or default_connection
+    qn = connection.ops.quote_name
+    created = []
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(REFERENCE_FUNCTIONS)
+        for child, column, parent in sorted(references):
+            triggers = [
+                (f"{child}_{column}_ref", child,
+                 f"AFTER INSERT OR UPDATE OF {qn(column)}",
+                 "shop_partitioned_reference_check(%s, %s)", [parent, column]),
+                (f"{child}_{column}_restrict", parent,
+                 "AFTER DELETE OR UPDATE OF id",
+                 "shop_partitioned_reference_restrict(%s, %s, %s)", [child, column, parent]),
+            ]
+            for name, table, events, function, args in triggers:
+                cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_trigger WHERE tgrelid = to_regclass(%s) "
+                               "AND tgname = %s)", [table, name])
+                if cursor.fetchone()[0]:
+                    continue
+                cursor.execute(f"CREATE CONSTRAINT TRIGGER {qn(name)} {events} ON {qn(table)} "
+                               f"DEFERRABLE INITIALLY DEFERRED FOR EACH ROW EXECUTE FUNCTION {function}", args)
+                created.append(name)
+    return created
+
+
+def _drop_legacy(cursor, table, legacy):
+    """
+    Удаляет внешние ключи других таблиц на старую таблицу, затем саму таблицу (без CASCADE).
+    Возвращает {(таблица, столбец, table)} удаленных внешних ключей
+    """
+    qn = cursor.db.ops.quote_name
+    cursor.execute("SELECT r.relname, c.conname, array_length(c.conkey, 1), a.attname FROM pg_constraint c "
+                   "JOIN pg_class r ON r.oid = c.conrelid "
+                   "JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1] "
+                   "WHERE c.contype = 'f' AND c.confrelid = to_regclass(%s) AND c.conrelid <> c.confrelid",
+                   [legacy])
+    references = set()
+    for child, name, columns, column in cursor.fetchall():
+        if columns != 1:
+            raise PartitioningError(f"Составной внешний ключ {name} таблицы {child} на {table} не поддерживается")
+        cursor.execute(f"ALTER TABLE {qn(child)} DROP CONSTRAINT {qn(name)}")
+        references.add((child, column, table))
+
+    try:
+        with transaction.atomic(using=cursor.db.alias):
+            cursor.execute(f"DROP TABLE {qn(legacy)}")
+    except DatabaseError as exc:
+        raise PartitioningError(f"Таблица {legacy} не удалена: от нее зависят другие объекты базы, "
+                                f"перенесите их на {table} и повторите преобразование ({exc})") from exc
+    return references
+
+
+def _convert_table(cursor, table, months):
+    """
+    Преобразует таблицу в секционированную; возвращает внешние ключи других таблиц, которые были на нее
+    """
+    qn = cursor.db.ops.quote_name
+    legacy = f"{table}_legacy"
+
+    cursor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(legacy)}")
+    cursor.execute("SELECT i.relname, pg_get_indexdef(ix.indexrelid) FROM pg_index ix "
+                   "JOIN pg_class i ON i.oid = ix.indexrelid "
+                   "WHERE ix.indrelid = to_regclass(%s) AND NOT ix.indisunique", [legacy])
+    indexes = cursor.fetchall()
+    cursor.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                   "WHERE conrelid = to_regclass(%s) AND contype = 'f' "
+                   "AND confrelid NOT IN (SELECT to_regclass(name) FROM unnest(%s::text[]) AS name)",
+                   [legacy, list(PARTITIONED_TABLES)])
+    foreign_keys = cursor.fetchall()
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [legacy])
+    sequence = cursor.fetchone()[0]
+
+    cursor.execute(f"CREATE TABLE {qn(table)} (LIKE {qn(legacy)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+                   f"PARTITION BY RANGE (created)")
+    cursor.execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(table + '_pkey')} PRIMARY KEY (id, created)")
+    if sequence:
+        cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {qn(table)}.id")
+
+    for month in months:
+        _create_partition(cursor, table, month)
+    cursor.execute(f"CREATE TABLE {qn(table + '_default')} PARTITION OF {qn(table)} DEFAULT")
+
+    cursor.execute(f"INSERT INTO {qn(table)} SELECT * FROM {qn(legacy)}")
+    references = _drop_legacy(cursor, table, legacy)
+
+    # индексы создаются после копирования данных, на родительской таблице - сразу для всех секций
+    legacy_table_re = re.compile(rf" ON (ONLY )?(\S+\.)?{re.escape(qn(legacy))} | ON (ONLY )?(\S+\.)?{legacy} ")
+    for name, definition in indexes:
+        cursor.execute(legacy_table_re.sub(f" ON {qn(table)} ", definition, count=1))
+    for name, definition in foreign_keys:
+        cursor.execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}")
+    return references
+
+
+def convert_to_partitioned(months_ahead=3, connection=None, today=None):
+    """
+    Преобразует таблицы заказов и позиций в секционированные. Секции создаются на все месяцы
+    с первого заказа до months_ahead месяцев вперед; уже преобразованные таблицы пропускаются.
+    Внешние ключи других таблиц на преобразованные заменяются триггерами-ограничениями
+    """
+    connection = connection or default_connection
+    check_supported(connection)
+    current = month_start(today or date.today())
+    converted = []
+    references = set()
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        for table in PARTITIONED_TABLES:
+            if is_partitioned(table, connection):
+                continue
+            cursor.execute(f"SELECT min(created) FROM {connection.ops.quote_name(table)}")
+            first = cursor.fetchone()[0]
+            month = month_start(first) if first else current
+            months = []
+            while month <= add_months(current, months_ahead):
+                months.append(month)
+                month = add_months(month, 1)
+            references |= _convert_table(cursor, table, months)
+            converted.append(table)
+        if references:
+            ensure_references(references, connection)
+    return converted
+
+
+def create_partitions(months_ahead=3, connection=None, today=None):
+    """
+    Создает секции на текущий и следующие months_ahead месяцев; строки этих месяцев из секции
+    по умолчанию переносятся в новые секции. Возвращает имена созданных секций
+    """
+    connection = connection or default_connection
+    current = month_start(today or date.today())
+    created = []
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        for table in PARTITIONED_TABLES:
+            existing = {month for month, name in list_partitions(table, connection)}
+            for offset in range(months_ahead + 1):
+                month = add_months(current, offset)
+                if month not in existing:
+                    _create_partition(cursor, table, month)
+                    created.append(partition_name(table, month))
+    return created
+
+
+def archive_partitions(before, directory=None, connection=None):
+    """
+    Отсоединяет секции за месяцы раньше before. Если указан directory, данные секции
+    выгружаются в directory/<секция>.csv.gz, после чего секция удаляется;
+    иначе отсоединенная секция остается отдельной таблицей
+    """
+    connection = connection or default_connection
+    qn = connection.ops.quote_name
+    archived = []
+    for table in reversed(PARTITIONED_TABLES):
+        for month, name in list_partitions(table, connection):
+            if add_months(month, 1) > month_start(before):
+                continue
+            with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                cursor.execute(f"ALTER TABLE {qn(table)} DETACH PARTITION {qn(name)}")
+                if directory is not None:
+                    path = os.path.join(directory, f"{name}.csv.gz")
+                    with gzip.open(path, "wb") as file:
+                        cursor.copy_expert(f"COPY {qn(name)} TO STDOUT WITH (FORMAT csv, HEADER)", file)
+                    cursor.execute(f"DROP TABLE {qn(name)}")
+            archived.append(name)
+    return archived
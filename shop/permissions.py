@@ -1,7 +1,14 @@
+from django.contrib.auth import get_user_model
 from rest_framework import permissions
 
 
 class IsOwnerOrAdmin(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
-        return obj.user == request.user or request.user.is_staff
+        """
+        Владелец определяется по колонке user_id объекта, без загрузки связанного пользователя
+        """
+        if request.user.is_staff:
+            return True
+        owner_id = obj.pk if isinstance(obj, get_user_model()) else obj.user_id
+        return owner_id == request.user.id
@@ -0,0 +1,66 @@
+"""
+Чтение истории цен товаров (ProductPrice).
+
+Ряд цен товара и цена на момент времени читаются по индексу (product_id, valid_from):
+
+    SELECT price FROM shop_productprice
+    WHERE product_id = ... AND valid_from <= ...
+    ORDER BY valid_from DESC, id DESC LIMIT 1
+
+Цены многих товаров на момент времени - тот же подзапрос для каждого товара страницы
+(товары перебираются по возрастанию id), поэтому время ответа не зависит от длины истории.
+"""
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from shop.models import ProductPrice
+
+
+def parse_moment(name, value, end_of_day=False):
+    """
+    Момент времени из параметра запроса: дата и время ISO 8601 или дата
+    (начало дня, с end_of_day - конец дня). Время без пояса - в поясе TIME_ZONE
+    """
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError(value)
+            moment = datetime.combine(day, time.max if end_of_day else time.min)
+    except ValueError:
+        raise ValidationError({name: "Ожидается дата или дата и время в формате ISO 8601"})
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def price_series(product, start=None, end=None, after=None, limit=1000):
+    """
+    Цены товара по возрастанию valid_from: с start и по end включительно, после курсора after.
+    Возвращает (строки, есть ли еще строки)
+    """
+    history = ProductPrice.objects.filter(product=product)
+    if start is not None:
+        history = history.filter(valid_from__gte=start)
+    if end is not None:
+        history = history.filter(valid_from__lte=end)
+    if after is not None:
+        history = history.filter(valid_from__gt=after)
+    rows = list(history.order_by("valid_from", "id")[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def prices_as_of(moment, product_ids=None, since=0, limit=1000):
+    """
+    Цены товаров на момент moment по возрастанию id товара, после товара since.
+    Возвращает (товары с полем price_at, есть ли еще товары)
+    """
+    products = ProductPrice.as_of(moment).filter(id__gt=since)
+    if product_ids is not None:
+        products = products.filter(id__in=product_ids)
+    rows = list(products.only("id").order_by("id")[:limit + 1])
+    return rows[:limit], len(rows) > limit
@@ -0,0 +1,229 @@
+"""
+Рекомендации "часто покупают вместе" по совместным покупкам товаров.
+
+Матрица совместных покупок C (товар x товар) считается по матрице заказов A
+(заказ x товар, 1 - товар есть в заказе): C = A^T A, на диагонали - число заказов с товаром.
+Позиции читаются потоком, упорядоченные по заказу, и обрабатываются пакетами целых заказов,
+поэтому в памяти находится только разреженная матрица C и один пакет позиций.
+
+Матрица и учтенные позиции хранятся в базе (RelatedProductsState) и сохраняются в одной
+транзакции с RelatedProduct. При следующем запуске пересчитываются только заказы с новыми
+позициями: к C прибавляется A_all^T A_all - A_old^T A_old по этим заказам, после чего
+обновляется RelatedProduct для затронутых товаров.
+
+Позиция с меньшим id может появиться после позиции с большим id (ее транзакция зафиксирована
+позже), поэтому кроме номера последней учтенной позиции хранятся пропуски в номерах - диапазоны
+еще не появившихся позиций. Пропуск проверяется при каждом запуске, пока с запуска, который
+его обнаружил, не пройдет RECOMMENDATIONS_LAG_SECONDS: транзакции дольше этого окна
+и удаление заказов и позиций инкрементально не учитываются - для этого служит полный пересчет (--full).
+"""
+import io
+from bisect import bisect_right
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from scipy import sparse
+
+from shop.models import OrderProductPosition, Product, RelatedProduct, RelatedProductsState
+
+STATE_ID = 1
+
+
+def load_state():
+    """
+    Возвращает (состояние, матрица совместных покупок); без сохраненного состояния - (пустое состояние, None)
+    """
+    state = RelatedProductsState.objects.filter(pk=STATE_ID).first()
+    if state is None:
+        return RelatedProductsState(pk=STATE_ID), None
+    with np.load(io.BytesIO(bytes(state.matrix))) as data:
+        matrix = sparse.csr_matrix((data["data"], data["indices"], data["indptr"]), shape=tuple(data["shape"]))
+    return state, matrix
+
+
+def save_state(state, matrix, last_position, gaps, marks):
+    """
+    Сохраняет состояние, если его не изменил параллельный запуск
+    """
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr,
+                        shape=np.array(matrix.shape))
+    fields = {
+        "matrix": buffer.getvalue(),
+        "last_position": last_position,
+        "gaps": gaps,
+        "marks": marks,
+        "version": state.version + 1,
+        "updated": timezone.now(),
+    }
+    if state._state.adding:
+        RelatedProductsState.objects.create(pk=STATE_ID, **fields)
+    elif not RelatedProductsState.objects.filter(pk=STATE_ID, version=state.version).update(**fields):
+        raise RuntimeError("Рекомендации одновременно пересчитывает другой процесс")
+
+
+def find_gaps(ids, start, end):
+    """
+    Диапазоны [первый, последний] номеров из (start, end], которых нет среди ids (упорядоченных, без повторов)
+    """
+    bounds = np.concatenate(([start], np.asarray(ids, dtype=np.int64), [end + 1]))
+    return [[int(bounds[i]) + 1, int(bounds[i + 1]) - 1] for i in np.nonzero(np.diff(bounds) > 1)[0]]
+
+
+def fill_gaps(gaps, ids):
+    """
+    Пропуски gaps без появившихся номеров ids (упорядоченных, без повторов)
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    remaining = []
+    for first, last in gaps:
+        found = ids[(ids >= first) & (ids <= last)]
+        remaining.extend(find_gaps(found, first - 1, last))
+    return remaining
+
+
+def resize(matrix, size):
+    if matrix is None:
+        return sparse.csr_matrix((size, size), dtype=np.int64)
+    if matrix.shape[0] >= size:
+        return matrix
+    matrix = matrix.tocoo()
+    return sparse.csr_matrix((matrix.data, (matrix.row, matrix.col)), shape=(size, size))
+
+
+def cooccurrence(order_ids, product_ids, size):
+    """
+    A^T A для позиций (order_ids[i], product_ids[i]); повтор товара в заказе считается один раз
+    """
+    if not len(order_ids):
+        return sparse.csr_matrix((size, size), dtype=np.int64)
+    rows = np.unique(order_ids, return_inverse=True)[1]
+    incidence = sparse.csr_matrix((np.ones(len(rows), dtype=np.int64), (rows, product_ids)),
+                                  shape=(rows.max() + 1, size))
+    incidence.data[:] = 1
+    return (incidence.T @ incidence).tocsr()
+
+
+def stream_batches(positions, batch_size):
+    """
+    Отдает пакеты (order_ids, product_ids, is_new) из целых заказов, примерно по batch_size позиций
+    """
+    orders, products, new = [], [], []
+    for order_id, product_id, is_new in positions:
+        if len(orders) >= batch_size and order_id != orders[-1]:
+            yield np.array(orders), np.array(products), np.array(new, dtype=bool)
+            orders, products, new = [], [], []
+        orders.append(order_id)
+        products.append(product_id)
+        new.append(is_new)
+    if orders:
+        yield np.array(orders), np.array(products), np.array(new, dtype=bool)
+
+
+def top_k(matrix, rows, k, existing):
+    """
+    Для каждого товара из rows возвращает до k пар (товар, число совместных заказов)
+    """
+    result = {}
+    for row in rows:
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        columns, counts = matrix.indices[start:end], matrix.data[start:end]
+        keep = (counts > 0) & (columns != row) & np.isin(columns, existing)
+        columns, counts = columns[keep], counts[keep]
+        if len(columns) > k:
+            best = np.argpartition(-counts, k - 1)[:k]
+            columns, counts = columns[best], counts[best]
+        order = np.lexsort((columns, -counts))
+        result[int(row)] = [(int(columns[i]), int(counts[i])) for i in order]
+    return result
+
+
+def build_related_products(full=False, top=None, batch_size=100000):
+    """
+    Обновляет матрицу совместных покупок и таблицу RelatedProduct.
+    Возвращает (число обработанных новых позиций, число обновленных товаров)
+    """
+    top = top or settings.RECOMMENDATIONS_TOP_K
+    state, matrix = load_state()
+    if full:
+        matrix, watermark, gaps = None, 0, []
+    else:
+        watermark, gaps = state.last_position, state.gaps
+    # позиции с номерами выше lowest могут быть еще не учтены
+    lowest = gaps[0][0] - 1 if gaps else watermark
+    gap_starts = [first for first, last in gaps]
+
+    def is_new(position_id):
+        if position_id > watermark:
+            return True
+        index = bisect_right(gap_starts, position_id) - 1
+        return index >= 0 and position_id <= gaps[index][1]
+
+    last_position = OrderProductPosition.objects.aggregate(last=Max("id"))["last"] or 0
+    existing = np.fromiter(Product.objects.values_list("id", flat=True).iterator(), dtype=np.int64)
+    size = max(int(existing.max()) + 1 if len(existing) else 1, matrix.shape[0] if matrix is not None else 1)
+    matrix = resize(matrix, size)
+    if not full and last_position <= watermark and not gaps:
+        return 0, 0
+
+    positions = (OrderProductPosition.objects
+                 .filter(id__lte=last_position)
+                 .order_by("order_id", "id")
+                 .values_list("order_id", "product_id", "id"))
+    if lowest:
+        touched = (OrderProductPosition.objects
+                   .filter(id__gt=lowest, id__lte=last_position)
+                   .values("order_id"))
+        positions = positions.filter(order_id__in=touched)
+
+    new_ids = []
+    delta = sparse.csr_matrix((size, size), dtype=np.int64)
+
+    def rows():
+        for order_id, product_id, position_id in positions.iterator(chunk_size=min(batch_size, 10000)):
+            new = is_new(position_id)
+            if new:
+                new_ids.append(position_id)
+            yield order_id, product_id, new
+
+    for order_ids, product_ids, new in stream_batches(rows(), batch_size):
+        keep = product_ids < size
+        order_ids, product_ids, new = order_ids[keep], product_ids[keep], new[keep]
+        old = ~new
+        delta = (delta
+                 + cooccurrence(order_ids, product_ids, size)
+                 - cooccurrence(order_ids[old], product_ids[old], size))
+
+    new_ids = np.unique(np.array(new_ids, dtype=np.int64))
+    gaps = fill_gaps(gaps, new_ids) + find_gaps(new_ids[new_ids > watermark], watermark, last_position)
+
+    # пропуски, обнаруженные раньше RECOMMENDATIONS_LAG_SECONDS назад, считаются окончательными
+    now = timezone.now().timestamp()
+    horizon = now - settings.RECOMMENDATIONS_LAG_SECONDS
+    marks = state.marks + [[last_position, now]]
+    settled = max((position for position, moment in marks if moment <= horizon), default=0)
+    marks = [[position, moment] for position, moment in marks if moment > horizon]
+    gaps = [[max(first, settled + 1), last] for first, last in gaps if last > settled]
+
+    delta.eliminate_zeros()
+    matrix = (matrix + delta).tocsr()
+    affected = existing if full else np.intersect1d(np.unique(delta.nonzero()[0]), existing)
+
+    related = top_k(matrix, affected, top, existing)
+    with transaction.atomic():
+        if full:
+            RelatedProduct.objects.all().delete()
+        else:
+            for start in range(0, len(affected), 1000):
+                RelatedProduct.objects.filter(product_id__in=affected[start:start + 1000].tolist()).delete()
+        RelatedProduct.objects.bulk_create(
+            (RelatedProduct(product_id=product_id, related_id=related_id, score=score)
+             for product_id, neighbours in related.items()
+             for related_id, score in neighbours),
+            batch_size=1000,
+        )
+        save_state(state, matrix, last_position, gaps, marks)
+    return len(new_ids), len(related)
@@ -1,19 +1,50 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.models import User
 from rest_framework.exceptions import ValidationError
-from django.db.models import ObjectDoesNotExist
-from shop.models import Product, ProductReview, Collection, OrderProductPosition, Order, CollectionProduct
+from rest_framework.utils.urls import replace_query_param
+from django.db import transaction
+from django.db.models import F, ObjectDoesNotExist
+from django.utils import timezone
+from shop.models import Product, ProductReview, Collection, OrderProductPosition, Order, CollectionProduct, \
+    ChangeLog, OrderOutboxEvent, OrderEventTypeChoices, OrderStatusChoices, RelatedProduct, \
+    UserOrderStats, ProductPrice
+from shop.exceptions import Conflict
+from shop.stock import OutOfStock, collect_quantities, reserve_for_order, change_order_quantities, \
+    confirm_order_reservations
+from shop.transitions import can_transition
+
+
+class UserOrderStatsSerializer(serializers.ModelSerializer):
+    """
+    Сводка по заказам пользователя
+    """
+
+    class Meta:
+        model = UserOrderStats
+        fields = ("orders_count", "total_spent", "last_order_date")
 
 
 class UserSerializer(serializers.ModelSerializer):
     """
     Сериализатор для объектов модели User
     """
+    order_stats = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = "__all__"
 
+    def get_order_stats(self, user):
+        """
+        Сводка читается из UserOrderStats; у пользователя без заказов ее нет
+        """
+        try:
+            stats = user.order_stats
+        except UserOrderStats.DoesNotExist:
+            stats = UserOrderStats(user=user)
+        return UserOrderStatsSerializer(stats).data
+
 
 class ProductSerializer(serializers.ModelSerializer):
     """
@@ -25,11 +56,40 @@ class ProductSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class ProductPriceSerializer(serializers.ModelSerializer):
+    """
+    Цена товара из истории цен
+    """
+
+    class Meta:
+        model = ProductPrice
+        fields = ("price", "valid_from")
+
+
+class ProductPriceAsOfSerializer(serializers.Serializer):
+    """
+    Цена товара на момент времени (товар из ProductPrice.as_of)
+    """
+    product_id = serializers.IntegerField(source="id")
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, source="price_at")
+
+
+class RelatedProductSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор для рекомендуемых товаров
+    """
+    product = ProductSerializer(source="related")
+
+    class Meta:
+        model = RelatedProduct
+        fields = ("score", "product")
+
+
 class ReviewSerializer(serializers.ModelSerializer):
     """
     Сериализатор для реализации действий  над объектами модели ProductReview
     """
-    user = serializers.IntegerField(read_only=True, source="user.id")
+    user = serializers.IntegerField(read_only=True, source="user_id")
 
     class Meta:
         model = ProductReview
@@ -67,16 +127,63 @@ class CollectionProductSerializer(serializers.Serializer):
     price = serializers.CharField(source="product.price", read_only=True)
 
 
+class CollectionListSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор для списка подборок: вместо товаров выводится сводка по ним
+    """
+
+    class Meta:
+        model = Collection
+        fields = ("id", "name", "slug", "text", "products_count", "min_price", "max_price", "created", "updated")
+
+
 class CollectionSerializer(serializers.ModelSerializer):
     """
-    Сериализатор для реализации действий  над объектами модели Collection
+    Сериализатор для реализации действий  над объектами модели Collection.
+    Товары подборки выводятся постранично: параметры products_page и products_page_size
     """
-    products_list = CollectionProductSerializer(many=True, required=True)
+    products_list = CollectionProductSerializer(many=True, required=True, write_only=True)
 
     class Meta:
         model = Collection
         fields = "__all__"
 
+    def products_page(self, instance):
+        request = self.context.get("request")
+        params = request.GET if request is not None else {}
+        try:
+            number = max(int(params.get("products_page", 1)), 1)
+            size = min(max(int(params.get("products_page_size", settings.COLLECTION_PRODUCTS_PAGE_SIZE)), 1),
+                       settings.COLLECTION_PRODUCTS_MAX_PAGE_SIZE)
+        except ValueError:
+            raise ValidationError({"error": "Параметры products_page и products_page_size должны быть целыми числами"})
+
+        links = list(CollectionProduct.objects
+                     .filter(collection=instance)
+                     .select_related("product")
+                     .order_by("id")[(number - 1) * size:number * size + 1])
+        has_next = len(links) > size
+
+        def page_url(page):
+            if request is None:
+                return None
+            return replace_query_param(request.build_absolute_uri(), "products_page", page)
+
+        return links[:size], {
+            "number": number,
+            "size": size,
+            "count": instance.products_count,
+            "next": page_url(number + 1) if has_next else None,
+            "previous": page_url(number - 1) if number > 1 else None,
+        }
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        links, page = self.products_page(instance)
+        data["products_list"] = CollectionProductSerializer(links, many=True).data
+        data["products_page"] = page
+        return data
+
     def validate(self, attrs):
         products_list = attrs.get("products_list")
         if self.context["view"].action == "create":
@@ -100,6 +207,7 @@ class CollectionSerializer(serializers.ModelSerializer):
         products_objs = [Product.objects.get(id=product["product_id"].id) for product in products_list]
         collection.products.add(*products_objs)
 
+        collection.refresh_from_db(fields=["products_count", "min_price", "max_price"])
         return collection
 
     def update(self, instance, validated_data):
@@ -114,6 +222,8 @@ class CollectionSerializer(serializers.ModelSerializer):
                 instance.products.add(*new_products)
             validated_data.pop("products_list")
 
+        # сводку по товарам обновляет refresh_summary, save() не должен записать старые значения
+        instance.refresh_from_db(fields=["products_count", "min_price", "max_price"])
         instance = super().update(instance, validated_data)
         return instance
 
@@ -133,6 +243,7 @@ class OrderSerializer(serializers.ModelSerializer):
     Сериализатор для реализации действий  над объектами модели Order
     """
     positions = OrderProductPositionSerializer(many=True, required=True)
+    version = serializers.IntegerField(required=False, min_value=0)
 
     class Meta:
         model = Order
@@ -156,48 +267,167 @@ class OrderSerializer(serializers.ModelSerializer):
 
         elif self.context["view"].action in ["update", "partial_update"]:
 
-            allowed_fields = {"positions"}
+            allowed_fields = {"positions", "version"}
             allowed_fields.add("status") if user.is_staff else allowed_fields
             if attrs.keys() - allowed_fields:
                 raise ValidationError({'error': f'Допустимые поля для изменения: {", ".join(sorted(allowed_fields))}'})
 
+            status = attrs.get("status")
+            if status is not None and status != self.instance.status \
+                    and not can_transition(self.instance.status, status):
+                raise ValidationError({"status": f"Недопустимый переход: {self.instance.status} -> {status}"})
+
         return attrs
 
+    @transaction.atomic
     def create(self, validated_data):
         positions = validated_data.pop("positions")
+        validated_data.pop("version", None)
         order = super().create(validated_data)
 
         positions_objs = [
             OrderProductPosition(
                 quantity=position["quantity"],
                 product=position["product"]["id"],
-                order=order
+                order=order,
+                created=order.created,
             )
             for position in positions
         ]
 
         OrderProductPosition.objects.bulk_create(positions_objs)
+        OrderOutboxEvent.for_order(order, OrderEventTypeChoices.CREATED).save()
+
+        # списание остатков последним шагом: строки товаров заблокированы до конца транзакции
+        try:
+            reserve_for_order(order, collect_quantities(
+                (position["product"]["id"], position["quantity"]) for position in positions
+            ))
+        except OutOfStock as exc:
+            raise ValidationError({"positions": str(exc)})
         return order
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         positions = validated_data.get("positions")
+        previous_status = instance.status
+        status = validated_data.get("status", instance.status)
+
+        # версия фиксируется первым шагом: конкурирующее изменение ждет на блокировке
+        # строки заказа, а затем не находит ожидаемую версию и получает 409
+        expected_version = validated_data.get("version", instance.version)
+        updated = (Order.objects
+                   .filter(pk=instance.pk, version=expected_version, status=previous_status)
+                   .update(version=F("version") + 1, status=status, updated=timezone.localdate()))
+        if not updated:
+            raise Conflict()
 
         if positions:
+            stock_changes = {}
             for position in positions:
-                product_id = position["product"]["id"].id
+                product = position["product"]["id"]
+                product_id = product.id
                 quantity = position["quantity"]
                 try:
                     position_obj = OrderProductPosition.objects.get(product_id=product_id, order=instance)
+                    stock_changes[product] = quantity - position_obj.quantity
                     position_obj.quantity = quantity
                     position_obj.save()
                 except ObjectDoesNotExist:
-                    OrderProductPosition.objects.create(product_id=product_id, quantity=quantity, order=instance)
+                    OrderProductPosition.objects.create(product_id=product_id, quantity=quantity, order=instance,
+                                                        created=instance.created)
+                    stock_changes[product] = quantity
             validated_data.pop("positions")
 
+            try:
+                change_order_quantities(instance, stock_changes)
+            except OutOfStock as exc:
+                raise ValidationError({"positions": str(exc)})
+
         total_cost = round(sum(position.product.price * position.quantity for position in
                                OrderProductPosition.objects.filter(order=instance)), 2)
 
-        validated_data["total_cost"] = total_cost
-        instance = super().update(instance, validated_data)
+        previous_total = instance.total_cost
+        Order.objects.filter(pk=instance.pk).update(total_cost=total_cost)
+        if float(total_cost) != previous_total:
+            UserOrderStats.apply(instance.user_id, spent=float(total_cost) - previous_total)
+        instance.refresh_from_db()
 
+        if instance.status != previous_status:
+            if previous_status == OrderStatusChoices.NEW:
+                try:
+                    confirm_order_reservations([instance.id])
+                except OutOfStock as exc:
+                    raise ValidationError({"status": str(exc)})
+            OrderOutboxEvent.for_order(instance,
+                                       OrderEventTypeChoices.STATUS_CHANGED,
+                                       previous_status=previous_status,
+                                       ).save()
         return instance
+
+
+class BulkOrderPositionSerializer(serializers.Serializer):
+    """
+    Позиция заказа в массовом создании: товары проверяются одним запросом для всех заказов
+    """
+    product_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class BulkOrderItemSerializer(serializers.Serializer):
+    """
+    Один заказ в массовом создании
+    """
+    positions = BulkOrderPositionSerializer(many=True, allow_empty=False)
+
+
+class OrderBulkCreateSerializer(serializers.Serializer):
+    """
+    Сериализатор для массового создания заказов; заказы проверяются по отдельности
+    """
+    orders = serializers.ListField(child=serializers.DictField(), allow_empty=False,
+                                   max_length=settings.ORDER_BULK_MAX_ORDERS)
+    atomic = serializers.BooleanField(default=False)
+
+
+class OrderTransitionSerializer(serializers.Serializer):
+    """
+    Сериализатор для массового перевода заказов в другой статус
+    """
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False,
+                                max_length=settings.ORDER_TRANSITION_MAX_IDS)
+    status = serializers.ChoiceField(choices=OrderStatusChoices.choices)
+
+
+class ChangeLogSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор для записей журнала изменений каталога
+    """
+
+    class Meta:
+        model = ChangeLog
+        fields = ("id", "entity", "object_id", "action", "created")
+
+
+class BatchSubRequestSerializer(serializers.Serializer):
+    """
+    Сериализатор для одного запроса в пакетном запросе
+    """
+    method = serializers.ChoiceField(choices=["GET", "POST", "PUT", "PATCH", "DELETE"], default="GET")
+    url = serializers.CharField()
+    body = serializers.JSONField(required=False)
+
+
+class BatchSerializer(serializers.Serializer):
+    """
+    Сериализатор для пакетного запроса к эндпоинтам магазина
+    """
+    requests = BatchSubRequestSerializer(many=True)
+    parallel = serializers.BooleanField(default=False)
+
+    def validate_requests(self, requests):
+        if not requests:
+            raise ValidationError("Не указаны запросы")
+        if len(requests) > settings.BATCH_MAX_REQUESTS:
+            raise ValidationError(f"В пакете может быть не более {settings.BATCH_MAX_REQUESTS} запросов")
+        return requests
@@ -0,0 +1,190 @@
+"""
+Учет остатков товаров (Product.stock).
+
+Списание выполняется одним условным UPDATE для всех позиций заказа:
+
+    UPDATE shop_product SET stock = stock - CASE id WHEN ... END
+    WHERE id IN (SELECT id FROM shop_product WHERE id IN (...) ORDER BY id FOR UPDATE)
+      AND stock >= CASE id WHEN ... END
+
+Подзапрос блокирует строки товаров по возрастанию id: параллельные заказы с общими
+товарами (в любом порядке позиций) блокируют их в одном порядке и не попадают во
+взаимную блокировку (deadlock). Строки блокируются до конца транзакции, без отдельного
+чтения остатка, поэтому параллельные заказы не выстраиваются в очередь за SELECT.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from shop.models import ChangeLog, Product, StockReservation
+
+
+class OutOfStock(Exception):
+    """
+    Недостаточно остатка для одного или нескольких товаров
+    """
+
+    def __init__(self, product_ids):
+        self.product_ids = sorted(product_ids)
+        super().__init__(f"Недостаточно товаров на складе: {', '.join(map(str, self.product_ids))}")
+
+
+def _quantity_case(quantities):
+    return Case(*[When(id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+                output_field=IntegerField())
+
+
+def collect_quantities(items):
+    """
+    Суммирует количества по товарам: items - пары (товар, количество)
+    """
+    quantities = defaultdict(int)
+    products = {}
+    for product, quantity in items:
+        quantities[product.id] += quantity
+        products[product.id] = product
+    return {products[product_id]: quantity for product_id, quantity in quantities.items()}
+
+
+def _locked(product_ids):
+    """
+    Подзапрос id товаров, блокирующий их строки по возрастанию id
+    """
+    return Product.objects.filter(id__in=product_ids).order_by("id").select_for_update().values("id")
+
+
+def reserve_stock(quantities):
+    """
+    Списывает остатки: quantities - словарь {товар: количество}. Товары без учета
+    остатка (stock is None) пропускаются. Возвращает {id товара: списанное количество};
+    если хотя бы одного товара не хватает, ничего не списывается и выбрасывается OutOfStock
+    """
+    tracked = {product.id: quantity for product, quantity in quantities.items()
+               if product.stock is not None and quantity > 0}
+    if not tracked:
+        return {}
+
+    quantity = _quantity_case(tracked)
+    with transaction.atomic():
+        updated = (Product.objects
+                   .filter(id__in=_locked(tracked), stock__gte=quantity)
+                   .update(stock=F("stock") - quantity))
+        if updated != len(tracked):
+            short = Product.objects.filter(id__in=tracked, stock__lt=quantity).values_list("id", flat=True)
+            raise OutOfStock(set(short) or set(tracked))
+        # UPDATE не отправляет post_save - изменение остатка записывается в журнал изменений явно
+        ChangeLog.record(Product, sorted(tracked))
+    return tracked
+
+
+def release_stock(quantities):
+    """
+    Возвращает товары на остаток: quantities - словарь {id товара: количество}
+    """
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+    if quantities:
+        quantity = _quantity_case(quantities)
+        with transaction.atomic():
+            (Product.objects
+             .filter(id__in=_locked(quantities), stock__isnull=False)
+             .update(stock=F("stock") + quantity))
+            ChangeLog.record(Product, sorted(quantities))
+
+
+def reserve_for_order(order, quantities):
+    """
+    Списывает остатки под заказ и создает резервы со сроком STOCK_RESERVATION_TTL
+    """
+    reserved = reserve_stock(quantities)
+    expires_at = timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+    StockReservation.objects.bulk_create(
+        StockReservation(order=order, product_id=product_id, quantity=quantity, expires_at=expires_at)
+        for product_id, quantity in reserved.items()
+    )
+    return reserved
+
+
+def change_order_quantities(order, changes):
+    """
+    Изменение количества товаров в заказе: changes - словарь {товар: разница}.
+    Увеличение списывается с остатка, уменьшение возвращается на остаток;
+    активные резервы заказа обновляются
+    """
+    added = reserve_stock({product: delta for product, delta in changes.items() if delta > 0})
+    removed = {product.id: -delta for product, delta in changes.items() if delta < 0}
+    release_stock(removed)
+
+    active = {reservation.product_id: reservation
+              for reservation in order.reservations.filter(released=False)}
+    if not active:
+        return
+    expires_at = max(reservation.expires_at for reservation in active.values())
+    new_reservations = []
+    for product_id, delta in list(added.items()) + [(product_id, -delta) for product_id, delta in removed.items()]:
+        if product_id in active:
+            active[product_id].quantity = max(active[product_id].quantity + delta, 0)
+        elif delta > 0:
+            new_reservations.append(StockReservation(order=order, product_id=product_id,
+                                                     quantity=delta, expires_at=expires_at))
+    StockReservation.objects.bulk_update(active.values(), ["quantity"])
+    StockReservation.objects.bulk_create(new_reservations)
+
+
+def confirm_order_reservations(order_ids):
+    """
+    Заказ принят в работу: активные резервы становятся окончательным списанием.
+    Для резервов, которые уже истекли и были возвращены на остаток, товар списывается заново
+    """
+    released = (StockReservation.objects
+                .filter(order_id__in=order_ids, released=True)
+                .values("product_id")
+                .annotate(quantity=Sum("quantity")))
+    quantities = {row["product_id"]: row["quantity"] for row in released}
+    if quantities:
+        products = Product.objects.in_bulk(quantities)
+        reserve_stock({products[product_id]: quantity for product_id, quantity in quantities.items()
+                       if product_id in products})
+    StockReservation.objects.filter(order_id__in=order_ids).delete()
+
+
+def release_order_reservations(order_ids):
+    """
+    Возвращает на остаток активные резервы заказов (например, при удалении заказа)
+    """
+    with transaction.atomic():
+        reservations = list(StockReservation.objects
+                            .select_for_update()
+                            .filter(order_id__in=order_ids, released=False))
+        _release(reservations)
+
+
+def release_expired_reservations(batch_size=1000):
+    """
+    Возвращает на остаток просроченные резервы заказов. Резервы обрабатываются пакетами
+    в коротких транзакциях; строки, заблокированные другими транзакциями, пропускаются
+    """
+    total = 0
+    while True:
+        with transaction.atomic():
+            reservations = list(StockReservation.objects
+                                .select_for_update(skip_locked=True)
+                                .filter(released=False, expires_at__lte=timezone.now())
+                                .order_by("id")[:batch_size])
+            _release(reservations)
+        total += len(reservations)
+        if len(reservations) < batch_size:
+            return total
+
+
+def _release(reservations):
+    if not reservations:
+        return
+    quantities = defaultdict(int)
+    for reservation in reservations:
+        quantities[reservation.product_id] += reservation.quantity
+    release_stock(quantities)
+    StockReservation.objects.filter(id__in=[reservation.id for reservation in reservations]).update(released=True)
@@ -0,0 +1,45 @@
+"""
+Фоновые задачи магазина, выполняются обработчиками очереди jobs
+"""
+from django.apps import apps
+from django.core.mail import mail_admins, send_mail
+
+from jobs.queue import report_progress
+from shop.deletion import delete_in_chunks
+from shop.models import Order, ProductReview
+
+
+def notify_order_changed(order_id):
+    """
+    Уведомление покупателя о создании или изменении заказа
+    """
+    order = Order.objects.select_related("user").filter(id=order_id).first()
+    if order is None or not order.user.email:
+        return
+    send_mail(subject=f"Заказ №{order.id}",
+              message=f"Статус заказа: {order.get_status_display()}. Сумма: {order.total_cost}",
+              from_email=None,
+              recipient_list=[order.user.email],
+              )
+
+
+def notify_review_created(review_id):
+    """
+    Уведомление администраторов о новом отзыве
+    """
+    review = ProductReview.objects.select_related("user", "product").filter(id=review_id).first()
+    if review is None:
+        return
+    mail_admins(subject=f"Новый отзыв к товару {review.product.name}",
+                message=f"{review.user.username}, оценка {review.rating}:\n{review.text}",
+                )
+
+
+def delete_in_background(model_label, pk):
+    """
+    Удаление товара или подборки по частям (shop.deletion) с записью хода удаления в задачу
+    """
+    obj = apps.get_model(model_label).objects.filter(pk=pk).first()
+    if obj is None:
+        return
+    delete_in_chunks(obj, progress=lambda deleted: report_progress({"deleted": deleted}))
@@ -0,0 +1,139 @@
+"""
+Ограничение частоты запросов корзиной токенов в памяти процесса.
+
+Для каждой пары (область, пользователь или IP) процесс держит корзину на
+num_requests токенов, которая пополняется со скоростью num_requests / duration.
+Запрос забирает токен без обращения к кэшу; раз в THROTTLE_SYNC_SECONDS корзина
+прибавляет к счетчику в общем кэше (THROTTLE_CACHE) число токенов, забранных с прошлой
+синхронизации, и получает общий расход за текущее окно duration. Токены, забранные
+за это время другими процессами, вычитаются из локальной корзины, поэтому
+все процессы вместе пропускают примерно num_requests запросов за duration.
+
+Лимиты задаются в REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"] для области представления
+(throttle_scope): "<scope>" - для пользователей с токеном, "<scope>_anon" - для анонимных
+(если не задан, используется "<scope>").
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+class TokenBucket:
+    __slots__ = ("capacity", "rate", "tokens", "updated", "pending", "synced", "window", "own", "others")
+
+    def __init__(self, capacity, rate, now):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = float(capacity)
+        self.updated = now
+        # забрано токенов с последней синхронизации с кэшем
+        self.pending = 0
+        self.synced = now
+        # окно общего счетчика, расход этого процесса и других процессов в окне
+        self.window = None
+        self.own = 0
+        self.others = 0
+
+    def consume(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        self.pending += 1
+        return True
+
+    def wait(self):
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class LocalBuckets:
+    """
+    Корзины процесса; самые давно не использованные вытесняются после THROTTLE_MAX_BUCKETS
+    """
+
+    def __init__(self):
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    store = LocalBuckets()
+    timer = time.monotonic
+
+    def parse_rate(self, rate):
+        """
+        "100/min" -> (100, 60), как в SimpleRateThrottle
+        """
+        num, period = rate.split("/")
+        return int(num), {"s": 1, "m": 60, "h": 3600, "d": 86400}[period[0]]
+
+    def get_rate(self, scope, anonymous):
+        rates = api_settings.DEFAULT_THROTTLE_RATES or {}
+        rate = rates.get(f"{scope}_anon") if anonymous else None
+        return rate or rates.get(scope)
+
+    def allow_request(self, request, view):
+        scope = getattr(view, "throttle_scope", None)
+        anonymous = not (request.user and request.user.is_authenticated)
+        rate = self.get_rate(scope, anonymous) if scope else None
+        if rate is None:
+            return True
+        num_requests, duration = self.parse_rate(rate)
+        ident = self.get_ident(request) if anonymous else request.user.pk
+        key = f"throttle:{scope}:{'anon' if anonymous else 'user'}:{ident}"
+
+        now = self.timer()
+        store = self.store
+        with store.lock:
+            bucket = store.buckets.get(key)
+            if bucket is None or bucket.capacity != num_requests:
+                bucket = store.buckets[key] = TokenBucket(num_requests, num_requests / duration, now)
+                while len(store.buckets) > settings.THROTTLE_MAX_BUCKETS:
+                    store.buckets.popitem(last=False)
+            else:
+                store.buckets.move_to_end(key)
+            allowed = bucket.consume(now)
+            pending = None
+            if now - bucket.synced >= settings.THROTTLE_SYNC_SECONDS:
+                pending, bucket.pending, bucket.synced = bucket.pending, 0, now
+
+        if pending is not None:
+            self.sync(key, bucket, pending, num_requests, duration)
+        if not allowed:
+            self.wait_seconds = bucket.wait()
+        return allowed
+
+    def sync(self, key, bucket, pending, num_requests, duration):
+        """
+        Добавляет расход процесса в общий счетчик окна и вычитает из корзины расход других процессов
+        """
+        cache = caches[settings.THROTTLE_CACHE]
+        window = int(time.time() // duration)
+        window_key = f"{key}:{window}"
+        cache.add(window_key, 0, timeout=duration * 2)
+        try:
+            total = cache.incr(window_key, pending) if pending else cache.get(window_key, 0)
+        except ValueError:
+            # окно истекло между add и incr
+            cache.set(window_key, pending, timeout=duration * 2)
+            total = pending
+        with self.store.lock:
+            if bucket.window != window:
+                bucket.window, bucket.own, bucket.others = window, 0, 0
+            bucket.own += pending
+            others = max(0, total - bucket.own)
+            bucket.tokens = max(0.0, bucket.tokens - (others - bucket.others))
+            bucket.others = others
+
+    def wait(self):
+        return getattr(self, "wait_seconds", None)
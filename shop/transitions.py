@@ -0,0 +1,85 @@
+"""
+Переходы между статусами заказа (ORDER_STATUS_TRANSITIONS).
+
+Массовый перевод выполняется одним условным UPDATE на пачку id:
+
+    UPDATE shop_order SET status = %s, version = version + 1, updated = %s
+    WHERE id = ANY(%s) AND status = <исходный статус> RETURNING id
+
+Заказы, которые уже не в исходном статусе (в том числе измененные параллельно),
+просто не попадают под условие и возвращаются как пропущенные. Заказы New с истекшим
+резервом товара тоже пропускаются: их нужно переводить по одному, чтобы заново списать остаток.
+"""
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from shop.models import Order, OrderOutboxEvent, OrderEventTypeChoices, OrderStatusChoices, StockReservation, \
+    ORDER_STATUS_TRANSITIONS
+from shop.stock import confirm_order_reservations
+
+BULK_TRANSITION_CHUNK_SIZE = 10000
+
+
+def can_transition(from_status, to_status):
+    return to_status in ORDER_STATUS_TRANSITIONS.get(from_status, set())
+
+
+def source_statuses(to_status):
+    return [status for status, targets in ORDER_STATUS_TRANSITIONS.items() if to_status in targets]
+
+
+def _transition_chunk(ids, from_status, to_status):
+    """
+    Переводит заказы из from_status в to_status, возвращает id переведенных заказов
+    """
+    today = timezone.localdate()
+    check_reservations = from_status == OrderStatusChoices.NEW
+    if connection.vendor == "postgresql":
+        qn = connection.ops.quote_name
+        reservations_condition = (
+            f"AND NOT EXISTS (SELECT 1 FROM {qn(StockReservation._meta.db_table)} r "
+            f"WHERE r.order_id = o.id AND r.released) " if check_reservations else ""
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {qn(Order._meta.db_table)} o "
+                f"SET status = %s, version = o.version + 1, updated = %s "
+                f"WHERE o.id = ANY(%s) AND o.status = %s {reservations_condition}"
+                f"RETURNING o.id",
+                [to_status, today, list(ids), from_status],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    orders = Order.objects.filter(id__in=ids, status=from_status)
+    if check_reservations:
+        orders = orders.exclude(reservations__released=True)
+    matched = list(orders.select_for_update().values_list("id", flat=True))
+    Order.objects.filter(id__in=matched, status=from_status).update(
+        status=to_status, version=F("version") + 1, updated=today,
+    )
+    return matched
+
+
+@transaction.atomic
+def bulk_transition(ids, to_status):
+    """
+    Переводит заказы с id из ids в статус to_status. Возвращает (переведенные id, пропущенные id)
+    """
+    ids = list(dict.fromkeys(ids))
+    previous = {}
+    for from_status in source_statuses(to_status):
+        for start in range(0, len(ids), BULK_TRANSITION_CHUNK_SIZE):
+            chunk = ids[start:start + BULK_TRANSITION_CHUNK_SIZE]
+            previous.update((order_id, from_status) for order_id in _transition_chunk(chunk, from_status, to_status))
+
+    confirm_order_reservations([order_id for order_id, status in previous.items()
+                                if status == OrderStatusChoices.NEW])
+
+    orders = Order.objects.filter(id__in=previous).prefetch_related("positions")
+    OrderOutboxEvent.objects.bulk_create(
+        OrderOutboxEvent.for_order(order, OrderEventTypeChoices.STATUS_CHANGED, previous_status=previous[order.id])
+        for order in orders
+    )
+
+    return sorted(previous), [order_id for order_id in ids if order_id not in previous]
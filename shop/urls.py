@@ -1,12 +1,30 @@
 from django.urls import path, include
 from rest_framework.routers import format_suffix_patterns
 from shop.views import *
+from shop.async_views import AsyncProductView, AsyncReviewView, AsyncCollectionView
 
 product_list = ProductViewSet.as_view({
     "get": "list",
     "post": "create",
 })
 
+# подсказки запрашиваются на каждое нажатие клавиши: свои лимиты запросов
+product_autocomplete = ProductViewSet.as_view({
+    "get": "autocomplete",
+}, throttle_scope="autocomplete")
+
+product_related = ProductViewSet.as_view({
+    "get": "related",
+})
+
+product_prices = ProductViewSet.as_view({
+    "get": "prices",
+})
+
+product_prices_as_of = ProductViewSet.as_view({
+    "get": "prices_as_of",
+})
+
 product_detail = ProductViewSet.as_view({
     "get": "retrieve",
     "put": "update",
@@ -43,6 +61,14 @@ order_list = OrderViewSet.as_view({
     "post": "create",
 })
 
+order_bulk_create = OrderViewSet.as_view({
+    "post": "bulk_create",
+})
+
+order_transition = OrderViewSet.as_view({
+    "post": "transition",
+})
+
 order_detail = OrderViewSet.as_view({
     "get": "retrieve",
     "put": "update",
@@ -62,18 +88,36 @@ user_detail = UserViewSet.as_view({
     "delete": "destroy",
 })
 
+async_product_view = AsyncProductView.as_view()
+async_review_view = AsyncReviewView.as_view()
+async_collection_view = AsyncCollectionView.as_view()
+
 
 urlpatterns = format_suffix_patterns([
     path("products/", product_list, name="product-list"),
+    path("products/autocomplete/", product_autocomplete, name="product-autocomplete"),
+    path("products/prices/", product_prices_as_of, name="product-prices-as-of"),
     path("products/<int:pk>/", product_detail, name="product-detail"),
+    path("products/<int:pk>/related/", product_related, name="product-related"),
+    path("products/<int:pk>/prices/", product_prices, name="product-prices"),
     path("product-reviews/", review_list, name="review-list"),
     path("product-reviews/<int:pk>/", review_detail, name="review-detail"),
     path("product-collections/", collection_list, name="collection-list"),
     path("product-collections/<int:pk>/", collection_detail, name="collection-detail"),
     path("orders/", order_list, name="order-list"),
+    path("orders/bulk/", order_bulk_create, name="order-bulk-create"),
+    path("orders/transition/", order_transition, name="order-transition"),
     path("orders/<int:pk>/", order_detail, name="order-detail"),
     path("profiles/", user_list, name="user-list"),
     path("profiles/<int:pk>/", user_detail, name="user-detail"),
+    path("batch/", BatchView.as_view(), name="batch"),
+    path("changes/", ChangeFeedView.as_view(), name="change-feed"),
+    path("async/products/", async_product_view, name="async-product-list"),
+    path("async/products/<int:pk>/", async_product_view, name="async-product-detail"),
+    path("async/product-reviews/", async_review_view, name="async-review-list"),
+    path("async/product-reviews/<int:pk>/", async_review_view, name="async-review-detail"),
+    path("async/product-collections/", async_collection_view, name="async-collection-list"),
+    path("async/product-collections/<int:pk>/", async_collection_view, name="async-collection-detail"),
 ])
 
 
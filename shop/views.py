@@ -1,13 +1,66 @@
-from rest_framework import viewsets, permissions
+import asyncio
+import contextvars
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.conf import settings
 from django.contrib.auth.models import User
-from shop.models import Product, ProductReview, Collection, Order
-from shop.serializers import ProductSerializer, ReviewSerializer, CollectionSerializer, OrderSerializer, UserSerializer
+from django.db import connections, transaction
+from django.test import RequestFactory
+from django.urls import resolve, reverse, Resolver404
+from shop.models import Product, ProductReview, Collection, Order, ChangeLog, RelatedProduct
+from shop.serializers import ProductSerializer, ReviewSerializer, CollectionSerializer, OrderSerializer, \
+    UserSerializer, BatchSerializer, ChangeLogSerializer, OrderTransitionSerializer, RelatedProductSerializer, \
+    OrderBulkCreateSerializer, CollectionListSerializer, ProductPriceSerializer, ProductPriceAsOfSerializer
 from django_filters.rest_framework import DjangoFilterBackend
+from shop.autocomplete import product_name_index
+from shop.bulk_orders import create_orders
+from shop.coalescing import collection_reads, product_reads
+from shop.deletion import delete_or_enqueue
+from shop.facets import parse_facets, product_facets
 from shop.filters import ProductFilter, ReviewFilter, OrderFilter
+from shop.ownership import delete_returning, owned_by, update_returning
 from shop.permissions import IsOwnerOrAdmin
+from shop.prices import parse_moment, price_series, prices_as_of
+from shop.tasks import notify_order_changed, notify_review_created
+from shop.transitions import bulk_transition
+from jobs.queue import enqueue
+
+logger = logging.getLogger(__name__)
+
+
+def cached_response(request, entry):
+    """
+    Ответ из записи кэша ответов (shop.coalescing). Тело определяется записью и форматом ответа,
+    поэтому сжатые варианты хранятся по ключу записи (CompressionMiddleware)
+    """
+    response = Response(entry["data"])
+    if entry.get("key"):
+        response.compression_cache_key = f"{entry['key']}:{request.accepted_media_type}"
+    return response
+
+
+class ChunkedDestroyMixin:
+    """
+    Удаление объекта по частям (см. shop.deletion): объект с большим числом зависимых
+    строк удаляется в фоне, ответ 202 содержит id задачи удаления
+    """
 
+    def destroy(self, request, *args, **kwargs):
+        job = delete_or_enqueue(self.get_object())
+        if job is None:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response({"job": job.id}, status=status.HTTP_202_ACCEPTED)
 
-class ProductViewSet(viewsets.ModelViewSet):
+
+class ProductViewSet(ChunkedDestroyMixin, viewsets.ModelViewSet):
     """
     Обработчик для объектов модели Product
     """
@@ -15,6 +68,7 @@ class ProductViewSet(viewsets.ModelViewSet):
     serializer_class = ProductSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = ProductFilter
+    throttle_scope = "products"
 
     def get_permissions(self):
         """
@@ -25,6 +79,108 @@ class ProductViewSet(viewsets.ModelViewSet):
             return [permission() for permission in permission_classes]
         return []
 
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Товар читается через кэш ответов: одновременные запросы одного товара
+        выполняют один запрос к базе (см. shop.coalescing)
+        """
+        entry = product_reads.get_entry(kwargs["pk"], lambda: self.get_serializer(self.get_object()).data)
+        return cached_response(request, entry)
+
+    def list(self, request, *args, **kwargs):
+        """
+        С параметром facets (например, ?facets=price,rating) к списку товаров добавляется
+        число товаров в каждой группе цен / рейтингов с учетом остальных фильтров
+        """
+        if "facets" not in request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        names = parse_facets(request.query_params["facets"])
+        queryset = self.filter_queryset(self.get_queryset())
+        facets = product_facets(queryset, names)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+            response.data["facets"] = facets
+            return response
+        return Response({"results": self.get_serializer(queryset, many=True).data, "facets": facets})
+
+    @action(detail=False)
+    def autocomplete(self, request):
+        """
+        Подсказки при вводе: до limit товаров, название которых начинается с q
+        """
+        try:
+            limit = min(int(request.query_params.get("limit", settings.AUTOCOMPLETE_LIMIT)),
+                        settings.AUTOCOMPLETE_MAX_LIMIT)
+        except ValueError:
+            raise ValidationError({"limit": "Должен быть целым числом"})
+        return Response(product_name_index.search(request.query_params.get("q", ""), max(limit, 1)))
+
+    @action(detail=True)
+    def related(self, request, pk=None):
+        """
+        Товары, которые чаще всего покупают вместе с данным (см. команду build_related_products)
+        """
+        product = self.get_object()
+        related = RelatedProduct.objects.filter(product=product).select_related("related")
+        return Response(RelatedProductSerializer(related, many=True).data)
+
+    def get_price_limit(self):
+        try:
+            limit = min(int(self.request.query_params.get("limit", settings.PRICE_HISTORY_PAGE_SIZE)),
+                        settings.PRICE_HISTORY_MAX_PAGE_SIZE)
+        except ValueError:
+            raise ValidationError({"limit": "Должен быть целым числом"})
+        if limit < 1:
+            raise ValidationError({"limit": "Должен быть больше 0"})
+        return limit
+
+    @action(detail=True)
+    def prices(self, request, pk=None):
+        """
+        История цен товара по возрастанию valid_from: from / to - границы (дата или дата и время,
+        включительно), следующая страница - с after=next
+        """
+        product = self.get_object()
+        params = request.query_params
+        bounds = {
+            "start": parse_moment("from", params["from"]) if "from" in params else None,
+            "end": parse_moment("to", params["to"], end_of_day=True) if "to" in params else None,
+            "after": parse_moment("after", params["after"]) if "after" in params else None,
+        }
+        rows, has_more = price_series(product, limit=self.get_price_limit(), **bounds)
+        return Response({
+            "results": ProductPriceSerializer(rows, many=True).data,
+            "next": rows[-1].valid_from if rows else params.get("after"),
+            "has_more": has_more,
+        })
+
+    @action(detail=False)
+    def prices_as_of(self, request):
+        """
+        Цены товаров на момент at (дата - на конец дня): всех или ids=1,2,3,
+        по возрастанию id товара, следующая страница - с since=next
+        """
+        params = request.query_params
+        if "at" not in params:
+            raise ValidationError({"at": "Обязательный параметр"})
+        moment = parse_moment("at", params["at"], end_of_day=True)
+        try:
+            since = int(params.get("since", 0))
+            product_ids = [int(value) for value in params["ids"].split(",") if value] if "ids" in params else None
+        except ValueError:
+            raise ValidationError({"error": "Параметры since и ids должны быть целыми числами"})
+
+        rows, has_more = prices_as_of(moment, product_ids, since, self.get_price_limit())
+        return Response({
+            "at": moment,
+            "results": ProductPriceAsOfSerializer(rows, many=True).data,
+            "next": rows[-1].id if rows else since,
+            "has_more": has_more,
+        })
+
 
 class ReviewViewSet(viewsets.ModelViewSet):
     """
@@ -44,12 +200,45 @@ class ReviewViewSet(viewsets.ModelViewSet):
             return [permissions.IsAuthenticated(), IsOwnerOrAdmin()]
         return []
 
+    def perform_create(self, serializer):
+        # задача ставится в той же транзакции, что и отзыв
+        with transaction.atomic():
+            review = serializer.save()
+            enqueue(notify_review_created, review.id)
 
-class CollectionViewSet(viewsets.ModelViewSet):
+    def owned_review(self):
+        return owned_by(ProductReview.objects.filter(pk=self.kwargs["pk"]), self.request.user)
+
+    def owner_write_failed(self):
+        """
+        Запрос на изменение не затронул ни одной строки: отзыва нет или он чужой
+        """
+        if ProductReview.objects.filter(pk=self.kwargs["pk"]).exists():
+            raise PermissionDenied()
+        raise NotFound()
+
+    def update(self, request, *args, **kwargs):
+        """
+        Отзыв изменяется одним UPDATE ... WHERE id = %s AND user_id = %s, без предварительной загрузки
+        """
+        serializer = self.get_serializer(data=request.data, partial=kwargs.pop("partial", False))
+        serializer.is_valid(raise_exception=True)
+        review = update_returning(self.owned_review(), dict(serializer.validated_data, updated=date.today()))
+        if review is None:
+            self.owner_write_failed()
+        return Response(self.get_serializer(review).data)
+
+    def destroy(self, request, *args, **kwargs):
+        if delete_returning(self.owned_review()) is None:
+            self.owner_write_failed()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CollectionViewSet(ChunkedDestroyMixin, viewsets.ModelViewSet):
     """
        Обработчик для объектов модели Collection
      """
-    queryset = Collection.objects.prefetch_related("products")
+    queryset = Collection.objects.all()
     serializer_class = CollectionSerializer
 
     def get_permissions(self):
@@ -61,6 +250,25 @@ class CollectionViewSet(viewsets.ModelViewSet):
             return [permission() for permission in permission_classes]
         return []
 
+    def get_serializer_class(self):
+        """
+        В списке подборок выводится только сводка по товарам, без обращения к товарам подборок
+        """
+        if self.action == "list":
+            return CollectionListSerializer
+        return CollectionSerializer
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Подборка читается через кэш ответов; страница товаров и ссылки на соседние
+        страницы зависят от адреса запроса, поэтому он входит в ключ
+        """
+        entry = collection_reads.get_entry(kwargs["pk"],
+                                           lambda: self.get_serializer(self.get_object()).data,
+                                           variant=request.build_absolute_uri(),
+                                           )
+        return cached_response(request, entry)
+
 
 class OrderViewSet(viewsets.ModelViewSet):
     """
@@ -77,24 +285,176 @@ class OrderViewSet(viewsets.ModelViewSet):
         """
         if self.action in ["list", "retrieve", "create", "update", "partial_update", "destroy"]:
             return [permissions.IsAuthenticated(), IsOwnerOrAdmin()]
+        if self.action == "bulk_create":
+            return [permissions.IsAuthenticated()]
+        if self.action == "transition":
+            return [permissions.IsAdminUser()]
         return []
 
     def get_queryset(self):
         """
         Админы могут получать все заказы, остальное пользователи только свои.
         """
-        if self.request.user.is_staff:
-            return Order.objects.prefetch_related("positions").all()
-        return Order.objects.prefetch_related("positions").filter(user=self.request.user)
+        return owned_by(Order.objects.prefetch_related("positions"), self.request.user)
 
-    def create(self, request, *args, **kwargs):
-        return super().create(request, *args, **kwargs)
+    def perform_create(self, serializer):
+        # задача ставится в той же транзакции, что и заказ: ни заказа без уведомления, ни уведомления без заказа
+        with transaction.atomic():
+            order = serializer.save()
+            enqueue(notify_order_changed, order.id)
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            order = serializer.save()
+            enqueue(notify_order_changed, order.id)
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk_create(self, request):
+        """
+        Создание нескольких заказов одним запросом. Заказы с ошибками возвращаются с errors,
+        остальные создаются (с atomic: true не создается ни один заказ при любой ошибке).
+        Ответ: 201 - созданы все заказы, 207 - часть, 400 - ни одного
+        """
+        serializer = OrderBulkCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = create_orders(request.user, serializer.validated_data["orders"],
+                                atomic=serializer.validated_data["atomic"])
+        created = sum("id" in result for result in results)
+        if created == len(results):
+            response_status = status.HTTP_201_CREATED
+        elif created:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({"created": created, "results": results}, status=response_status)
+
+    @action(detail=False, methods=["post"])
+    def transition(self, request):
+        """
+        Массовый перевод заказов в статус status. Заказы, для которых переход недопустим
+        или которые уже изменены другим запросом, возвращаются в skipped
+        """
+        serializer = OrderTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updated, skipped = bulk_transition(serializer.validated_data["ids"], serializer.validated_data["status"])
+        return Response({"updated": updated, "skipped": skipped})
 
 
 class UserViewSet(viewsets.ModelViewSet):
     """
     Обработчик для объектов модели User
     """
-    queryset = User.objects.all()
+    queryset = User.objects.select_related("order_stats")
     serializer_class = UserSerializer
     permission_classes = [IsOwnerOrAdmin]
+
+
+class ChangeFeedView(APIView):
+    """
+    Обработчик журнала изменений каталога: возвращает изменения товаров, подборок,
+    товаров в подборках и отзывов после курсора since в порядке (txid, id), см. ChangeLog.after
+    """
+    permission_classes = []
+
+    @staticmethod
+    def parse_cursor(value):
+        """
+        Курсор "txid:id"; число - id записи без номера транзакции (записи до появления txid)
+        """
+        txid, _, change_id = value.rpartition(":")
+        return int(txid or 0), int(change_id)
+
+    def get(self, request):
+        try:
+            txid, since = self.parse_cursor(request.query_params.get("since", "0"))
+            limit = min(int(request.query_params.get("limit", settings.CHANGE_FEED_PAGE_SIZE)),
+                        settings.CHANGE_FEED_MAX_PAGE_SIZE)
+        except ValueError:
+            raise ValidationError({"error": "Параметр since должен быть курсором next, limit - целым числом"})
+        if limit < 1:
+            raise ValidationError({"limit": "Должен быть больше 0"})
+
+        changes = list(ChangeLog.after(txid, since)[:limit + 1])
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+
+        return Response({
+            "results": ChangeLogSerializer(changes, many=True).data,
+            "next": f"{changes[-1].txid}:{changes[-1].id}" if changes else f"{txid}:{since}",
+            "has_more": has_more,
+        })
+
+
+class BatchView(APIView):
+    """
+    Обработчик пакетного запроса: выполняет несколько запросов к эндпоинтам магазина
+    в одном HTTP-запросе. Пользователь аутентифицируется один раз, вложенные запросы
+    выполняются от его имени внутри процесса и возвращают свои коды ответа.
+    """
+    permission_classes = []
+    request_factory = RequestFactory()
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        sub_requests = serializer.validated_data["requests"]
+
+        # параллельно выполняются только независимые запросы на чтение
+        if serializer.validated_data["parallel"] and all(item["method"] == "GET" for item in sub_requests):
+            with ThreadPoolExecutor(max_workers=settings.BATCH_MAX_WORKERS) as executor:
+                futures = [executor.submit(contextvars.copy_context().run, self.perform_in_thread, request, item)
+                           for item in sub_requests]
+                results = [future.result() for future in futures]
+        else:
+            results = [self.perform_sub_request(request, item) for item in sub_requests]
+
+        return Response(results)
+
+    def perform_in_thread(self, request, item):
+        try:
+            return self.perform_sub_request(request, item)
+        finally:
+            connections.close_all()
+
+    def perform_sub_request(self, request, item):
+        url = item["url"]
+        path = url.split("?", 1)[0]
+        api_prefix = reverse("batch").rsplit("batch/", 1)[0]
+        try:
+            match = resolve(path)
+        except Resolver404:
+            match = None
+        if match is None or not path.startswith(api_prefix) or match.url_name == "batch":
+            return {"status": 404, "body": {"detail": "Страница не найдена."}}
+        if asyncio.iscoroutinefunction(match.func):
+            # асинхронные обработчики (/async/) не выполняются внутри синхронного пакета
+            return {"status": 400, "body": {"detail": "Асинхронные эндпоинты не поддерживаются в пакетном запросе."}}
+
+        body = item.get("body")
+        sub_request = self.request_factory.generic(
+            item["method"],
+            url,
+            data=json.dumps(body) if body is not None else "",
+            content_type="application/json",
+            secure=request.is_secure(),
+            HTTP_HOST=request.get_host(),
+        )
+        if request.user.is_authenticated:
+            sub_request._force_auth_user = request.user
+            sub_request._force_auth_token = request.auth
+
+        try:
+            response = match.func(sub_request, *match.args, **match.kwargs)
+            if hasattr(response, "render"):
+                response.render()
+        except Exception:
+            logger.exception("Ошибка при выполнении вложенного запроса %s %s", item["method"], url)
+            return {"status": 500, "body": {"detail": "Ошибка сервера."}}
+
+        body = None
+        if response.content:
+            if response.get("Content-Type", "").startswith("application/json"):
+                body = json.loads(response.content)
+            else:
+                body = response.content.decode()
+        return {"status": response.status_code, "body": body}
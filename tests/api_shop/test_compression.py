@@ -0,0 +1,134 @@
+import gzip
+import json
+import zlib
+
+import pytest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory
+from django.urls import reverse
+from model_bakery import baker
+from api_shop import middleware
+from api_shop.middleware import CompressionMiddleware, accepted_encodings, choose_encoding
+
+BODY = json.dumps([{"id": index, "name": f"Товар {index}"} for index in range(200)]).encode()
+
+
+def request_with(accept_encoding):
+    return RequestFactory().get("/api/v1/products/", HTTP_ACCEPT_ENCODING=accept_encoding)
+
+
+def respond(response, accept_encoding="gzip"):
+    return CompressionMiddleware(lambda request: response)(request_with(accept_encoding))
+
+
+def test_accepted_encodings():
+    assert accepted_encodings("gzip;q=0.5, br , identity;q=0") == {"gzip": 0.5, "br": 1.0, "identity": 0.0}
+    assert choose_encoding(request_with("gzip, br;q=0")) == "gzip"
+    assert choose_encoding(request_with("identity")) is None
+
+
+def test_gzip_response():
+    response = respond(HttpResponse(BODY, content_type="application/json"))
+    assert response["Content-Encoding"] == "gzip"
+    assert response["Vary"] == "Accept-Encoding"
+    assert int(response["Content-Length"]) == len(response.content) < len(BODY)
+    assert gzip.decompress(response.content) == BODY
+
+
+def test_brotli_preferred():
+    brotli = pytest.importorskip("brotli")
+    response = respond(HttpResponse(BODY, content_type="application/json"), "gzip, br")
+    assert response["Content-Encoding"] == "br"
+    assert brotli.decompress(response.content) == BODY
+
+
+def test_gzip_without_brotli(monkeypatch):
+    monkeypatch.setattr(middleware, "brotli", None)
+    assert respond(HttpResponse(BODY, content_type="application/json"), "gzip, br")["Content-Encoding"] == "gzip"
+
+
+def test_small_and_other_responses_not_compressed(settings):
+    assert not respond(HttpResponse(b"{}", content_type="application/json")).has_header("Content-Encoding")
+    assert not respond(HttpResponse(BODY, content_type="text/html")).has_header("Content-Encoding")
+    assert not respond(HttpResponse(BODY, content_type="application/json", status=404)).has_header("Content-Encoding")
+
+    settings.COMPRESSION_MIN_SIZE = len(BODY) + 1
+    assert not respond(HttpResponse(BODY, content_type="application/json")).has_header("Content-Encoding")
+
+
+@pytest.fixture
+def compress_calls(monkeypatch):
+    calls = []
+    compress = middleware.compress
+    monkeypatch.setattr(middleware, "compress", lambda data, encoding: calls.append(encoding) or compress(data, encoding))
+    return calls
+
+
+def json_response(**headers):
+    response = HttpResponse(BODY, content_type="application/json")
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def test_compressed_variant_cached_by_etag(compress_calls):
+    first = respond(json_response(ETag='"v1"'))
+    second = respond(json_response(ETag='"v1"'))
+    assert first.content == second.content
+    assert first["ETag"] == 'W/"v1"'
+    assert compress_calls == ["gzip"]
+
+    respond(json_response(ETag='"v2"'))
+    respond(json_response(ETag='W/"v2"'))
+    assert compress_calls == ["gzip"] * 3
+
+
+def test_compressed_variant_cached_by_view_key(compress_calls):
+    for _ in range(2):
+        response = json_response()
+        response.compression_cache_key = "products:42"
+        respond(response)
+    assert compress_calls == ["gzip"]
+
+
+def test_response_without_key_not_hashed(compress_calls, monkeypatch):
+    monkeypatch.setattr(middleware.hashlib, "sha1", lambda data: pytest.fail("тело ответа хешируется"))
+    first, second = respond(json_response()), respond(json_response())
+    assert gzip.decompress(first.content) == gzip.decompress(second.content) == BODY
+    assert compress_calls == ["gzip", "gzip"]
+
+
+def test_streaming_response_compressed_by_chunks():
+    chunks = [BODY[index:index + 1000] for index in range(0, len(BODY), 1000)]
+    response = respond(StreamingHttpResponse(iter(chunks), content_type="application/json"))
+    assert response["Content-Encoding"] == "gzip"
+
+    parts = list(response.streaming_content)
+    assert len(parts) > 1
+    assert zlib.decompress(b"".join(parts), 16 + zlib.MAX_WBITS) == BODY
+
+
+@pytest.mark.django_db
+def test_products_list_compressed(client):
+    baker.make("Product", _quantity=30, description="Описание товара " * 10)
+    resp = client.get(reverse("product-list"), HTTP_ACCEPT_ENCODING="gzip")
+    assert resp["Content-Encoding"] == "gzip"
+    assert len(json.loads(gzip.decompress(resp.content))) == 30
+
+
+@pytest.mark.django_db
+def test_cached_product_compressed_once(client, compress_calls):
+    product = baker.make("Product", description="Описание товара " * 100)
+    url = reverse("product-detail", args=[product.id])
+
+    first = client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+    second = client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+    assert first.content == second.content
+    assert json.loads(gzip.decompress(second.content))["id"] == product.id
+    assert compress_calls == ["gzip"]
+
+    # новый ответ после изменения товара сжимается заново
+    product.name = "Новое название"
+    product.save()
+    assert json.loads(gzip.decompress(client.get(url, HTTP_ACCEPT_ENCODING="gzip").content))["name"] == "Новое название"
+    assert compress_calls == ["gzip", "gzip"]
@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK, HTTP_403_FORBIDDEN
+from api_shop.db.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool_factory():
+    def factory(**kwargs):
+        return ConnectionPool(connect=FakeConnection,
+                              close=lambda connection: connection.close(),
+                              health_check=lambda connection: not connection.closed,
+                              **kwargs)
+
+    return factory
+
+
+def test_pool_reuses_connections(pool_factory):
+    pool = pool_factory(max_size=2)
+
+    connection = pool.checkout()
+    pool.checkin(connection)
+
+    assert pool.checkout() is connection
+    stats = pool.stats()
+    assert stats["created"] == 1 and stats["checkouts"] == 2 and stats["in_use"] == 1
+
+
+def test_pool_is_bounded(pool_factory):
+    pool = pool_factory(max_size=1, timeout=0.05)
+    pool.checkout()
+
+    with pytest.raises(PoolTimeout):
+        pool.checkout()
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_pool_waiter_gets_returned_connection(pool_factory):
+    pool = pool_factory(max_size=1, timeout=5)
+    connection = pool.checkout()
+    result = []
+
+    waiter = threading.Thread(target=lambda: result.append(pool.checkout()))
+    waiter.start()
+    threading.Timer(0.05, pool.checkin, args=[connection]).start()
+    waiter.join()
+
+    assert result == [connection]
+    assert pool.stats()["waits"] == 1
+
+
+def test_pool_replaces_unhealthy_connection(pool_factory):
+    pool = pool_factory(health_check_interval=0)
+    connection = pool.checkout()
+    pool.checkin(connection)
+    connection.closed = True
+
+    new_connection = pool.checkout()
+    assert new_connection is not connection
+    stats = pool.stats()
+    assert stats["health_check_failures"] == 1 and stats["size"] == 1
+
+
+def test_pool_discards_expired_connection(pool_factory):
+    pool = pool_factory(max_lifetime=0)
+    connection = pool.checkout()
+    pool.checkin(connection)
+
+    assert connection.closed
+    assert pool.stats()["size"] == 0
+
+
+@pytest.mark.django_db
+def test_pool_metrics_for_admin_only(admin_api_client, user_api_client):
+    url = reverse("db-pool-metrics")
+
+    assert admin_api_client.get(url).status_code == HTTP_200_OK
+    assert user_api_client.get(url).status_code == HTTP_403_FORBIDDEN
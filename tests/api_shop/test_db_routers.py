@@ -0,0 +1,147 @@
+import pytest
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from model_bakery import baker
+from api_shop.db import routers
+from api_shop.db.routers import ReplicaRouter, use_primary, is_pinned_to_primary
+from api_shop.middleware import ReplicaRoutingMiddleware
+from shop.models import Product
+
+
+@pytest.fixture
+def replica_available(monkeypatch):
+    available = {"replica": True}
+    monkeypatch.setattr(routers, "replica_available", lambda alias: available.get(alias, False))
+    return available
+
+
+@pytest.fixture
+def replica_alias(settings):
+    """
+    Добавляет алиас БД "replica"; configure(**overrides) задает его настройки поверх настроек default
+    """
+    added = []
+
+    def configure(**overrides):
+        connections.databases["replica"] = {**connections["default"].settings_dict, **overrides}
+        settings.DATABASE_REPLICAS = ["replica"]
+        added.append("replica")
+        return connections["replica"]
+
+    yield configure
+    for alias in added:
+        connections[alias].close()
+        del connections.databases[alias]
+        delattr(connections._connections, alias)
+    routers._replica_unavailable_until.clear()
+    routers._replica_checked_at.clear()
+
+
+@pytest.fixture
+def pin_recorder():
+    calls = []
+
+    def get_response(request):
+        calls.append(is_pinned_to_primary())
+        return HttpResponse(status=201 if request.method == "POST" else 200)
+
+    return ReplicaRoutingMiddleware(get_response), calls
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+def test_read_goes_to_replica(replica_available):
+    router = ReplicaRouter()
+
+    assert router.db_for_read(Product) == "replica"
+    assert router.db_for_write(Product) == "default"
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+def test_read_fails_over_to_primary(replica_available):
+    replica_available["replica"] = False
+
+    assert ReplicaRouter().db_for_read(Product) == "default"
+
+
+@override_settings(DATABASE_REPLICAS=["missing"])
+def test_unknown_replica_marked_unavailable():
+    assert ReplicaRouter().db_for_read(Product) == "default"
+    assert not routers.replica_available("missing")
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+def test_pinned_read_goes_to_primary(replica_available):
+    with use_primary():
+        assert ReplicaRouter().db_for_read(Product) == "default"
+    assert ReplicaRouter().db_for_read(Product) == "replica"
+
+
+@override_settings(REPLICA_STICKY_SECONDS=60)
+def test_middleware_sticks_writer_to_primary(pin_recorder):
+    middleware, calls = pin_recorder
+    factory = RequestFactory()
+
+    middleware(factory.get("/", HTTP_AUTHORIZATION="Token writer"))
+    written = middleware(factory.post("/", HTTP_AUTHORIZATION="Token writer"))
+    mark = written.cookies["db_primary"].value
+    assert written["X-DB-Primary"] == mark
+
+    # метку проверяет любой процесс: в cookie или в заголовке
+    with_cookie = factory.get("/")
+    with_cookie.COOKIES["db_primary"] = mark
+    middleware(with_cookie)
+    middleware(factory.get("/", HTTP_X_DB_PRIMARY=mark))
+    middleware(factory.get("/", HTTP_AUTHORIZATION="Token reader"))
+    middleware(factory.get("/", HTTP_X_DB_PRIMARY=mark + "forged"))
+    # клиент с токеном, не вернувший метку, закреплен по отметке в кэше
+    middleware(factory.get("/", HTTP_AUTHORIZATION="Token writer"))
+
+    assert calls == [False, True, True, True, False, False, True]
+    assert not is_pinned_to_primary()
+
+
+@pytest.mark.django_db
+@override_settings(REPLICA_STICKY_SECONDS=60)
+def test_session_user_sticks_to_primary(pin_recorder, user, client):
+    middleware, calls = pin_recorder
+    client.force_login(user)
+    factory = RequestFactory()
+
+    def session_request(method):
+        request = getattr(factory, method)("/")
+        request.COOKIES = {name: morsel.value for name, morsel in client.cookies.items()}
+        request.user = user
+        return request
+
+    middleware(session_request("get"))
+    middleware(session_request("post"))
+    middleware(session_request("get"))
+    assert calls == [False, True, True]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_reads_go_to_configured_replica(replica_alias):
+    replica = replica_alias(TEST={"MIRROR": "default"})
+    product = baker.make("Product", name="on primary")
+
+    with CaptureQueriesContext(replica) as replica_queries:
+        assert Product.objects.get(pk=product.pk).name == "on primary"
+    assert len(replica_queries) == 1
+
+    with CaptureQueriesContext(replica) as replica_queries, use_primary():
+        Product.objects.get(pk=product.pk)
+    assert len(replica_queries) == 0
+
+
+@pytest.mark.skipif(connection.vendor != "sqlite", reason="реплика - пустой файл SQLite")
+@pytest.mark.django_db(transaction=True)
+def test_failed_replica_query_falls_back_to_primary(replica_alias, tmp_path):
+    # реплика отвечает на проверку доступности, но запрос к ней завершается ошибкой (таблиц нет)
+    replica_alias(NAME=str(tmp_path / "replica.sqlite3"))
+    product = baker.make("Product", name="on primary")
+
+    assert Product.objects.get(pk=product.pk).name == "on primary"
+    assert not routers.replica_available("replica")
+    assert ReplicaRouter().db_for_read(Product) == "default"
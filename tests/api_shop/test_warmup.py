@@ -0,0 +1,35 @@
+import io
+import json
+
+import pytest
+from django.core.management import call_command
+from api_shop import warmup
+from api_shop.warmup import warm_up
+
+
+@pytest.mark.django_db
+def test_warm_up(settings):
+    settings.WARMUP_AUTOCOMPLETE_INDEX = True
+    timings = warm_up()
+    assert set(timings) == {"urls", "models", "databases", "autocomplete"}
+
+    assert set(warm_up(connect=False)) == {"urls", "models"}
+
+
+def test_warm_up_on_startup_does_not_connect(settings, monkeypatch):
+    settings.WARMUP_ON_STARTUP = True
+    monkeypatch.setattr(warmup, "warm_databases", lambda: pytest.fail("соединение до fork"))
+    warmup.warm_up_on_startup()
+
+    settings.WARMUP_ON_STARTUP = False
+    warmup.warm_up_worker()
+
+
+def test_startup_report():
+    stdout = io.StringIO()
+    call_command("startup_report", "--json", "--no-connect", "--top", "5", stdout=stdout)
+
+    report = json.loads(stdout.getvalue())
+    assert report["modules"] > 0
+    assert len(report["slowest_imports"]) == 5
+    assert set(report["warmup_ms"]) == {"urls", "models"}
@@ -5,11 +5,22 @@ from model_bakery import baker
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from random import randint
+from django.core.cache import cache
+from shop.throttling import TokenBucketThrottle
 
 
 
 # Общие фикстуры для api:
 
+@pytest.fixture(autouse=True)
+def reset_throttling():
+    """
+    Лимиты запросов не переносятся между тестами
+    """
+    TokenBucketThrottle.store.clear()
+    cache.clear()
+
+
 @pytest.fixture
 def user(django_user_model):
     return django_user_model.objects.create(username="user", password="password")
@@ -0,0 +1,209 @@
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection, connections
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.status import HTTP_201_CREATED
+from jobs import worker
+from jobs.models import Job, JobStatusChoices
+from jobs.queue import enqueue, claim, execute, heartbeat, run_pending
+from jobs.worker import WorkerPool
+
+calls = []
+
+
+def record_call(*args, **kwargs):
+    calls.append((args, kwargs))
+
+
+def always_fail():
+    raise RuntimeError("boom")
+
+
+@pytest.mark.django_db
+def test_enqueue_and_run():
+    calls.clear()
+    job = enqueue(record_call, 1, "two", key="value")
+
+    assert run_pending() == 1
+    job.refresh_from_db()
+    assert job.status == JobStatusChoices.DONE and job.attempts == 1
+    assert calls == [((1, "two"), {"key": "value"})]
+
+
+@pytest.mark.django_db
+def test_claim_respects_queue_and_run_at():
+    enqueue(record_call, queue="other")
+
+    assert claim(["default"]) is None
+    job = claim(["other"], worker_id="test")
+    assert job.status == JobStatusChoices.RUNNING and job.locked_by == "test"
+    assert claim(["other"]) is None
+
+
+@pytest.mark.django_db
+def test_failed_job_is_retried_then_marked_failed():
+    job = enqueue(always_fail, max_attempts=2)
+
+    execute(claim())
+    job.refresh_from_db()
+    assert job.status == JobStatusChoices.QUEUED and "boom" in job.last_error
+    assert claim() is None
+
+    Job.objects.update(run_at=job.created)
+    execute(claim())
+    job.refresh_from_db()
+    assert job.status == JobStatusChoices.FAILED and job.attempts == 2
+
+
+def make_stale(job):
+    Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+
+
+@pytest.mark.django_db
+def test_heartbeat_keeps_job_from_being_reclaimed():
+    enqueue(record_call)
+    job = claim(worker_id="first")
+    make_stale(job)
+
+    assert heartbeat(job)
+    assert claim(worker_id="second") is None
+
+
+@pytest.mark.django_db
+def test_stale_job_reclaimed_and_first_worker_result_discarded():
+    calls.clear()
+    enqueue(record_call, max_attempts=3)
+    first = claim(worker_id="first")
+    make_stale(first)
+
+    second = claim(worker_id="second")
+    assert second.pk == first.pk and second.attempts == 2
+    assert not heartbeat(first)
+
+    execute(first)
+    job = Job.objects.get()
+    assert job.status == JobStatusChoices.RUNNING and job.locked_by == "second"
+
+    execute(second)
+    assert Job.objects.get().status == JobStatusChoices.DONE
+
+
+@pytest.mark.django_db
+def test_stale_job_with_exhausted_attempts_is_failed():
+    job = enqueue(record_call, max_attempts=1)
+    make_stale(claim(worker_id="killed"))
+
+    assert claim() is None
+    job.refresh_from_db()
+    assert job.status == JobStatusChoices.FAILED and job.finished_at is not None and job.locked_at is None
+
+
+@pytest.mark.skipif(connection.vendor != "postgresql", reason="нужны параллельные транзакции PostgreSQL")
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_claims_do_not_return_same_job():
+    jobs, workers = 20, 8
+    for _ in range(jobs):
+        enqueue(record_call)
+    claimed = []
+    barrier = threading.Barrier(workers)
+
+    def claim_all(worker_id):
+        barrier.wait()
+        try:
+            while True:
+                job = claim(worker_id=worker_id)
+                if job is None:
+                    break
+                claimed.append(job.pk)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=claim_all, args=(f"worker{i}",)) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+
+    assert len(claimed) == len(set(claimed)) == jobs
+
+
+def test_worker_pool_graceful_shutdown(monkeypatch, tmp_path):
+    """
+    По SIGTERM обработчик дорабатывает текущую задачу и завершается без принудительной остановки
+    """
+    started, finished = tmp_path / "started", tmp_path / "finished"
+    claimed = []
+
+    def fake_claim(queues, worker_id):
+        if claimed:
+            return None
+        claimed.append(worker_id)
+        return object()
+
+    def slow_execute(job):
+        started.touch()
+        time.sleep(0.5)
+        finished.touch()
+
+    monkeypatch.setattr(worker, "claim", fake_claim)
+    monkeypatch.setattr(worker, "execute", slow_execute)
+    monkeypatch.setattr(worker, "close_old_connections", lambda: None)
+
+    pool = WorkerPool(["default"], processes=1, poll_interval=0.05, shutdown_timeout=10)
+    pool.children = [pool.spawn()]
+    deadline = time.monotonic() + 10
+    while not started.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    pool.shutdown()
+    assert finished.exists()
+    assert pool.children[0].exitcode == 0
+
+
+def test_worker_pool_terminates_after_shutdown_timeout(monkeypatch, tmp_path):
+    started = tmp_path / "started"
+
+    def hanging_execute(job):
+        started.touch()
+        time.sleep(60)
+
+    monkeypatch.setattr(worker, "claim", lambda queues, worker_id: object())
+    monkeypatch.setattr(worker, "execute", hanging_execute)
+    monkeypatch.setattr(worker, "close_old_connections", lambda: None)
+
+    pool = WorkerPool(["default"], processes=1, poll_interval=0.05, shutdown_timeout=0.5)
+    pool.children = [pool.spawn()]
+    deadline = time.monotonic() + 10
+    while not started.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    pool.shutdown()
+    assert pool.children[0].exitcode != 0
+
+
+@pytest.mark.django_db
+def test_order_create_enqueues_notification(user, user_api_client, order_create_payload):
+    user.email = "user@example.com"
+    user.save()
+
+    resp = user_api_client.post(reverse("order-list"), data=order_create_payload, format="json")
+    assert resp.status_code == HTTP_201_CREATED
+    assert Job.objects.filter(task="shop.tasks.notify_order_changed", args=[resp.json()["id"]]).exists()
+    assert not mail.outbox
+
+    call_command("run_jobs", "--once")
+    assert mail.outbox[0].to == ["user@example.com"]
+
+
+@pytest.mark.django_db
+def test_review_create_enqueues_notification(user_api_client, review_create_payload):
+    resp = user_api_client.post(reverse("review-list"), data=review_create_payload, format="json")
+    assert resp.status_code == HTTP_201_CREATED
+
+    assert Job.objects.get().task == "shop.tasks.notify_review_created"
@@ -0,0 +1,47 @@
+import pytest
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK
+from shop.admin import EstimatedCountPaginator
+from shop.models import Order, Product
+
+
+@pytest.mark.django_db
+def test_order_changelist_search(admin_client, user, another_user):
+    own = baker.make("Order", user=user, total_cost=1)
+    other = baker.make("Order", user=another_user, total_cost=1)
+    url = reverse("admin:shop_order_changelist")
+
+    resp = admin_client.get(url, {"q": user.username})
+    assert resp.status_code == HTTP_200_OK
+    assert list(resp.context["cl"].result_list) == [own]
+
+    resp = admin_client.get(url, {"q": str(other.id)})
+    assert list(resp.context["cl"].result_list) == [other]
+
+
+@pytest.mark.django_db
+def test_product_changelist_price_range_filter(admin_client):
+    cheap = baker.make("Product", price=100)
+    baker.make("Product", price=700)
+
+    resp = admin_client.get(reverse("admin:shop_product_changelist"), {"price_range": "0-500"})
+    assert resp.status_code == HTTP_200_OK
+    assert list(resp.context["cl"].result_list) == [cheap]
+
+
+@pytest.mark.django_db
+def test_review_changelist_selects_related(admin_client, user, django_assert_max_num_queries):
+    baker.make("ProductReview", user=user, _quantity=5)
+
+    with django_assert_max_num_queries(8):
+        resp = admin_client.get(reverse("admin:shop_productreview_changelist"))
+    assert resp.status_code == HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_estimated_count_paginator_falls_back_to_count(user):
+    baker.make("Order", user=user, total_cost=1, _quantity=3)
+
+    assert EstimatedCountPaginator(Order.objects.all(), 2).count == 3
+    assert EstimatedCountPaginator(Product.objects.all(), 2).count == 0
@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK, HTTP_401_UNAUTHORIZED, HTTP_403_FORBIDDEN, HTTP_404_NOT_FOUND
+from shop.async_views import AsyncProductView, AsyncReviewView
+from shop.permissions import IsOwnerOrAdmin
+
+
+@pytest.fixture(autouse=True)
+def async_in_test_thread(settings):
+    """
+    Данные теста видны только в его транзакции, поэтому обращения к БД - в основном потоке
+    """
+    settings.ASYNC_VIEWS_THREAD_SENSITIVE = True
+
+
+@pytest.mark.django_db
+def test_async_products_list(user_api_client, product_factory):
+    products_list = product_factory()
+    url = reverse("async-product-list")
+
+    resp = user_api_client.get(url)
+    assert resp.status_code == HTTP_200_OK
+
+    expected_ids = {product.id for product in products_list}
+    assert {product["id"] for product in resp.json()} == expected_ids
+
+
+@pytest.mark.django_db
+def test_async_product_retrieve_matches_sync(user_api_client, product_factory):
+    product = product_factory(min_amount=1, max_amount=1)[0]
+
+    async_resp = user_api_client.get(reverse("async-product-detail", args=[product.id]))
+    sync_resp = user_api_client.get(reverse("product-detail", args=[product.id]))
+    assert async_resp.status_code == HTTP_200_OK
+    assert async_resp.json() == sync_resp.json()
+
+
+@pytest.mark.django_db
+def test_async_product_retrieve_not_found(user_api_client):
+    resp = user_api_client.get(reverse("async-product-detail", args=[0]))
+    assert resp.status_code == HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_async_reviews_filter_by_product_id(user_api_client, review_factory):
+    product_id = review_factory()[0].product_id
+
+    resp = user_api_client.get(reverse("async-review-list"), {"product": product_id})
+    assert resp.status_code == HTTP_200_OK
+    assert {review["product"] for review in resp.json()} == {product_id}
+
+
+@pytest.mark.django_db
+def test_async_collection_retrieve(user_api_client, collection_factory):
+    collection = collection_factory(min_amount=1, max_amount=1)[0]
+
+    resp = user_api_client.get(reverse("async-collection-detail", args=[collection.id]))
+    assert resp.status_code == HTTP_200_OK
+    assert resp.json()["id"] == collection.id
+
+
+@pytest.mark.django_db
+def test_async_view_invalid_token(client):
+    resp = client.get(reverse("async-product-list"), HTTP_AUTHORIZATION="Token invalid")
+    assert resp.status_code == HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+def test_async_object_permission(review_factory, user_token, another_user_token):
+    class OwnerReviewView(AsyncReviewView):
+        permission_classes = (IsOwnerOrAdmin,)
+
+    review = review_factory(min_amount=1, max_amount=1)[0]
+    view = OwnerReviewView.as_view()
+    factory = RequestFactory()
+
+    owner_resp = async_to_sync(view)(factory.get("/", HTTP_AUTHORIZATION=f"Token {user_token}"), pk=review.id)
+    assert owner_resp.status_code == HTTP_200_OK
+
+    another_resp = async_to_sync(view)(factory.get("/", HTTP_AUTHORIZATION=f"Token {another_user_token}"),
+                                       pk=review.id)
+    assert another_resp.status_code == HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_view_runs_in_thread_pool(settings, monkeypatch, client, product_factory):
+    settings.ASYNC_VIEWS_THREAD_SENSITIVE = False
+    product = product_factory(min_amount=1, max_amount=1)[0]
+    threads = []
+    serialize = AsyncProductView.serialize
+
+    def record_thread(self, *args, **kwargs):
+        threads.append(threading.get_ident())
+        return serialize(self, *args, **kwargs)
+
+    monkeypatch.setattr(AsyncProductView, "serialize", record_thread)
+    resp = client.get(reverse("async-product-detail", args=[product.id]))
+    assert resp.status_code == HTTP_200_OK
+    assert resp.json()["id"] == product.id
+    assert threads and threads[0] != threading.get_ident()
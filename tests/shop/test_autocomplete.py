@@ -0,0 +1,142 @@
+import threading
+
+import pytest
+from django.db import connection, connections, transaction
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_429_TOO_MANY_REQUESTS
+from shop import autocomplete
+from shop.autocomplete import PrefixIndex, product_name_index
+from shop.models import ChangeLog, Product
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(settings):
+    settings.AUTOCOMPLETE_CHECK_SECONDS = 0
+    settings.AUTOCOMPLETE_BACKGROUND_REBUILD = False
+    product_name_index.reset()
+    yield
+    product_name_index.reset()
+
+
+def test_prefix_index_search():
+    index = PrefixIndex([(1, "Молоко 3,2%"), (2, "Мука"), (3, "молоко  топленое"), (4, "Масло")])
+
+    assert index.search("мол") == [{"id": 1, "name": "Молоко 3,2%"}, {"id": 3, "name": "молоко  топленое"}]
+    assert index.search("МОЛОКО Т") == [{"id": 3, "name": "молоко  топленое"}]
+    assert index.search("м", limit=2) == [{"id": 4, "name": "Масло"}, {"id": 1, "name": "Молоко 3,2%"}]
+    assert index.search("хлеб") == []
+    assert index.search("  ") == []
+
+
+@pytest.mark.django_db
+def test_product_autocomplete(client):
+    apple, apricot = baker.make("Product", name="Apple"), baker.make("Product", name="Apricot")
+    baker.make("Product", name="Banana")
+
+    resp = client.get(reverse("product-autocomplete"), {"q": "ap"})
+    assert resp.status_code == HTTP_200_OK
+    assert resp.json() == [{"id": apple.id, "name": "Apple"}, {"id": apricot.id, "name": "Apricot"}]
+
+    resp = client.get(reverse("product-autocomplete"), {"q": "ap", "limit": 1})
+    assert resp.json() == [{"id": apple.id, "name": "Apple"}]
+
+
+@pytest.mark.django_db
+def test_product_autocomplete_follows_product_changes(client):
+    product = baker.make("Product", name="Apple")
+    assert client.get(reverse("product-autocomplete"), {"q": "ap"}).json() == [{"id": product.id, "name": "Apple"}]
+
+    product.name = "Banana"
+    product.save()
+    assert client.get(reverse("product-autocomplete"), {"q": "ap"}).json() == []
+
+    product.delete()
+    assert client.get(reverse("product-autocomplete"), {"q": "ba"}).json() == []
+
+
+def test_prefix_index_updated():
+    index = PrefixIndex([(1, "Apple"), (2, "Apricot"), (3, "Banana")], version=(0, 1))
+
+    updated = index.updated({1: "Cherry", 2: None, 4: "Avocado", 3: "Banana"}, version=(0, 5))
+    assert updated.version == (0, 5)
+    assert updated.search("a") == [{"id": 4, "name": "Avocado"}]
+    assert updated.search("c") == [{"id": 1, "name": "Cherry"}]
+    assert (updated.keys, updated.ids) == (["avocado", "banana", "cherry"], [4, 3, 1])
+    # исходный индекс не меняется
+    assert index.search("a") == [{"id": 1, "name": "Apple"}, {"id": 2, "name": "Apricot"}]
+
+
+@pytest.mark.django_db
+def test_autocomplete_applies_changes_incrementally(settings, monkeypatch):
+    apple, banana = baker.make("Product", name="Apple"), baker.make("Product", name="Banana")
+    index = product_name_index.get_index()
+    monkeypatch.setattr(autocomplete, "build_index", lambda: pytest.fail("индекс построен заново"))
+
+    # изменение без названия: индекс тот же
+    Product.objects.filter(pk=apple.pk).update(stock=3)
+    ChangeLog.record(Product, [apple.pk])
+    assert product_name_index.get_index() is index
+    latest = ChangeLog.objects.latest("id")
+    assert index.version == (latest.txid, latest.id)
+
+    banana.name = "Apricot"
+    banana.save()
+    assert product_name_index.search("ap") == [{"id": apple.id, "name": "Apple"}, {"id": banana.id, "name": "Apricot"}]
+
+
+@pytest.mark.django_db
+def test_autocomplete_rebuilds_after_many_changes(settings):
+    settings.AUTOCOMPLETE_INCREMENTAL_LIMIT = 1
+    product_name_index.get_index()
+    baker.make("Product", name="Apple", _quantity=2)
+    assert len(product_name_index.get_index()) == 2
+
+
+@pytest.mark.django_db
+def test_autocomplete_throttled_separately(client, settings):
+    settings.REST_FRAMEWORK = {
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {"products": "1/min", "autocomplete": "3/min"},
+    }
+    url = reverse("product-autocomplete")
+    assert [client.get(url, {"q": "a"}).status_code for _ in range(4)] == [HTTP_200_OK] * 3 + [
+        HTTP_429_TOO_MANY_REQUESTS]
+    assert client.get(reverse("product-list")).status_code == HTTP_200_OK
+
+
+@pytest.mark.skipif(connection.vendor != "postgresql", reason="нужны параллельные транзакции PostgreSQL")
+@pytest.mark.django_db(transaction=True)
+def test_autocomplete_applies_change_committed_after_higher_id():
+    """
+    Переименование с меньшим id записи журнала фиксируется после переименования с большим id:
+    индекс не должен пропустить его
+    """
+    early, late = baker.make("Product", name="Apple"), baker.make("Product", name="Banana")
+    product_name_index.get_index()
+    renamed, commit = threading.Event(), threading.Event()
+
+    def rename_and_wait():
+        try:
+            with transaction.atomic():
+                early.name = "Cherry"
+                early.save()
+                renamed.set()
+                commit.wait(timeout=10)
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=rename_and_wait)
+    thread.start()
+    assert renamed.wait(timeout=10)
+    late.name = "Blueberry"
+    late.save()
+
+    # изменение незавершенной транзакции еще не видно: курсор не переходит дальше него
+    product_name_index.get_index()
+    commit.set()
+    thread.join(timeout=10)
+
+    product_name_index.get_index()
+    assert product_name_index.search("c") == [{"id": early.id, "name": "Cherry"}]
+    assert product_name_index.search("b") == [{"id": late.id, "name": "Blueberry"}]
@@ -0,0 +1,99 @@
+import threading
+
+import pytest
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND, \
+    HTTP_403_FORBIDDEN, HTTP_401_UNAUTHORIZED
+from shop.views import BatchView
+
+
+@pytest.mark.django_db
+def test_batch_reads(user_api_client, product_factory, order_factory):
+    product = product_factory(min_amount=1, max_amount=1)[0]
+    orders = order_factory()
+    payload = {"requests": [
+        {"url": reverse("product-detail", args=[product.id])},
+        {"url": reverse("review-list") + f"?product={product.id}"},
+        {"url": reverse("order-list")},
+    ]}
+
+    resp = user_api_client.post(reverse("batch"), data=payload, format="json")
+    assert resp.status_code == HTTP_200_OK
+
+    product_resp, reviews_resp, orders_resp = resp.json()
+    assert product_resp["status"] == HTTP_200_OK and product_resp["body"]["id"] == product.id
+    assert reviews_resp["status"] == HTTP_200_OK and reviews_resp["body"] == []
+    assert {order["id"] for order in orders_resp["body"]} == {order.id for order in orders}
+
+
+@pytest.mark.django_db
+def test_batch_preserves_sub_request_status(user_api_client, order_create_payload, product_create_payload):
+    payload = {"requests": [
+        {"method": "POST", "url": reverse("order-list"), "body": order_create_payload},
+        {"method": "POST", "url": reverse("product-list"), "body": product_create_payload},
+        {"url": reverse("product-detail", args=[0])},
+        {"url": "/admin/"},
+    ]}
+
+    resp = user_api_client.post(reverse("batch"), data=payload, format="json")
+    assert resp.status_code == HTTP_200_OK
+    assert [item["status"] for item in resp.json()] == [
+        HTTP_201_CREATED, HTTP_403_FORBIDDEN, HTTP_404_NOT_FOUND, HTTP_404_NOT_FOUND
+    ]
+
+
+@pytest.mark.django_db
+def test_batch_anonymous_user(client, order_factory):
+    order_factory()
+    payload = {"requests": [{"url": reverse("order-list")}]}
+
+    resp = client.post(reverse("batch"), data=payload, content_type="application/json")
+    assert resp.status_code == HTTP_200_OK
+    assert resp.json()[0]["status"] == HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db(transaction=True)
+def test_batch_parallel_reads(monkeypatch, user_api_client, product_factory, order_factory):
+    products = product_factory(min_amount=3, max_amount=3)
+    orders = order_factory()
+    threads = set()
+    perform_sub_request = BatchView.perform_sub_request
+
+    def record_thread(self, request, item):
+        threads.add(threading.get_ident())
+        return perform_sub_request(self, request, item)
+
+    monkeypatch.setattr(BatchView, "perform_sub_request", record_thread)
+    payload = {"parallel": True, "requests": [
+        *({"url": reverse("product-detail", args=[product.id])} for product in products),
+        {"url": reverse("order-list")},
+    ]}
+
+    resp = user_api_client.post(reverse("batch"), data=payload, format="json")
+    assert resp.status_code == HTTP_200_OK
+    *product_resps, orders_resp = resp.json()
+    assert [item["body"]["id"] for item in product_resps] == [product.id for product in products]
+    assert {order["id"] for order in orders_resp["body"]} == {order.id for order in orders}
+    assert threading.get_ident() not in threads
+
+
+@pytest.mark.django_db
+def test_batch_rejects_async_endpoints(user_api_client, product_factory):
+    product = product_factory(min_amount=1, max_amount=1)[0]
+    payload = {"requests": [
+        {"url": reverse("async-product-detail", args=[product.id])},
+        {"url": reverse("product-detail", args=[product.id])},
+    ]}
+
+    resp = user_api_client.post(reverse("batch"), data=payload, format="json")
+    assert resp.status_code == HTTP_200_OK
+    assert [item["status"] for item in resp.json()] == [HTTP_400_BAD_REQUEST, HTTP_200_OK]
+
+
+@pytest.mark.django_db
+def test_batch_limit(user_api_client, settings):
+    settings.BATCH_MAX_REQUESTS = 1
+    payload = {"requests": [{"url": reverse("product-list")}, {"url": reverse("review-list")}]}
+
+    resp = user_api_client.post(reverse("batch"), data=payload, format="json")
+    assert resp.status_code == HTTP_400_BAD_REQUEST
@@ -0,0 +1,68 @@
+import io
+import json
+from datetime import date
+
+import pytest
+from django.conf import settings
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.status import HTTP_201_CREATED
+from shop.bulk_load import dependency_order, iter_json_array
+from shop.models import ChangeLog, Collection, Order, OrderProductPosition, Product, ProductReview
+
+FIXTURE = settings.BASE_DIR / "fixtures.json"
+
+
+def test_iter_json_array_reads_small_chunks():
+    items = [{"model": "shop.product", "pk": pk, "fields": {"name": "товар, [1]"}} for pk in range(20)]
+    stream = io.StringIO(json.dumps(items, ensure_ascii=False, indent=2))
+    assert list(iter_json_array(stream, chunk_size=7)) == items
+    assert list(iter_json_array(io.StringIO(" [ ] "))) == []
+
+
+def test_iter_json_array_rejects_truncated_file():
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO('[{"model": "shop.product"'), chunk_size=4))
+
+
+def test_dependency_order():
+    models = [OrderProductPosition, ProductReview, Order, Product]
+    ordered = dependency_order(models)
+    assert ordered.index(Order) < ordered.index(OrderProductPosition)
+    assert ordered.index(Product) < ordered.index(OrderProductPosition)
+    assert ordered.index(Product) < ordered.index(ProductReview)
+
+
+@pytest.mark.django_db
+def test_bulk_loaddata(admin_api_client, product_create_payload):
+    call_command("bulk_loaddata", str(FIXTURE), "--batch-size", "3",
+                 "-e", "auth.permission", "-e", "admin", "-e", "sessions", stdout=io.StringIO())
+
+    fixture = json.loads(FIXTURE.read_text(encoding="utf-8"))
+    expected = {}
+    for item in fixture:
+        expected[item["model"]] = expected.get(item["model"], 0) + 1
+    assert Product.objects.count() == expected["shop.product"]
+    assert Order.objects.count() == expected["shop.order"]
+    assert OrderProductPosition.objects.count() == expected["shop.orderproductposition"]
+
+    # токены созданы без сигнала post_save
+    assert Token.objects.filter(user__username__in=["admin-admin", "marina"]).count() == 2
+
+    # даты из фикстуры не заменены на сегодняшние
+    order = Order.objects.get(pk=1)
+    assert order.created == date(2021, 6, 22)
+    assert set(order.positions.values_list("created", flat=True)) == {order.created}
+
+    # сводки подборок пересчитаны
+    for collection in Collection.objects.all():
+        assert collection.products_count == collection.products.count()
+
+    # вставленные объекты каталога записаны в журнал изменений
+    assert ChangeLog.objects.filter(entity="product", action="insert").count() == expected["shop.product"]
+
+    # счетчики первичных ключей сброшены
+    resp = admin_api_client.post(reverse("product-list"), data=product_create_payload, format="json")
+    assert resp.status_code == HTTP_201_CREATED
+    assert resp.json()["id"] > max(item["pk"] for item in fixture if item["model"] == "shop.product")
@@ -0,0 +1,94 @@
+import pytest
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.status import HTTP_201_CREATED, HTTP_207_MULTI_STATUS, HTTP_400_BAD_REQUEST, \
+    HTTP_401_UNAUTHORIZED
+from jobs.models import Job
+from shop.models import Order, OrderOutboxEvent, OrderProductPosition, StockReservation
+
+
+def order_payload(*positions):
+    return {"positions": [{"product_id": product.id, "quantity": quantity} for product, quantity in positions]}
+
+
+@pytest.fixture
+def products():
+    return baker.make("Product", price=100, stock=10), baker.make("Product", price=50, stock=None)
+
+
+@pytest.mark.django_db
+def test_bulk_create_orders(user, user_api_client, products):
+    tracked, untracked = products
+    payload = {"orders": [order_payload((tracked, 2), (untracked, 1)), order_payload((tracked, 3))]}
+
+    resp = user_api_client.post(reverse("order-bulk-create"), data=payload, format="json")
+    assert resp.status_code == HTTP_201_CREATED
+
+    resp_json = resp.json()
+    assert resp_json["created"] == 2
+    assert [result["total_cost"] for result in resp_json["results"]] == [250, 300]
+
+    orders = Order.objects.filter(user=user).order_by("id")
+    assert [order.id for order in orders] == [result["id"] for result in resp_json["results"]]
+    assert OrderProductPosition.objects.filter(order__in=orders).count() == 3
+    assert OrderOutboxEvent.objects.filter(order_id__in=[order.id for order in orders]).count() == 2
+    assert Job.objects.count() == 2
+
+    tracked.refresh_from_db()
+    assert tracked.stock == 5
+    assert sorted(StockReservation.objects.values_list("quantity", flat=True)) == [2, 3]
+
+
+@pytest.mark.django_db
+def test_bulk_create_partial_failure(user_api_client, products):
+    tracked, untracked = products
+    payload = {"orders": [
+        order_payload((tracked, 8)),
+        {"positions": []},
+        {"positions": [{"product_id": 999999, "quantity": 1}]},
+        order_payload((tracked, 5)),
+        order_payload((untracked, 2)),
+    ]}
+
+    resp = user_api_client.post(reverse("order-bulk-create"), data=payload, format="json")
+    assert resp.status_code == HTTP_207_MULTI_STATUS
+
+    results = resp.json()["results"]
+    assert [result["index"] for result in results] == [0, 1, 2, 3, 4]
+    assert ["id" in result for result in results] == [True, False, False, False, True]
+    assert "positions" in results[3]["errors"]
+    assert Order.objects.count() == 2
+
+    tracked.refresh_from_db()
+    assert tracked.stock == 2
+
+
+@pytest.mark.django_db
+def test_bulk_create_atomic(user_api_client, products):
+    tracked, untracked = products
+    payload = {"atomic": True, "orders": [order_payload((untracked, 1)), order_payload((tracked, 11))]}
+
+    resp = user_api_client.post(reverse("order-bulk-create"), data=payload, format="json")
+    assert resp.status_code == HTTP_400_BAD_REQUEST
+    assert all("errors" in result for result in resp.json()["results"])
+    assert not Order.objects.exists()
+
+    tracked.refresh_from_db()
+    assert tracked.stock == 10
+
+
+@pytest.mark.django_db
+def test_bulk_create_query_count(user_api_client, django_assert_max_num_queries):
+    products = baker.make("Product", price=10, stock=1000, _quantity=5)
+    payload = {"orders": [order_payload(*[(product, 1) for product in products]) for _ in range(20)]}
+
+    # без RETURNING (SQLite) заказы вставляются по одному, остальное - пакетами
+    with django_assert_max_num_queries(40):
+        resp = user_api_client.post(reverse("order-bulk-create"), data=payload, format="json")
+    assert resp.status_code == HTTP_201_CREATED
+
+
+@pytest.mark.django_db
+def test_bulk_create_requires_auth(client):
+    resp = client.post(reverse("order-bulk-create"), data={"orders": [{}]}, content_type="application/json")
+    assert resp.status_code == HTTP_401_UNAUTHORIZED
@@ -0,0 +1,86 @@
+import pytest
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+from shop.models import ChangeLog, Product, ProductPrice
+from shop.stock import release_stock, reserve_stock
+
+
+def get_changes(client, since=0, **params):
+    resp = client.get(reverse("change-feed"), {"since": since, **params})
+    assert resp.status_code == HTTP_200_OK
+    return resp.json()
+
+
+@pytest.mark.django_db
+def test_changes_product_lifecycle(user_api_client, admin_api_client, product_create_payload):
+    since = get_changes(user_api_client)["next"]
+
+    product_id = admin_api_client.post(reverse("product-list"), data=product_create_payload, format="json").json()["id"]
+    admin_api_client.patch(reverse("product-detail", args=[product_id]), data={"price": 200})
+    admin_api_client.delete(reverse("product-detail", args=[product_id]))
+
+    changes = get_changes(user_api_client, since)["results"]
+    assert [(change["entity"], change["object_id"], change["action"]) for change in changes] == [
+        ("product", product_id, "insert"),
+        ("product", product_id, "update"),
+        ("product", product_id, "delete"),
+    ]
+
+
+@pytest.mark.django_db
+def test_changes_collection_products(admin_api_client, collection_create_payload):
+    resp = admin_api_client.post(reverse("collection-list"), data=collection_create_payload, format="json")
+    collection_id = resp.json()["id"]
+
+    changes = get_changes(admin_api_client)["results"]
+    entities = {(change["entity"], change["action"]) for change in changes}
+    assert ("collection", "insert") in entities
+    assert ("collectionproduct", "insert") in entities
+
+    since = changes[-1]["id"]
+    admin_api_client.delete(reverse("collection-detail", args=[collection_id]))
+    entities = {(change["entity"], change["action"]) for change in get_changes(admin_api_client, since)["results"]}
+    assert entities == {("collection", "delete"), ("collectionproduct", "delete")}
+
+
+@pytest.mark.django_db
+def test_changes_paging(user_api_client, product_factory):
+    product_factory(min_amount=5, max_amount=5)
+
+    first_page = get_changes(user_api_client, limit=3)
+    assert len(first_page["results"]) == 3 and first_page["has_more"]
+
+    second_page = get_changes(user_api_client, first_page["next"], limit=3)
+    assert len(second_page["results"]) == 2 and not second_page["has_more"]
+    assert ChangeLog.objects.count() == 5
+
+
+@pytest.mark.django_db
+def test_changes_invalid_cursor(user_api_client):
+    resp = user_api_client.get(reverse("change-feed"), {"since": "abc"})
+    assert resp.status_code == HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_changes_cursor_format(user_api_client, product_factory):
+    product_factory(min_amount=2, max_amount=2)
+    page = get_changes(user_api_client, limit=1)
+    change = ChangeLog.objects.order_by("txid", "id").first()
+    assert page["next"] == f"{change.txid}:{change.id}"
+    assert len(get_changes(user_api_client, page["next"])["results"]) == 1
+
+
+@pytest.mark.django_db
+def test_changes_include_queryset_updates(user_api_client):
+    product = baker.make("Product", price=10, stock=5)
+    since = get_changes(user_api_client)["next"]
+
+    reserve_stock({product: 2})
+    release_stock({product.id: 1})
+    Product.objects.filter(pk=product.pk).update(price=20)
+    ProductPrice.record_changes(Product.objects.all())
+
+    changes = get_changes(user_api_client, since)["results"]
+    assert [(change["entity"], change["object_id"], change["action"]) for change in changes] == \
+        [("product", product.id, "update")] * 3
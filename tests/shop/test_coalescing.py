@@ -0,0 +1,156 @@
+import threading
+import time
+
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_404_NOT_FOUND
+from api_shop.db.routers import is_pinned_to_primary
+from shop.coalescing import CoalescedReads, SingleFlight
+
+
+@pytest.fixture
+def read_settings(settings):
+    settings.READ_CACHE_FRESH_SECONDS = 60
+    settings.READ_CACHE_STALE_SECONDS = 60
+    settings.READ_CACHE_BACKGROUND_REFRESH = False
+    settings.READ_CACHE_LOCK = False
+    settings.READ_CACHE_LOCK_SECONDS = 5
+    return settings
+
+
+def test_single_flight_shares_result(read_settings):
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"id": 1}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do("key", compute)))
+    leader.start()
+    started.wait(5)
+    waiters = [threading.Thread(target=lambda: results.append(flights.do("key", compute))) for _ in range(5)]
+    for waiter in waiters:
+        waiter.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in [leader, *waiters]:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == [{"id": 1}] * 6
+    assert not flights.in_flight("key")
+
+
+def test_single_flight_shares_error(read_settings):
+    flights = SingleFlight()
+    with pytest.raises(KeyError):
+        flights.do("key", lambda: {}["missing"])
+    assert flights.do("key", lambda: 1) == 1
+
+
+def test_stale_while_revalidate(read_settings):
+    read_settings.READ_CACHE_FRESH_SECONDS = 0
+    read_settings.READ_CACHE_BACKGROUND_REFRESH = True
+    reads = CoalescedReads("test")
+    value = ["v1"]
+
+    assert reads.get(1, lambda: value[0]) == "v1"
+    value[0] = "v2"
+    # устаревший ответ отдается сразу, новый строится в фоне
+    assert reads.get(1, lambda: value[0]) == "v1"
+
+    deadline = time.monotonic() + 5
+    while cache.get(reads.data_key(1, ""))["data"] != "v2" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert reads.get(1, lambda: value[0]) == "v2"
+
+
+def test_background_refresh_reads_primary(read_settings):
+    read_settings.READ_CACHE_FRESH_SECONDS = 0
+    read_settings.READ_CACHE_BACKGROUND_REFRESH = True
+    reads = CoalescedReads("test")
+    pinned = []
+
+    def compute():
+        pinned.append(is_pinned_to_primary())
+        return "v"
+
+    reads.get(1, compute)
+    reads.get(1, compute)
+    deadline = time.monotonic() + 5
+    while len(pinned) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pinned == [True, True]
+
+
+def test_evicted_version_does_not_revive_entries(read_settings):
+    reads = CoalescedReads("test")
+    assert reads.get(1, lambda: "v1") == "v1"
+
+    cache.delete(reads.version_key(1))
+    assert reads.get(1, lambda: "v2") == "v2"
+    assert reads.get(1, lambda: "v3") == "v2"
+
+
+@pytest.mark.django_db
+def test_version_bump_invalidates(read_settings):
+    reads = CoalescedReads("test")
+    assert reads.get(1, lambda: "v1") == "v1"
+    assert reads.get(1, lambda: "v2") == "v1"
+
+    reads.invalidate(1)
+    assert reads.get(1, lambda: "v2") == "v2"
+
+
+def test_cache_lock_waits_for_other_process(read_settings):
+    read_settings.READ_CACHE_LOCK = True
+    reads = CoalescedReads("test")
+    data_key = reads.data_key(1, "")
+    # блокировку держит другой процесс, который вскоре сохраняет ответ
+    cache.set(reads.version_key(1), "v", None)
+    cache.add(f"{data_key}:lock", 1)
+    timer = threading.Timer(0.1, lambda: cache.set(data_key, {"version": "v",
+                                                              "fresh_until": time.time() + 60,
+                                                              "data": "v1"}))
+    timer.start()
+    assert reads.get(1, lambda: "computed") == "v1"
+    timer.join()
+
+
+@pytest.mark.django_db
+def test_product_retrieve_cached(client, admin_api_client, read_settings, django_assert_num_queries):
+    product = baker.make("Product", name="Old name")
+    url = reverse("product-detail", args=[product.id])
+
+    assert client.get(url).json()["name"] == "Old name"
+    with django_assert_num_queries(0):
+        assert client.get(url).json()["name"] == "Old name"
+
+    resp = admin_api_client.patch(url, {"name": "New name"}, format="json")
+    assert resp.status_code == HTTP_200_OK
+    assert client.get(url).json()["name"] == "New name"
+
+    product.delete()
+    assert client.get(url).status_code == HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_collection_retrieve_cached_per_page(client, read_settings):
+    products = baker.make("Product", _quantity=3)
+    collection = baker.make("Collection", products=products)
+    url = reverse("collection-detail", args=[collection.id])
+
+    first = client.get(url, {"products_page_size": 2}).json()
+    second = client.get(url, {"products_page_size": 2, "products_page": 2}).json()
+    assert len(first["products_list"]) == 2
+    assert len(second["products_list"]) == 1
+
+    collection.products.remove(products[0])
+    assert client.get(url, {"products_page_size": 2}).json()["products_page"]["count"] == 2
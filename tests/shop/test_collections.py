@@ -1,7 +1,9 @@
 import pytest
 from django.urls import reverse
 import random
+from model_bakery import baker
 from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_403_FORBIDDEN, HTTP_204_NO_CONTENT
+from shop.models import Collection
 
 
 @pytest.mark.django_db
@@ -98,3 +100,57 @@ def test_collections_delete_by_user(collection_factory, user_api_client):
 
     resp = user_api_client.delete(url)
     assert resp.status_code == HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+def test_collection_summary_follows_products(admin_api_client, product_factory):
+    cheap, expensive = baker.make("Product", price=10), baker.make("Product", price=90)
+    resp = admin_api_client.post(reverse("collection-list"), format="json", data={
+        "name": "summary", "text": "test", "slug": "summary", "products_list": [{"product_id": cheap.id}],
+    })
+    collection = Collection.objects.get(id=resp.json()["id"])
+    assert (collection.products_count, collection.min_price, collection.max_price) == (1, 10, 10)
+
+    collection.products.add(expensive)
+    expensive.price = 120
+    expensive.save()
+    collection.refresh_from_db()
+    assert (collection.products_count, collection.min_price, collection.max_price) == (2, 10, 120)
+
+    cheap.delete()
+    collection.refresh_from_db()
+    assert (collection.products_count, collection.min_price, collection.max_price) == (1, 120, 120)
+
+
+@pytest.mark.django_db
+def test_collections_list_uses_summary(user_api_client, django_assert_num_queries):
+    collection = baker.make("Collection")
+    collection.products.add(*baker.make("Product", price=5, _quantity=3))
+
+    with django_assert_num_queries(2):
+        resp = user_api_client.get(reverse("collection-list"))
+    assert resp.status_code == HTTP_200_OK
+
+    item = resp.json()[0]
+    assert "products_list" not in item
+    assert (item["products_count"], item["min_price"], item["max_price"]) == (3, "5.00", "5.00")
+
+
+@pytest.mark.django_db
+def test_collection_retrieve_pages_products(user_api_client):
+    collection = baker.make("Collection")
+    products = baker.make("Product", _quantity=5)
+    collection.products.add(*products)
+    url = reverse("collection-detail", args=[collection.id])
+
+    resp = user_api_client.get(url, {"products_page_size": 2})
+    assert resp.status_code == HTTP_200_OK
+    resp_json = resp.json()
+    assert [item["product_id"] for item in resp_json["products_list"]] == [product.id for product in products[:2]]
+    assert resp_json["products_page"]["count"] == 5
+    assert resp_json["products_page"]["previous"] is None
+
+    resp_json = user_api_client.get(resp_json["products_page"]["next"]).json()
+    resp_json = user_api_client.get(resp_json["products_page"]["next"]).json()
+    assert [item["product_id"] for item in resp_json["products_list"]] == [products[4].id]
+    assert resp_json["products_page"]["next"] is None
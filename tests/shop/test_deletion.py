@@ -0,0 +1,117 @@
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_202_ACCEPTED, HTTP_204_NO_CONTENT, HTTP_302_FOUND
+from jobs.models import Job, JobStatusChoices
+from jobs.queue import run_pending
+from shop.deletion import count_dependents, delete_in_chunks
+from shop.models import ChangeActionChoices, ChangeLog, Collection, CollectionProduct, OrderProductPosition, \
+    Product, ProductReview
+
+
+@pytest.fixture
+def popular_product(user):
+    """
+    Товар с отзывами, позициями заказов и двумя подборками
+    """
+    product = baker.make("Product", price=10)
+    baker.make("ProductReview", product=product, user=user, _quantity=5)
+    for order in baker.make("Order", user=user, total_cost=10, _quantity=4):
+        OrderProductPosition.objects.create(order=order, product=product, quantity=1)
+    for collection in baker.make("Collection", _quantity=2):
+        collection.products.add(product, baker.make("Product", price=50))
+    return product
+
+
+@pytest.mark.django_db
+def test_delete_in_chunks(popular_product):
+    product_id = popular_product.pk
+    collection_ids = list(CollectionProduct.objects.filter(product=popular_product).values_list("collection_id",
+                                                                                               flat=True))
+    reports = []
+
+    deleted = delete_in_chunks(popular_product, batch_size=2, progress=reports.append)
+
+    assert deleted["shop.ProductReview"] == 5
+    assert deleted["shop.OrderProductPosition"] == 4
+    assert deleted["shop.CollectionProduct"] == 2
+    assert deleted["shop.Product"] == 1
+    assert len(reports) > 3
+    assert not Product.objects.filter(pk=product_id).exists()
+    assert not ProductReview.objects.filter(product_id=product_id).exists()
+
+    deletions = ChangeLog.objects.filter(action=ChangeActionChoices.DELETE)
+    assert deletions.filter(entity="productreview").count() == 5
+    assert deletions.filter(entity="collectionproduct").count() == 2
+    assert deletions.filter(entity="product", object_id=product_id).exists()
+    for collection in Collection.objects.filter(pk__in=collection_ids):
+        assert (collection.products_count, collection.min_price) == (1, 50)
+
+
+@pytest.mark.django_db
+def test_count_dependents_is_bounded(popular_product):
+    assert count_dependents(popular_product, 100) == 12
+    assert count_dependents(popular_product, 3) == 4
+
+
+@pytest.mark.django_db
+def test_destroy_small_product_inline(admin_api_client):
+    product = baker.make("Product", price=10)
+    resp = admin_api_client.delete(reverse("product-detail", args=[product.id]))
+    assert resp.status_code == HTTP_204_NO_CONTENT
+    assert not Product.objects.filter(pk=product.pk).exists()
+
+
+@pytest.mark.django_db
+def test_destroy_popular_product_in_background(settings, admin_api_client, popular_product):
+    settings.CHUNKED_DELETE_INLINE_LIMIT = 5
+    settings.CHUNKED_DELETE_BATCH_SIZE = 2
+
+    resp = admin_api_client.delete(reverse("product-detail", args=[popular_product.id]))
+    assert resp.status_code == HTTP_202_ACCEPTED
+    assert Product.objects.filter(pk=popular_product.pk).exists()
+
+    assert run_pending() == 1
+    job = Job.objects.get(pk=resp.json()["job"])
+    assert job.status == JobStatusChoices.DONE
+    assert job.progress["deleted"]["shop.Product"] == 1
+    assert job.progress["deleted"]["shop.ProductReview"] == 5
+    assert not Product.objects.filter(pk=popular_product.pk).exists()
+
+
+@pytest.mark.django_db
+def test_destroy_collection(settings, admin_api_client):
+    settings.CHUNKED_DELETE_INLINE_LIMIT = 1
+    collection = baker.make("Collection")
+    collection.products.add(*baker.make("Product", price=10, _quantity=3))
+
+    resp = admin_api_client.delete(reverse("collection-detail", args=[collection.id]))
+    assert resp.status_code == HTTP_202_ACCEPTED
+    run_pending()
+    assert not Collection.objects.filter(pk=collection.pk).exists()
+    assert Product.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_admin_delete_product(settings, admin_client, popular_product):
+    settings.CHUNKED_DELETE_INLINE_LIMIT = 5
+    url = reverse("admin:shop_product_delete", args=[popular_product.id])
+
+    resp = admin_client.get(url)
+    assert resp.status_code == HTTP_200_OK
+    assert "зависимых строк: больше 5" in resp.content.decode()
+
+    resp = admin_client.post(url, {"post": "yes"})
+    assert resp.status_code == HTTP_302_FOUND
+    assert Job.objects.filter(task="shop.tasks.delete_in_background").count() == 1
+    run_pending()
+    assert not Product.objects.filter(pk=popular_product.pk).exists()
+
+
+@pytest.mark.django_db
+def test_delete_chunked_command(popular_product, capsys):
+    product_id = popular_product.pk
+    call_command("delete_chunked", "product", str(product_id), "--batch-size", "3")
+    assert "удален" in capsys.readouterr().out
+    assert not Product.objects.filter(pk=product_id).exists()
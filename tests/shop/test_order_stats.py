@@ -0,0 +1,84 @@
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_204_NO_CONTENT
+from shop.models import Order, UserOrderStats
+
+
+def stats_of(user):
+    stats = UserOrderStats.objects.get(user=user)
+    return stats.orders_count, round(stats.total_spent, 2), stats.last_order_date
+
+
+@pytest.mark.django_db
+def test_stats_follow_order_create_update_delete(user, user_api_client):
+    product = baker.make("Product", price=100, stock=None)
+    url = reverse("order-list")
+
+    resp = user_api_client.post(url, data={"positions": [{"product_id": product.id, "quantity": 2}]}, format="json")
+    assert resp.status_code == HTTP_201_CREATED
+    order = Order.objects.get(pk=resp.json()["id"])
+    assert stats_of(user) == (1, 200, order.created)
+
+    resp = user_api_client.post(url, data={"positions": [{"product_id": product.id, "quantity": 1}]}, format="json")
+    assert resp.status_code == HTTP_201_CREATED
+    assert stats_of(user)[:2] == (2, 300)
+
+    detail_url = reverse("order-detail", args=[order.id])
+    resp = user_api_client.patch(detail_url, data={"positions": [{"product_id": product.id, "quantity": 5}]},
+                                 format="json")
+    assert resp.status_code == HTTP_200_OK
+    assert stats_of(user)[:2] == (2, 600)
+
+    resp = user_api_client.delete(detail_url)
+    assert resp.status_code == HTTP_204_NO_CONTENT
+    assert stats_of(user)[:2] == (1, 100)
+
+
+@pytest.mark.django_db
+def test_stats_after_bulk_orders(user, user_api_client):
+    product = baker.make("Product", price=50, stock=None)
+    payload = {"orders": [{"positions": [{"product_id": product.id, "quantity": quantity}]} for quantity in (1, 2, 3)]}
+
+    resp = user_api_client.post(reverse("order-bulk-create"), data=payload, format="json")
+    assert resp.status_code == HTTP_201_CREATED
+    assert stats_of(user)[:2] == (3, 300)
+
+
+@pytest.mark.django_db
+def test_profile_returns_stats_without_aggregation(user, user_api_client):
+    baker.make("Order", user=user, total_cost=120, _quantity=3)
+    url = f"/api/v1/profiles/{user.id}/"
+
+    with CaptureQueriesContext(connection) as queries:
+        resp = user_api_client.get(url)
+    assert resp.status_code == HTTP_200_OK
+    assert resp.json()["order_stats"]["orders_count"] == 3
+    assert resp.json()["order_stats"]["total_spent"] == 360
+    assert not any("COUNT(" in query["sql"] or "SUM(" in query["sql"] for query in queries.captured_queries)
+
+
+@pytest.mark.django_db
+def test_profile_without_orders(user, user_api_client):
+    resp = user_api_client.get(f"/api/v1/profiles/{user.id}/")
+    assert resp.status_code == HTTP_200_OK
+    assert resp.json()["order_stats"] == {"orders_count": 0, "total_spent": 0.0, "last_order_date": None}
+
+
+@pytest.mark.django_db
+def test_check_order_stats_finds_and_fixes_drift(user, another_user):
+    baker.make("Order", user=user, total_cost=10, _quantity=2)
+    # изменения в обход сигналов: сводки расходятся с заказами
+    Order.objects.filter(user=user).update(total_cost=30)
+    UserOrderStats.objects.create(user=another_user, orders_count=4, total_spent=99)
+
+    with pytest.raises(CommandError):
+        call_command("check_order_stats")
+
+    call_command("check_order_stats", "--fix")
+    assert stats_of(user)[:2] == (2, 60)
+    assert not UserOrderStats.objects.filter(user=another_user).exists()
+    call_command("check_order_stats")
@@ -0,0 +1,74 @@
+import pytest
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST, HTTP_403_FORBIDDEN, HTTP_409_CONFLICT
+from shop.models import Order, OrderOutboxEvent, OrderStatusChoices, StockReservation
+
+
+@pytest.mark.django_db
+def test_order_invalid_transition(admin_api_client, order_factory):
+    order = order_factory(min_amount=1, max_amount=1, status=OrderStatusChoices.NEW)[0]
+
+    resp = admin_api_client.patch(reverse("order-detail", args=[order.id]),
+                                  data={"status": OrderStatusChoices.DONE}, format="json")
+    assert resp.status_code == HTTP_400_BAD_REQUEST
+    order.refresh_from_db()
+    assert order.status == OrderStatusChoices.NEW
+
+
+@pytest.mark.django_db
+def test_order_update_increments_version(admin_api_client, order_factory):
+    order = order_factory(min_amount=1, max_amount=1, status=OrderStatusChoices.NEW)[0]
+
+    resp = admin_api_client.patch(reverse("order-detail", args=[order.id]),
+                                  data={"status": OrderStatusChoices.IN_PROGRESS, "version": 0}, format="json")
+    assert resp.status_code == HTTP_200_OK
+    assert resp.json()["version"] == 1
+    assert resp.json()["status"] == OrderStatusChoices.IN_PROGRESS
+
+
+@pytest.mark.django_db
+def test_order_stale_version_conflict(admin_api_client, order_factory):
+    order = order_factory(min_amount=1, max_amount=1, status=OrderStatusChoices.NEW)[0]
+    Order.objects.filter(id=order.id).update(version=3)
+
+    resp = admin_api_client.patch(reverse("order-detail", args=[order.id]),
+                                  data={"status": OrderStatusChoices.IN_PROGRESS, "version": 2}, format="json")
+    assert resp.status_code == HTTP_409_CONFLICT
+    order.refresh_from_db()
+    assert order.status == OrderStatusChoices.NEW and order.version == 3
+
+
+@pytest.mark.django_db
+def test_bulk_transition(admin_api_client, order_factory):
+    new_orders = order_factory(min_amount=3, max_amount=3, status=OrderStatusChoices.NEW)
+    done_order = order_factory(min_amount=1, max_amount=1, status=OrderStatusChoices.DONE)[0]
+    ids = [order.id for order in new_orders] + [done_order.id, 999999]
+
+    resp = admin_api_client.post(reverse("order-transition"),
+                                 data={"ids": ids, "status": OrderStatusChoices.IN_PROGRESS}, format="json")
+    assert resp.status_code == HTTP_200_OK
+    assert resp.json() == {"updated": sorted(order.id for order in new_orders), "skipped": [done_order.id, 999999]}
+
+    moved = Order.objects.filter(id__in=[order.id for order in new_orders])
+    assert all(order.status == OrderStatusChoices.IN_PROGRESS and order.version == 1 for order in moved)
+    assert OrderOutboxEvent.objects.filter(order_id__in=resp.json()["updated"]).count() == 3
+
+
+@pytest.mark.django_db
+def test_bulk_transition_skips_expired_reservations(admin_api_client, order_factory):
+    order = order_factory(min_amount=1, max_amount=1, status=OrderStatusChoices.NEW)[0]
+    baker.make(StockReservation, order=order, released=True)
+
+    resp = admin_api_client.post(reverse("order-transition"),
+                                 data={"ids": [order.id], "status": OrderStatusChoices.IN_PROGRESS}, format="json")
+    assert resp.json() == {"updated": [], "skipped": [order.id]}
+
+
+@pytest.mark.django_db
+def test_bulk_transition_forbidden_for_user(user_api_client, order_factory):
+    order = order_factory(min_amount=1, max_amount=1, status=OrderStatusChoices.NEW)[0]
+
+    resp = user_api_client.post(reverse("order-transition"),
+                                data={"ids": [order.id], "status": OrderStatusChoices.IN_PROGRESS}, format="json")
+    assert resp.status_code == HTTP_403_FORBIDDEN
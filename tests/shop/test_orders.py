@@ -2,7 +2,8 @@ import pytest
 from django.urls import reverse
 import random
 from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_404_NOT_FOUND, HTTP_204_NO_CONTENT
-from shop.models import OrderStatusChoices
+from shop import views
+from shop.models import Order, OrderStatusChoices
 
 
 @pytest.mark.django_db
@@ -191,3 +192,14 @@ def test_order_delete_by_admin(order_factory, admin_api_client):
     existing_ids = [order["id"] for order in admin_api_client.get(reverse("order-list")).json()]
     assert random_order.id not in existing_ids
 
+
+
+@pytest.mark.django_db
+def test_order_create_rolled_back_if_enqueue_fails(monkeypatch, user_api_client, order_create_payload):
+    def broken_enqueue(*args, **kwargs):
+        raise RuntimeError("очередь недоступна")
+
+    monkeypatch.setattr(views, "enqueue", broken_enqueue)
+    with pytest.raises(RuntimeError):
+        user_api_client.post(reverse("order-list"), data=order_create_payload, format="json")
+    assert not Order.objects.exists()
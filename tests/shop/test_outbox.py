@@ -0,0 +1,116 @@
+import json
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED
+from shop.models import OrderOutboxEvent, OrderEventTypeChoices, OrderStatusChoices
+from shop.outbox import CallableSink, OutboxWorker, drain_batch
+
+delivered_messages = []
+
+
+def collect(messages):
+    delivered_messages.extend(messages)
+
+
+def fail(messages):
+    raise ConnectionError("sink is down")
+
+
+@pytest.mark.django_db
+def test_order_create_writes_outbox_event(user_api_client, order_create_payload):
+    resp = user_api_client.post(reverse("order-list"), data=order_create_payload, format="json")
+    assert resp.status_code == HTTP_201_CREATED
+
+    event = OrderOutboxEvent.objects.get()
+    assert event.event_type == OrderEventTypeChoices.CREATED
+    assert event.payload["order_id"] == resp.json()["id"]
+    assert event.payload["positions"] == order_create_payload["positions"]
+
+
+@pytest.mark.django_db
+def test_order_status_change_writes_outbox_event(admin_api_client, order_factory):
+    order = order_factory(min_amount=1, max_amount=1, status=OrderStatusChoices.NEW)[0]
+
+    resp = admin_api_client.patch(reverse("order-detail", args=[order.id]),
+                                  data={"status": OrderStatusChoices.IN_PROGRESS}, format="json")
+    assert resp.status_code == HTTP_200_OK
+
+    event = OrderOutboxEvent.objects.get(event_type=OrderEventTypeChoices.STATUS_CHANGED)
+    assert event.payload["previous_status"] == OrderStatusChoices.NEW
+    assert event.payload["status"] == OrderStatusChoices.IN_PROGRESS
+
+
+@pytest.mark.django_db
+def test_outbox_callable_sink_delivers_in_batches(user_api_client, order_create_payload):
+    for _ in range(3):
+        user_api_client.post(reverse("order-list"), data=order_create_payload, format="json")
+    delivered_messages.clear()
+
+    worker = OutboxWorker(CallableSink(collect), batch_size=2)
+    while worker.run_once():
+        pass
+
+    assert len(delivered_messages) == 3
+    assert worker.stats()["delivered"] == 3 and worker.stats()["batches"] == 2
+    assert not OrderOutboxEvent.objects.filter(delivered_at__isnull=True).exists()
+
+
+@pytest.mark.django_db
+def test_outbox_failed_delivery_is_retried_later(user_api_client, order_create_payload, settings):
+    settings.OUTBOX_MAX_ATTEMPTS = 2
+    user_api_client.post(reverse("order-list"), data=order_create_payload, format="json")
+
+    worker = OutboxWorker(CallableSink(fail))
+    assert worker.run_once() == 1
+    event = OrderOutboxEvent.objects.get()
+    assert event.attempts == 1 and event.next_attempt_at is not None and "sink is down" in event.last_error
+
+    assert worker.run_once() == 0
+
+    OrderOutboxEvent.objects.update(next_attempt_at=event.created)
+    worker.run_once()
+    event.refresh_from_db()
+    assert event.attempts == 2 and event.next_attempt_at is None and event.delivered_at is None
+
+
+@pytest.mark.django_db
+def test_outbox_claimed_batch_is_leased_during_delivery(user_api_client, order_create_payload):
+    user_api_client.post(reverse("order-list"), data=order_create_payload, format="json")
+    seen_by_other_worker = []
+
+    def deliver(messages):
+        # пока пакет доставляется, другой обработчик его не получает
+        seen_by_other_worker.append(drain_batch(CallableSink(collect), 10))
+
+    assert drain_batch(CallableSink(deliver), 10) == (1, 0)
+    assert seen_by_other_worker == [(0, 0)]
+    assert OrderOutboxEvent.objects.get().delivered_at is not None
+
+
+@pytest.mark.django_db
+def test_outbox_lease_expires_after_worker_crash(user_api_client, order_create_payload, settings):
+    settings.OUTBOX_LEASE_SECONDS = 0
+    user_api_client.post(reverse("order-list"), data=order_create_payload, format="json")
+
+    def crash(messages):
+        raise SystemExit
+
+    with pytest.raises(SystemExit):
+        drain_batch(CallableSink(crash), 10)
+
+    delivered_messages.clear()
+    assert drain_batch(CallableSink(collect), 10) == (1, 0)
+    assert len(delivered_messages) == 1
+
+
+@pytest.mark.django_db
+def test_drain_order_outbox_command_file_sink(user_api_client, order_create_payload, tmp_path):
+    user_api_client.post(reverse("order-list"), data=order_create_payload, format="json")
+    path = tmp_path / "orders.jsonl"
+
+    call_command("drain_order_outbox", f"file:{path}", "--once")
+
+    lines = path.read_text().splitlines()
+    assert [json.loads(line)["event_type"] for line in lines] == [OrderEventTypeChoices.CREATED]
@@ -0,0 +1,129 @@
+import gzip
+from datetime import date
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED
+from shop.models import Order, OrderProductPosition, StockReservation
+from shop.partitions import add_months, archive_partitions, convert_to_partitioned, create_partitions, \
+    is_partitioned, list_partitions, model_references, partition_name
+
+
+def test_partition_months():
+    assert add_months(date(2026, 11, 1), 2) == date(2027, 1, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+    assert partition_name("shop_order", date(2026, 3, 1)) == "shop_order_y2026m03"
+
+
+def test_model_references():
+    assert model_references() == {("order_product_position", "order_id", "shop_order"),
+                                  ("stock_reservation", "order_id", "shop_order")}
+
+
+@pytest.mark.django_db
+def test_position_created_follows_order(user_api_client, order_create_payload):
+    resp = user_api_client.post(reverse("order-list"), data=order_create_payload, format="json")
+    assert resp.status_code == HTTP_201_CREATED
+
+    order = Order.objects.get(id=resp.json()["id"])
+    assert {position.created for position in order.positions.all()} == {order.created}
+
+
+@pytest.mark.django_db
+def test_position_save_does_not_read_order(user, django_assert_num_queries):
+    order = baker.make("Order", user=user, total_cost=10)
+    Order.objects.filter(pk=order.pk).update(created=date(2021, 6, 22))
+    order.refresh_from_db()
+    product = baker.make("Product", price=10)
+    new_position = OrderProductPosition(order_id=order.id, product=product, quantity=1)
+    new_position.save()
+    assert new_position.created == order.created
+
+    position = OrderProductPosition.objects.get(pk=new_position.pk)
+    position.quantity = 2
+    with django_assert_num_queries(1):
+        position.save()
+    assert position.created == order.created
+
+
+@pytest.mark.django_db
+def test_order_filter_by_created_filters_positions(user_api_client, order_factory):
+    order = order_factory(min_amount=1, max_amount=1)[0]
+    OrderProductPosition.objects.filter(order=order).update(created=date(2020, 1, 1))
+    today = order.created.isoformat()
+
+    resp = user_api_client.get(reverse("order-list"), {"created_after": today, "created_before": today})
+    assert resp.status_code == HTTP_200_OK
+    assert [item["id"] for item in resp.json()] == [order.id]
+    assert resp.json()[0]["positions"] == []
+
+
+@pytest.mark.django_db
+def test_order_partitions_command_requires_postgresql():
+    if connection.vendor == "postgresql":
+        pytest.skip("проверка для баз без секционирования")
+    with pytest.raises(CommandError):
+        call_command("order_partitions")
+
+
+@pytest.mark.skipif(connection.vendor != "postgresql", reason="секционирование поддерживается только PostgreSQL")
+@pytest.mark.django_db(transaction=True)
+def test_convert_create_and_archive_partitions(user, tmp_path):
+    old = baker.make("Order", user=user, total_cost=1)
+    Order.objects.filter(id=old.id).update(created=date(2020, 1, 15))
+    baker.make("OrderProductPosition", order=old, quantity=1)
+    OrderProductPosition.objects.filter(order=old).update(created=date(2020, 1, 15))
+    recent = baker.make("Order", user=user, total_cost=1)
+
+    convert_to_partitioned(months_ahead=1)
+    assert is_partitioned("shop_order") and is_partitioned("order_product_position")
+    assert set(Order.objects.values_list("id", flat=True)) == {old.id, recent.id}
+    assert create_partitions(months_ahead=1) == []
+
+    archived = archive_partitions(date(2020, 2, 1), directory=str(tmp_path))
+    assert archived == ["order_product_position_y2020m01", "shop_order_y2020m01"]
+    assert list(Order.objects.values_list("id", flat=True)) == [recent.id]
+    assert date(2020, 1, 1) not in dict(list_partitions("shop_order"))
+    with gzip.open(tmp_path / "shop_order_y2020m01.csv.gz", "rt") as file:
+        assert len(file.read().splitlines()) == 2
+
+
+@pytest.mark.skipif(connection.vendor != "postgresql", reason="секционирование поддерживается только PostgreSQL")
+@pytest.mark.django_db(transaction=True)
+def test_partitioned_orders_keep_references(user):
+    order = baker.make("Order", user=user, total_cost=1)
+    product = baker.make("Product", stock=1)
+    convert_to_partitioned(months_ahead=1)
+
+    with pytest.raises(IntegrityError), transaction.atomic():
+        StockReservation.objects.create(order_id=order.id + 1000, product=product, quantity=1,
+                                        expires_at=timezone.now())
+    StockReservation.objects.create(order=order, product=product, quantity=1, expires_at=timezone.now())
+    with pytest.raises(IntegrityError), transaction.atomic():
+        Order.objects.filter(id=order.id)._raw_delete(connection.alias)
+    order.delete()
+    assert not StockReservation.objects.exists()
+
+
+@pytest.mark.skipif(connection.vendor != "postgresql", reason="секционирование поддерживается только PostgreSQL")
+@pytest.mark.django_db(transaction=True)
+def test_create_partition_moves_rows_from_default(user):
+    convert_to_partitioned(months_ahead=1)
+    future = baker.make("Order", user=user, total_cost=1)
+    Order.objects.filter(id=future.id).update(created=date(2040, 5, 10))
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM shop_order_default")
+        assert cursor.fetchone()[0] == 1
+
+    assert "shop_order_y2040m05" in create_partitions(months_ahead=0, today=date(2040, 5, 1))
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM shop_order_y2040m05")
+        assert cursor.fetchone()[0] == 1
+        cursor.execute("SELECT count(*) FROM shop_order_default")
+        assert cursor.fetchone()[0] == 0
+    assert Order.objects.filter(id=future.id).exists()
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+from shop.models import Product, ProductPrice
+
+
+def set_price(product, price, valid_from):
+    """
+    Меняет цену товара и переносит записанную строку истории на момент valid_from
+    """
+    product.price = price
+    product.save()
+    ProductPrice.objects.filter(pk=product.price_history.latest("id").pk).update(valid_from=valid_from)
+
+
+@pytest.fixture
+def priced_product():
+    """
+    Товар с ценами 100 (с 1 января), 120 (с 1 февраля) и 90 (с 1 марта)
+    """
+    product = baker.make("Product", price=100)
+    ProductPrice.objects.filter(product=product).update(valid_from=timezone.make_aware(datetime(2026, 1, 1)))
+    set_price(product, 120, timezone.make_aware(datetime(2026, 2, 1)))
+    set_price(product, 90, timezone.make_aware(datetime(2026, 3, 1)))
+    return product
+
+
+@pytest.mark.django_db
+def test_price_change_is_recorded():
+    product = baker.make("Product", price=100)
+    assert list(product.price_history.values_list("price", flat=True)) == [Decimal(100)]
+
+    product.name = "new name"
+    product.save()
+    product.stock = 5
+    product.save(update_fields=["stock"])
+    assert product.price_history.count() == 1
+
+    product.price = 150
+    product.save()
+    assert list(product.price_history.order_by("id").values_list("price", flat=True)) == [Decimal(100), Decimal(150)]
+
+
+@pytest.mark.django_db
+def test_record_changes_catches_up_queryset_updates():
+    products = baker.make("Product", price=10, _quantity=3)
+    Product.objects.filter(pk=products[0].pk).update(price=20)
+
+    assert ProductPrice.record_changes(Product.objects.all(), batch_size=1) == 1
+    assert ProductPrice.record_changes(Product.objects.all()) == 0
+
+
+@pytest.mark.django_db
+def test_as_of(priced_product):
+    def price_on(*day):
+        product = ProductPrice.as_of(timezone.make_aware(datetime(*day)), Product.objects.filter(pk=priced_product.pk))
+        return product.get().price_at if product.exists() else None
+
+    assert price_on(2025, 12, 31) is None
+    assert price_on(2026, 1, 15) == 100
+    assert price_on(2026, 2, 1) == 120
+    assert price_on(2026, 4, 1) == 90
+
+
+@pytest.mark.django_db
+def test_price_series_endpoint(client, priced_product):
+    url = reverse("product-prices", args=[priced_product.id])
+
+    resp = client.get(url, {"limit": 2})
+    assert resp.status_code == HTTP_200_OK
+    resp_json = resp.json()
+    assert [row["price"] for row in resp_json["results"]] == ["100.00", "120.00"]
+    assert resp_json["has_more"]
+
+    resp = client.get(url, {"limit": 2, "after": resp_json["next"]})
+    assert [row["price"] for row in resp.json()["results"]] == ["90.00"]
+    assert not resp.json()["has_more"]
+
+    resp = client.get(url, {"from": "2026-01-02", "to": "2026-02-01"})
+    assert [row["price"] for row in resp.json()["results"]] == ["120.00"]
+
+    resp = client.get(url, {"from": "yesterday"})
+    assert resp.status_code == HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_prices_as_of_endpoint(client, priced_product):
+    other = baker.make("Product", price=5)
+    url = reverse("product-prices-as-of")
+
+    resp = client.get(url, {"at": "2026-02-15"})
+    assert resp.status_code == HTTP_200_OK
+    assert resp.json()["results"] == [{"product_id": priced_product.id, "price": "120.00"}]
+
+    now = (timezone.now() + timedelta(minutes=1)).isoformat()
+    resp = client.get(url, {"at": now, "limit": 1})
+    assert resp.json()["results"] == [{"product_id": priced_product.id, "price": "90.00"}]
+    assert resp.json()["has_more"]
+    resp = client.get(url, {"at": now, "since": resp.json()["next"]})
+    assert resp.json()["results"] == [{"product_id": other.id, "price": "5.00"}]
+
+    resp = client.get(url, {"at": now, "ids": f"{other.id}"})
+    assert [row["product_id"] for row in resp.json()["results"]] == [other.id]
+
+    assert client.get(url).status_code == HTTP_400_BAD_REQUEST
@@ -0,0 +1,51 @@
+import pytest
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+
+
+@pytest.fixture
+def catalog(user):
+    cheap, middle, expensive = (baker.make("Product", price=price) for price in (100, 700, 20000))
+    baker.make("ProductReview", user=user, product=cheap, rating=5)
+    baker.make("ProductReview", user=user, product=middle, rating=4)
+    baker.make("ProductReview", user=user, product=middle, rating=3)
+    return cheap, middle, expensive
+
+
+@pytest.mark.django_db
+def test_product_facets(client, catalog, django_assert_num_queries):
+    with django_assert_num_queries(2):
+        resp = client.get(reverse("product-list"), {"facets": "price,rating"})
+    assert resp.status_code == HTTP_200_OK
+
+    resp_json = resp.json()
+    assert {product["id"] for product in resp_json["results"]} == {product.id for product in catalog}
+    assert resp_json["facets"] == {
+        "price": {"0-500": 1, "500-1000": 1, "1000-5000": 0, "5000-10000": 0, "10000-": 1},
+        "rating": {"1": 0, "2": 0, "3": 1, "4": 0, "5": 1, "none": 1},
+    }
+
+
+@pytest.mark.django_db
+def test_product_facets_use_filters(client, catalog):
+    resp = client.get(reverse("product-list"), {"facets": "rating", "price_max": 1000})
+    assert resp.status_code == HTTP_200_OK
+
+    resp_json = resp.json()
+    assert len(resp_json["results"]) == 2
+    assert resp_json["facets"] == {"rating": {"1": 0, "2": 0, "3": 1, "4": 0, "5": 1, "none": 0}}
+
+
+@pytest.mark.django_db
+def test_product_filter_by_rating(client, catalog):
+    cheap, middle, expensive = catalog
+
+    resp = client.get(reverse("product-list"), {"rating_min": 4})
+    assert [product["id"] for product in resp.json()] == [cheap.id]
+
+
+@pytest.mark.django_db
+def test_product_unknown_facet(client):
+    resp = client.get(reverse("product-list"), {"facets": "price,color"})
+    assert resp.status_code == HTTP_400_BAD_REQUEST
@@ -0,0 +1,103 @@
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_404_NOT_FOUND
+from shop.models import OrderProductPosition, RelatedProduct, RelatedProductsState
+from shop.recommendations import build_related_products
+
+
+def make_order(user, *products):
+    order = baker.make("Order", user=user, total_cost=1)
+    for product in products:
+        baker.make("OrderProductPosition", order=order, product=product, quantity=1)
+    return order
+
+
+@pytest.mark.django_db
+def test_related_products_endpoint(client, user):
+    first, second, third, other = baker.make("Product", _quantity=4)
+    make_order(user, first, second, third)
+    make_order(user, first, second)
+    make_order(user, other)
+
+    call_command("build_related_products", "--full")
+
+    resp = client.get(reverse("product-related", args=[first.id]))
+    assert resp.status_code == HTTP_200_OK
+    assert [(item["product"]["id"], item["score"]) for item in resp.json()] == [(second.id, 2), (third.id, 1)]
+    assert client.get(reverse("product-related", args=[other.id])).json() == []
+
+
+@pytest.mark.django_db
+def test_related_products_incremental_refresh(user):
+    first, second, third = baker.make("Product", _quantity=3)
+    order = make_order(user, first, second)
+    assert build_related_products() == (2, 2)
+
+    baker.make("OrderProductPosition", order=order, product=third, quantity=1)
+    make_order(user, second, third)
+    assert build_related_products() == (3, 3)
+    assert build_related_products() == (0, 0)
+
+    scores = {(item.product_id, item.related_id): item.score for item in RelatedProduct.objects.all()}
+    assert scores[(first.id, second.id)] == 1
+    assert scores[(second.id, third.id)] == 2
+    assert scores[(first.id, third.id)] == 1
+
+    build_related_products(full=True)
+    assert {(item.product_id, item.related_id): item.score for item in RelatedProduct.objects.all()} == scores
+
+
+@pytest.mark.django_db
+def test_related_products_late_commit_counted(user):
+    """
+    Позиция с меньшим id, появившаяся после пересчета (транзакция зафиксирована позже), учитывается
+    """
+    first, second, third = baker.make("Product", _quantity=3)
+    make_order(user, first, second)
+    late_order = make_order(user, second, third)
+    make_order(user, first, third)
+    late = list(late_order.positions.values("id", "product_id", "quantity"))
+    OrderProductPosition.objects.filter(order=late_order).delete()
+
+    build_related_products()
+    assert RelatedProductsState.objects.get().gaps == [[late[0]["id"], late[1]["id"]]]
+    assert not RelatedProduct.objects.filter(product=second, related=third).exists()
+
+    OrderProductPosition.objects.bulk_create(OrderProductPosition(order=late_order, **position) for position in late)
+    assert build_related_products() == (2, 2)
+    assert RelatedProduct.objects.get(product=second, related=third).score == 1
+    assert RelatedProductsState.objects.get().gaps == []
+
+
+@pytest.mark.django_db
+def test_related_products_gaps_settle_after_lag(user, settings):
+    settings.RECOMMENDATIONS_LAG_SECONDS = 0
+    first, second = baker.make("Product", _quantity=2)
+    make_order(user, first, second)
+    OrderProductPosition.objects.filter(pk=make_order(user, first).positions.get().pk).delete()
+    make_order(user, second)
+
+    build_related_products()
+    state = RelatedProductsState.objects.get()
+    assert state.gaps == [] and state.marks == []
+
+
+@pytest.mark.django_db
+def test_related_products_top_k(user):
+    product, *others = baker.make("Product", _quantity=5)
+    for count, other in enumerate(others, start=1):
+        for _ in range(count):
+            make_order(user, product, other)
+
+    build_related_products(top=2)
+
+    assert list(RelatedProduct.objects.filter(product=product).values_list("related_id", "score")) == [
+        (others[3].id, 4), (others[2].id, 3),
+    ]
+
+
+@pytest.mark.django_db
+def test_related_products_unknown_product(client):
+    assert client.get(reverse("product-related", args=[999999])).status_code == HTTP_404_NOT_FOUND
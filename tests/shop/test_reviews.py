@@ -1,7 +1,11 @@
 import pytest
 from django.urls import reverse
 import random
-from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_403_FORBIDDEN, HTTP_204_NO_CONTENT
+from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_403_FORBIDDEN, HTTP_204_NO_CONTENT, \
+    HTTP_404_NOT_FOUND
+from api_shop.db import routers
+from shop.models import ChangeLog, ProductReview
+from shop.ownership import delete_returning, owned_by, update_returning
 
 
 
@@ -167,4 +171,46 @@ def test_review_delete_by_another_user(review_factory, another_user_api_client,
     url = reverse("review-detail", args=[random_review.id])
 
     resp = another_user_api_client.delete(url)
-    assert resp.status_code == HTTP_403_FORBIDDEN
\ No newline at end of file
+    assert resp.status_code == HTTP_403_FORBIDDEN
+
+@pytest.mark.django_db
+def test_review_update_by_owner_in_one_statement(review_factory, user_api_client, django_assert_num_queries):
+    review = review_factory(min_amount=1, max_amount=1)[0]
+    url = reverse("review-detail", args=[review.id])
+
+    # токен, UPDATE ... RETURNING, запись в журнал изменений каталога
+    with django_assert_num_queries(3):
+        resp = user_api_client.patch(url, data={"rating": 2})
+    assert resp.status_code == HTTP_200_OK
+    assert resp.json()["rating"] == 2
+    assert ChangeLog.objects.filter(entity="productreview", object_id=review.id, action="update").exists()
+
+
+@pytest.mark.django_db
+def test_review_delete_by_owner_logs_change(review_factory, user_api_client):
+    review = review_factory(min_amount=1, max_amount=1)[0]
+
+    resp = user_api_client.delete(reverse("review-detail", args=[review.id]))
+    assert resp.status_code == HTTP_204_NO_CONTENT
+    assert not ProductReview.objects.filter(id=review.id).exists()
+    assert ChangeLog.objects.filter(entity="productreview", object_id=review.id, action="delete").exists()
+
+
+@pytest.mark.django_db
+def test_review_update_missing(user_api_client):
+    resp = user_api_client.patch(reverse("review-detail", args=[999999]), data={"rating": 2})
+    assert resp.status_code == HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db(transaction=True)
+def test_owned_review_written_to_primary(settings, monkeypatch, review_factory, user):
+    # вне запроса и транзакции чтение идет с реплики; изменение должно выполняться в основной базе
+    settings.DATABASE_REPLICAS = ["replica"]
+    monkeypatch.setattr(routers, "replica_available", lambda alias: True)
+    review = review_factory(min_amount=1, max_amount=1)[0]
+    reviews = owned_by(ProductReview.objects.filter(pk=review.pk), user)
+    assert reviews.db == "replica"
+
+    assert update_returning(reviews, {"text": "Изменено"}).text == "Изменено"
+    assert delete_returning(reviews).pk == review.pk
+    assert not ProductReview.objects.using("default").filter(pk=review.pk).exists()
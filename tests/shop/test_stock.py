@@ -0,0 +1,135 @@
+import threading
+
+import pytest
+from django.core.management import call_command
+from django.db import connection, connections
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_400_BAD_REQUEST, HTTP_204_NO_CONTENT
+from rest_framework.test import APIClient
+from shop.models import Order, StockReservation, OrderStatusChoices
+
+
+def order_payload(*positions):
+    return {"positions": [{"product_id": product.id, "quantity": quantity} for product, quantity in positions]}
+
+
+@pytest.mark.django_db
+def test_order_create_reserves_stock(user_api_client):
+    product = baker.make("Product", stock=5)
+    untracked = baker.make("Product", stock=None)
+
+    resp = user_api_client.post(reverse("order-list"), data=order_payload((product, 2), (untracked, 100)),
+                                format="json")
+    assert resp.status_code == HTTP_201_CREATED
+
+    product.refresh_from_db()
+    assert product.stock == 3
+    reservation = StockReservation.objects.get()
+    assert reservation.product_id == product.id and reservation.quantity == 2 and not reservation.released
+
+
+@pytest.mark.django_db
+def test_order_create_out_of_stock_reserves_nothing(user_api_client):
+    first, second = baker.make("Product", stock=5), baker.make("Product", stock=1)
+
+    resp = user_api_client.post(reverse("order-list"), data=order_payload((first, 2), (second, 2)), format="json")
+    assert resp.status_code == HTTP_400_BAD_REQUEST
+
+    first.refresh_from_db()
+    second.refresh_from_db()
+    assert (first.stock, second.stock) == (5, 1)
+    assert not Order.objects.exists() and not StockReservation.objects.exists()
+
+
+@pytest.mark.django_db
+def test_order_update_adjusts_reservation(user_api_client):
+    product = baker.make("Product", stock=10)
+    order_id = user_api_client.post(reverse("order-list"), data=order_payload((product, 2)), format="json").json()["id"]
+    url = reverse("order-detail", args=[order_id])
+
+    assert user_api_client.patch(url, data=order_payload((product, 5)), format="json").status_code == HTTP_200_OK
+    product.refresh_from_db()
+    assert product.stock == 5 and StockReservation.objects.get().quantity == 5
+
+    assert user_api_client.patch(url, data=order_payload((product, 1)), format="json").status_code == HTTP_200_OK
+    product.refresh_from_db()
+    assert product.stock == 9 and StockReservation.objects.get().quantity == 1
+
+    resp = user_api_client.patch(url, data=order_payload((product, 50)), format="json")
+    assert resp.status_code == HTTP_400_BAD_REQUEST
+    product.refresh_from_db()
+    assert product.stock == 9
+
+
+@pytest.mark.django_db
+def test_expired_reservation_released_and_reserved_again_on_confirm(user_api_client, admin_api_client):
+    product = baker.make("Product", stock=3)
+    order_id = user_api_client.post(reverse("order-list"), data=order_payload((product, 3)), format="json").json()["id"]
+    StockReservation.objects.update(expires_at=timezone.now())
+
+    call_command("release_expired_reservations")
+    product.refresh_from_db()
+    assert product.stock == 3 and StockReservation.objects.get().released
+
+    resp = admin_api_client.patch(reverse("order-detail", args=[order_id]),
+                                  data={"status": OrderStatusChoices.IN_PROGRESS}, format="json")
+    assert resp.status_code == HTTP_200_OK
+    product.refresh_from_db()
+    assert product.stock == 0 and not StockReservation.objects.exists()
+
+
+@pytest.mark.django_db
+def test_order_delete_releases_stock(user_api_client):
+    product = baker.make("Product", stock=4)
+    order_id = user_api_client.post(reverse("order-list"), data=order_payload((product, 4)), format="json").json()["id"]
+
+    assert user_api_client.delete(reverse("order-detail", args=[order_id])).status_code == HTTP_204_NO_CONTENT
+    product.refresh_from_db()
+    assert product.stock == 4
+
+
+@pytest.mark.skipif(connection.vendor != "postgresql", reason="нужны параллельные транзакции PostgreSQL")
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_checkout_does_not_oversell(django_user_model):
+    """
+    Покупатели заказывают пересекающиеся наборы товаров с позициями в прямом и обратном порядке:
+    строки товаров блокируются в одном порядке, поэтому взаимных блокировок (и ответов 500) нет
+    """
+    stock, buyers = 50, 40
+    products = baker.make("Product", stock=stock, _quantity=3)
+    users = [django_user_model.objects.create(username=f"buyer{i}") for i in range(buyers)]
+    first, second, third = products
+    payloads = [order_payload(*((product, 2) for product in products)),
+                order_payload(*((product, 2) for product in reversed(products))),
+                order_payload((first, 2), (second, 2)),
+                order_payload((third, 2), (second, 2)),
+                order_payload((third, 2), (first, 2)),
+                ]
+    statuses = []
+    barrier = threading.Barrier(buyers)
+
+    def checkout(user, payload):
+        client = APIClient()
+        client.force_authenticate(user)
+        barrier.wait()
+        try:
+            statuses.append(client.post(reverse("order-list"), data=payload, format="json").status_code)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=checkout, args=(user, payloads[number % len(payloads)]))
+               for number, user in enumerate(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+
+    assert len(statuses) == buyers
+    assert set(statuses) <= {HTTP_201_CREATED, HTTP_400_BAD_REQUEST}
+    assert statuses.count(HTTP_201_CREATED) == Order.objects.count()
+    for product in products:
+        product.refresh_from_db()
+        reserved = sum(StockReservation.objects.filter(product=product).values_list("quantity", flat=True))
+        assert product.stock >= 0 and product.stock + reserved == stock
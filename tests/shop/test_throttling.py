@@ -0,0 +1,88 @@
+import pytest
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK, HTTP_429_TOO_MANY_REQUESTS
+from rest_framework.test import APIRequestFactory
+from shop.throttling import LocalBuckets, TokenBucketThrottle
+
+
+@pytest.fixture
+def rates(settings):
+    settings.REST_FRAMEWORK = {
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {"products": "5/min", "products_anon": "2/min"},
+    }
+
+
+class View:
+    throttle_scope = "products"
+
+
+def make_throttle(now):
+    throttle = TokenBucketThrottle()
+    throttle.store = LocalBuckets()
+    throttle.timer = lambda: now[0]
+    return throttle
+
+
+def anonymous_request(address="10.0.0.1"):
+    request = APIRequestFactory().get("/", REMOTE_ADDR=address)
+    request.user = None
+    return request
+
+
+@pytest.mark.django_db
+def test_products_throttled_per_ip(client, rates):
+    url = reverse("product-list")
+    assert [client.get(url).status_code for _ in range(3)] == [HTTP_200_OK, HTTP_200_OK, HTTP_429_TOO_MANY_REQUESTS]
+    assert int(client.get(url)["Retry-After"]) > 0
+
+    assert client.get(url, REMOTE_ADDR="10.0.0.2").status_code == HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_products_throttled_per_user(client, user_api_client, rates):
+    url = reverse("product-list")
+    assert all(user_api_client.get(url).status_code == HTTP_200_OK for _ in range(5))
+    assert user_api_client.get(url).status_code == HTTP_429_TOO_MANY_REQUESTS
+    # анонимные запросы с того же адреса считаются отдельно
+    assert client.get(url).status_code == HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_other_views_not_throttled(client, rates):
+    url = reverse("collection-list")
+    assert all(client.get(url).status_code == HTTP_200_OK for _ in range(5))
+
+
+def test_bucket_refills(rates):
+    now = [0.0]
+    throttle = make_throttle(now)
+    assert throttle.allow_request(anonymous_request(), View())
+    assert throttle.allow_request(anonymous_request(), View())
+    assert not throttle.allow_request(anonymous_request(), View())
+    assert throttle.wait() == pytest.approx(30)
+
+    now[0] += 30
+    assert throttle.allow_request(anonymous_request(), View())
+
+
+def test_buckets_synced_between_processes(rates, settings):
+    settings.THROTTLE_SYNC_SECONDS = 0
+    now = [0.0]
+    first, second = make_throttle(now), make_throttle(now)
+    view = View()
+
+    assert [first.allow_request(anonymous_request(), view) for _ in range(3)] == [True, True, False]
+    # второй процесс узнает о расходе первого при синхронизации после своего запроса
+    assert [second.allow_request(anonymous_request(), view) for _ in range(2)] == [True, False]
+    assert first.allow_request(anonymous_request(), view) is False
+
+
+@pytest.mark.django_db
+def test_async_products_share_limit(client, rates):
+    assert client.get(reverse("product-list")).status_code == HTTP_200_OK
+    assert client.get(reverse("async-product-list")).status_code == HTTP_200_OK
+
+    resp = client.get(reverse("async-product-list"))
+    assert resp.status_code == HTTP_429_TOO_MANY_REQUESTS
+    assert int(resp["Retry-After"]) > 0